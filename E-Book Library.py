@@ -3,25 +3,94 @@ import os
 import re
 import sys
 import unicodedata
-import webbrowser
 import subprocess
 import sqlite3
 import hashlib
-import pandas as pd
+import hmac
+import secrets
+import csv
+import json
+import functools
+import time
+import threading
+import bisect
+import heapq
+import math
+import base64
+import zlib
+import importlib.util
+import atexit
 import shutil
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-import urllib.request
+import urllib.parse
 import tkinter as tk
+import tkinter.font as tkfont
 from tkinter import messagebox
 
 import ttkbootstrap as tb
 from ttkbootstrap.constants import *
 
+class LazyModule:
+    """Placeholder for a slow-to-import module; the first attribute access imports it and rebinds
+    the global `alias` to the real module, so later uses cost nothing extra."""
+
+    def __init__(self, name, alias):
+        self._name, self._alias = name, alias
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self._name)
+        globals()[self._alias] = module
+        return getattr(module, attr)
+
+# pandas is most of the import time and the main menu does not need it; asyncio only serves --serve
+pd = LazyModule("pandas", "pd")
+asyncio = LazyModule("asyncio", "asyncio")
+
 # ---------- CONFIG ----------
 EXCEL_PATH = os.path.join(os.path.dirname(__file__), "Books.xlsx")  # Excel is in the same folder as the script
 SHEET_BOOK_PDF = "Book PDF"
 SHEET_EBOOK = "E-Book"
+JOURNAL_META_SHEET = "_journal"  # hidden sheet: last catalog-journal seq folded into the workbook
 DB_PATH = "library_users.db"
+INDEX_DB_PATH = "library_index.db"  # derived data (PDF metadata, thumbnails, full-text index); safe to delete
+DB_BUSY_TIMEOUT_MS = 5000  # how long a statement waits on another process' lock
+DB_LOCK_RETRIES = 5        # extra attempts (with backoff) to start a write transaction
+KDF_TARGET_MS = 250       # password hashing cost is calibrated to roughly this long on this machine
+AUTH_WORKERS = 2           # threads that hash/verify passwords off the Tk thread
+SERVER_HOST = "127.0.0.1"   # --serve binds here unless HOST:PORT is given
+SERVER_PORT = 8765
+SERVER_MAX_CONCURRENCY = 32  # requests handled at once; further connections wait their turn
+SERVER_WORKERS = 8           # threads running blocking service calls for the HTTP API
+SERVER_READ_TIMEOUT = 15     # seconds a client gets to send its request
+SERVER_MAX_BODY = 64 * 1024
+SERVER_TOKEN_TTL = 12 * 3600
+REMOTE_CACHE_MAX_BYTES = 512 * 1024 * 1024  # client mode: PDFs fetched from the server, least recent dropped first
+ISSUE_DAYS = 10
+BOOK_PRICE = 100.0
+EXPIRY_SWEEP_MS = 60_000   # longest the expiry engine sleeps between checks
+EXPIRY_BATCH = 200         # expired issues deleted per write transaction
+CATALOG_BACKEND = "sqlite"  # "sqlite": books table in DB_PATH is the catalog; "excel": Books.xlsx is
+PDF_INDEX_PATH = os.path.join(os.path.dirname(__file__), ".pdf_index.json")  # persisted filename index
+CATALOG_CACHE_HASH = False  # also compare a SHA-256 of the workbook when its mtime/size change
+CATALOG_JOURNAL_COMPACT_BYTES = 256 * 1024  # "excel" backend: fold the edit journal into Books.xlsx past this size,
+CATALOG_JOURNAL_IDLE_MS = 30_000            # or once no edit has been journaled for this long
+BLOB_DIR = os.path.join(os.path.dirname(__file__), "blobs")  # content-addressed PDF store
+BLOB_HASH_WORKERS = 4       # files hashed in parallel by --blobs ingest
+BLOB_GC_GRACE_S = 3600      # --blobs gc keeps unreferenced blobs put more recently than this
+METADATA_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))  # processes extracting PDF metadata
+THUMB_WIDTH = 96            # px; first-page thumbnails in the search window
+METRICS_ENABLED = os.environ.get("EBOOK_METRICS", "") not in ("", "0")  # timing spans (see Metrics)
+METRICS_FILE = "library_metrics.prom"  # Prometheus text file written while metrics are enabled
+METRICS_EXPORT_MS = 15_000
+DELIVER_HARDLINK = False    # hardlink purchases into Downloads when on the same volume (edits then affect both)
+INGEST_BATCH = 5000         # rows per executemany() during bulk ingestion
+DOWNLOAD_WORKERS = 3        # concurrent transfers
+DOWNLOAD_CHUNK = 256 * 1024
+DOWNLOAD_RETRIES = 4        # resumed attempts after a dropped connection
+DOWNLOAD_TIMEOUT = 30       # seconds of socket silence before an attempt counts as dropped
 
 # ---------- UI constants ----------
 WIN_GEOM = "900x640"
@@ -31,6 +100,121 @@ LABEL_FONT = ("Segoe UI", 13)
 HEADER_FONT = ("Segoe UI", 18, "bold")
 ENTRY_IPADY = 6
 BTN_WIDTH = 16
+SEARCH_DEBOUNCE_MS = 150  # wait this long after the last keystroke before searching
+FUZZY_TOP_K = 10          # typo-tolerant candidates offered by SearchIndex.fuzzy()
+FUZZY_MIN_SCORE = 0.45    # share of the query's trigrams a fuzzy candidate must contain
+FUZZY_MAX_CANDIDATES = 20000  # posting entries scanned per fuzzy query before common trigrams are skipped
+FUZZY_FILL = 5            # live search appends fuzzy matches while it has fewer exact hits than this
+LIST_OVERSCAN = 20        # rows materialized above/below the visible part of a VirtualListbox
+
+# ---------- Metrics ----------
+class Histogram:
+    """Cumulative-bucket latency histogram (seconds), Prometheus style."""
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)  # last slot: above the largest bucket
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (max for the overflow bucket)."""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(self.BUCKETS[i], self.max) if i < len(self.BUCKETS) else self.max
+        return self.max
+
+class Metrics:
+    """Named timing spans collected into histograms.
+
+    Disabled (the default unless EBOOK_METRICS is set) a span is a shared no-op context manager
+    and a timed() function pays one attribute check, so instrumentation can stay in hot paths."""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._hist = {}
+        self._lock = threading.Lock()
+        self._noop = nullcontext()
+
+    def observe(self, name, seconds):
+        with self._lock:
+            hist = self._hist.get(name)
+            if hist is None:
+                hist = self._hist[name] = Histogram()
+            hist.observe(seconds)
+
+    def span(self, name):
+        return self._span(name) if self.enabled else self._noop
+
+    @contextmanager
+    def _span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def timed(self, name):
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - start)
+            return wrapper
+        return decorate
+
+    def reset(self):
+        with self._lock:
+            self._hist.clear()
+
+    def snapshot(self):
+        """{name: {'count', 'sum', 'p50', 'p95', 'max'}} sorted by name."""
+        with self._lock:
+            return {name: {"count": h.count, "sum": h.sum, "p50": h.quantile(0.5), "p95": h.quantile(0.95), "max": h.max}
+                    for name, h in sorted(self._hist.items())}
+
+    def prometheus_text(self):
+        lines = ["# HELP ebook_library_span_seconds Latency of instrumented E-Book Library operations.",
+                 "# TYPE ebook_library_span_seconds histogram"]
+        with self._lock:
+            for name, h in sorted(self._hist.items()):
+                label = 'span="%s"' % name.replace("\\", "\\\\").replace('"', '\\"')
+                cumulative = 0
+                for bound, n in zip(Histogram.BUCKETS, h.counts):
+                    cumulative += n
+                    lines.append(f'ebook_library_span_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+                lines.append(f'ebook_library_span_seconds_bucket{{{label},le="+Inf"}} {h.count}')
+                lines.append(f"ebook_library_span_seconds_sum{{{label}}} {h.sum:.6f}")
+                lines.append(f"ebook_library_span_seconds_count{{{label}}} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path=None):
+        """Atomically write prometheus_text() (node_exporter textfile-collector format). Returns the path."""
+        path = path or METRICS_FILE
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, path)
+        return path
+
+metrics = Metrics(enabled=METRICS_ENABLED)
 
 # ---------- Helpers ----------
 def normalize_text(text):
@@ -49,6 +233,89 @@ def sanitize_filename(name: str) -> str:
         name = name[:150]
     return name
 
+def file_sha256(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+FICLONE = 0x40049409  # Linux ioctl: share the source's extents (btrfs, xfs, bcachefs...)
+
+def same_file_contents(a, b):
+    try:
+        if os.path.samefile(a, b):
+            return True
+        if os.path.getsize(a) != os.path.getsize(b):
+            return False
+    except OSError:
+        return False
+    return file_sha256(a) == file_sha256(b)
+
+def _kernel_copy(src_f, dst_f, size):
+    """Copy without bouncing the bytes through Python: copy_file_range, then sendfile."""
+    copied = 0
+    for fn in (getattr(os, "copy_file_range", None), getattr(os, "sendfile", None)):
+        if fn is None:
+            continue
+        try:
+            while copied < size:
+                if fn is os.sendfile:
+                    n = os.sendfile(dst_f.fileno(), src_f.fileno(), copied, size - copied)
+                else:
+                    n = fn(src_f.fileno(), dst_f.fileno(), size - copied, copied, copied)
+                if n == 0:
+                    break
+                copied += n
+            if copied == size:
+                return True
+        except OSError:
+            pass
+        copied = 0
+        dst_f.truncate(0)
+        dst_f.seek(0)
+    return False
+
+def deliver_file(src, dst, hardlink=DELIVER_HARDLINK):
+    """Put a copy of `src` at `dst` as cheaply as the platform allows. Returns how it was done.
+
+    Nothing is written when `dst` already holds the same bytes ("existing"). Otherwise, in
+    order: hardlink (only if enabled: both names then share one file), reflink, kernel
+    copy_file_range/sendfile, and finally shutil.copyfile. The result is written next to
+    `dst` and renamed into place, so a reader never sees a half-copied PDF."""
+    if os.path.exists(dst) and same_file_contents(src, dst):
+        return "existing"
+    tmp = dst + ".part"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    try:
+        if hardlink:
+            try:
+                os.link(src, tmp)
+                os.replace(tmp, dst)
+                return "hardlink"
+            except OSError:
+                pass
+        method = "copy"
+        with open(src, "rb") as src_f, open(tmp, "wb") as dst_f:
+            size = os.fstat(src_f.fileno()).st_size
+            try:
+                import fcntl
+                fcntl.ioctl(dst_f.fileno(), FICLONE, src_f.fileno())
+                method = "reflink"
+            except (ImportError, OSError):
+                if _kernel_copy(src_f, dst_f, size):
+                    method = "kernel"
+        if method == "copy":
+            shutil.copyfile(src, tmp)  # uses fcopyfile/CopyFile2 where the OS has them
+        shutil.copystat(src, tmp)
+        os.replace(tmp, dst)
+        return method
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
 def get_downloads_folder():
     # Cross-platform downloads detection (best effort)
     home = os.path.expanduser("~")
@@ -60,6 +327,12 @@ def get_downloads_folder():
         # linux/unix
         return os.path.join(home, "Downloads")
 
+def get_user_cache_folder():
+    # per-user cache root (LOCALAPPDATA on Windows, XDG_CACHE_HOME or ~/.cache elsewhere)
+    base = os.environ.get("LOCALAPPDATA") if sys.platform.startswith("win") else os.environ.get("XDG_CACHE_HOME")
+    return os.path.join(base or os.path.join(os.path.expanduser("~"), ".cache"), "ebook-library")
+
+@metrics.timed("launch_acrobat")
 def open_pdf_in_acrobat(filepath):
     filepath = os.path.abspath(filepath)
     if not os.path.exists(filepath):
@@ -88,29 +361,120 @@ def open_pdf_in_acrobat(filepath):
     except Exception as e:
         messagebox.showerror("Error", f"Failed to open PDF:\n{e}")
 
+class PdfFilenameIndex:
+    """normalize_text(stem) -> file name for the PDFs of a few folders, persisted between runs.
+
+    A folder is re-listed only when its mtime changes, and only names not seen before are
+    normalized again, so lookups cost one os.stat() per folder instead of a full scan."""
+
+    def __init__(self, path=PDF_INDEX_PATH):
+        self.path = path
+        self._roots = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            for root, entry in data.get("roots", {}).items():
+                self._roots[root] = self._entry(entry["mtime_ns"], entry["files"])
+        except Exception:
+            self._roots = {}
+
+    def save(self):
+        data = {"roots": {root: {"mtime_ns": e["mtime_ns"], "files": e["files"]} for root, e in self._roots.items()}}
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+        except Exception:
+            pass
+
+    @staticmethod
+    def _entry(mtime_ns, files):
+        by_key = {}
+        for fn in sorted(files):
+            by_key.setdefault(files[fn], fn)
+        return {"mtime_ns": mtime_ns, "files": files, "by_key": by_key}
+
+    def _refresh(self, root, force=False):
+        try:
+            mtime_ns = os.stat(root).st_mtime_ns
+        except OSError:
+            return None
+        entry = self._roots.get(root)
+        if entry and entry["mtime_ns"] == mtime_ns and not force:
+            return entry
+        try:
+            names = [fn for fn in os.listdir(root) if fn.lower().endswith(".pdf")]
+        except OSError:
+            return None
+        known = entry["files"] if entry else {}
+        files = {fn: known[fn] if fn in known else normalize_text(os.path.splitext(fn)[0]) for fn in names}
+        changed = entry is None or files.keys() != known.keys()
+        entry = self._roots[root] = self._entry(mtime_ns, files)
+        # saving the index can itself bump the folder's mtime (it may live there), so only
+        # write when the listing actually changed
+        if changed:
+            self.save()
+        return entry
+
+    @metrics.timed("pdf_lookup")
+    def lookup(self, title, roots, substring=True):
+        """Path of the PDF named like `title` in the first root that has one, else None.
+
+        Exact normalized names win over names that merely contain the title."""
+        norm = normalize_text(title)
+        if not norm:
+            return None
+        roots = [os.path.abspath(r) for r in roots if r]
+        with self._lock:
+            for pass_substring in ((False, True) if substring else (False,)):
+                for root in roots:
+                    # a listed name that no longer exists means the folder changed within its
+                    # mtime granularity: re-list once and retry
+                    for force in (False, True):
+                        entry = self._refresh(root, force)
+                        if not entry:
+                            break
+                        if pass_substring:
+                            fn = next((f for f, key in entry["files"].items() if norm in key), None)
+                        else:
+                            fn = entry["by_key"].get(norm)
+                        if not fn:
+                            break
+                        p = os.path.join(root, fn)
+                        if os.path.exists(p):
+                            return p
+        return None
+
+pdf_index = PdfFilenameIndex()
+
+def script_dir():
+    return os.path.dirname(os.path.abspath(__file__)) or os.getcwd()
+
+def find_pdf_by_title(title, roots=None, substring=True):
+    """Look a PDF up by title in `roots` (default: the script folder) through the shared filename index."""
+    if not title:
+        return None
+    return pdf_index.lookup(title, roots or (script_dir(),), substring=substring)
+
 def find_pdf_in_script_dir_by_title(title: str):
     """Search the script directory for a PDF matching the book title (best-effort)."""
     if not title:
         return None
-    base = os.path.dirname(__file__) or os.getcwd()
+    found = find_pdf_by_title(title)
+    if found:
+        return found
+    base = script_dir()
     name = sanitize_filename(title)
     candidates = [
         os.path.join(base, f"{name}.pdf"),
         os.path.join(base, f"{title}.pdf"),
         os.path.join(base, f"{name.replace(' ', '_')}.pdf"),
     ]
-    norm_title = normalize_text(title)
-    try:
-        for fn in os.listdir(base):
-            if not fn.lower().endswith(".pdf"):
-                continue
-            stem = os.path.splitext(fn)[0]
-            if norm_title and norm_title in normalize_text(stem):
-                p = os.path.join(base, fn)
-                if p not in candidates:
-                    candidates.insert(0, p)
-    except Exception:
-        pass
     for c in candidates:
         try:
             if c and os.path.exists(c):
@@ -119,14 +483,16 @@ def find_pdf_in_script_dir_by_title(title: str):
             continue
     return None
 
-def open_pdf_in_chrome(filepath: str) -> bool:
-    """Try to open the given PDF file with Chrome (fallback to default browser).
+@metrics.timed("launch_chrome")
+def open_pdf_in_chrome(filepath: str, page=None) -> bool:
+    """Try to open the given PDF file with Chrome (fallback to default browser), at `page` if given.
        Returns True on success, False otherwise."""
     if not filepath:
         return False
     fp = os.path.abspath(filepath)
     if not os.path.exists(fp):
         return False
+    target = Path(fp).as_uri() + f"#page={int(page)}" if page else fp
     chrome_candidates = []
     if sys.platform.startswith("win"):
         chrome_candidates = [
@@ -141,17 +507,18 @@ def open_pdf_in_chrome(filepath: str) -> bool:
     for p in chrome_candidates:
         try:
             if os.path.isabs(p) and os.path.exists(p):
-                subprocess.Popen([p, fp], shell=False)
+                subprocess.Popen([p, target], shell=False)
                 return True
             else:
                 # try by name (may be in PATH)
-                subprocess.Popen([p, fp], shell=False)
+                subprocess.Popen([p, target], shell=False)
                 return True
         except Exception:
             continue
     # final fallback: open file:// in default browser (Chrome will be used if it's default)
     try:
-        url = "file://" + fp.replace("\\", "/")
+        import webbrowser
+        url = Path(fp).as_uri() + (f"#page={int(page)}" if page else "")
         webbrowser.open_new_tab(url)
         return True
     except Exception:
@@ -177,100 +544,3078 @@ def try_open_url_in_chrome(url):
         # linux: rely on typical binary names in PATH
         chrome_candidates = ["google-chrome", "chrome", "chromium", "chromium-browser"]
 
-    for p in chrome_candidates:
-        try:
-            if os.path.isabs(p) and os.path.exists(p):
-                subprocess.Popen([p, url], shell=False)
-                return
-            else:
-                # try to run by name (may be in PATH)
-                subprocess.Popen([p, url], shell=False)
-                return
-        except Exception:
-            continue
-    # final fallback
-    webbrowser.open(url)
+    for p in chrome_candidates:
+        try:
+            if os.path.isabs(p) and os.path.exists(p):
+                subprocess.Popen([p, url], shell=False)
+                return
+            else:
+                # try to run by name (may be in PATH)
+                subprocess.Popen([p, url], shell=False)
+                return
+        except Exception:
+            continue
+    # final fallback
+    import webbrowser
+    webbrowser.open(url)
+
+def ensure_excel_exists():
+    folder = os.path.dirname(EXCEL_PATH)
+    if folder and not os.path.exists(folder):
+        try:
+            os.makedirs(folder, exist_ok=True)
+        except Exception:
+            pass
+    if not os.path.exists(EXCEL_PATH):
+        try:
+            import openpyxl  # an empty workbook does not need pandas loaded
+            wb = openpyxl.Workbook()
+            wb.active.title = SHEET_BOOK_PDF
+            wb.active.append(["title", "author", "filepath"])
+            wb.create_sheet(SHEET_EBOOK).append(["title", "author", "url"])
+            wb.save(EXCEL_PATH)
+        except Exception as e:
+            print("Failed to create initial Excel:", e)
+
+# ---------- Database ----------
+class Database:
+    """Long-lived, per-thread SQLite connections to `path` (DB_PATH by default).
+
+    Connections are opened once in WAL mode (readers never block the writer) and kept, so
+    sqlite3's per-connection statement cache is reused across calls. Writes go through
+    transaction(), which takes the write lock up front and retries while another process holds it."""
+
+    def __init__(self, path=None, cached_statements=256):
+        self.path = path
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+
+    def connect(self):
+        path = self.path or DB_PATH
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.path == path:
+            return conn
+        if conn is not None:
+            conn.close()
+        conn = sqlite3.connect(path, timeout=DB_BUSY_TIMEOUT_MS / 1000, isolation_level=None,
+                               cached_statements=self.cached_statements)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")   # durable at checkpoints; safe with WAL
+        conn.execute("PRAGMA cache_size=-8000")     # ~8 MB page cache
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(f"PRAGMA busy_timeout={int(DB_BUSY_TIMEOUT_MS)}")
+        self._local.conn, self._local.path, self._local.depth = conn, path, 0
+        return conn
+
+    @contextmanager
+    def transaction(self, write=True):
+        """BEGIN IMMEDIATE ... COMMIT (ROLLBACK on error). Nested use joins the outer transaction."""
+        conn = self.connect()
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+        started = time.perf_counter() if metrics.enabled else None
+        for attempt in range(DB_LOCK_RETRIES + 1):
+            try:
+                conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+                break
+            except sqlite3.OperationalError as e:
+                if attempt == DB_LOCK_RETRIES or not _is_lock_error(e):
+                    raise
+                time.sleep(0.05 * (2 ** attempt))
+        if started is not None:
+            metrics.observe("db_lock_wait", time.perf_counter() - started)
+        self._local.depth = 1
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+        finally:
+            self._local.depth = 0
+            if started is not None:
+                metrics.observe("db_transaction", time.perf_counter() - started)
+
+    def query(self, sql, params=()):
+        return self.connect().execute(sql, params).fetchall()
+
+    def query_one(self, sql, params=()):
+        return self.connect().execute(sql, params).fetchone()
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+def _is_lock_error(e):
+    msg = str(e).lower()
+    return "locked" in msg or "busy" in msg
+
+db = Database()
+index_db = Database(INDEX_DB_PATH)
+
+# ---------- Schema migrations ----------
+# Ordered (version, migrate) pairs. Each runs once, in its own transaction, and is recorded in
+# schema_version; append new steps at the end and never edit one that has shipped.
+def _migration_base_tables(c):
+    c.execute("""CREATE TABLE IF NOT EXISTS users (
+                    username TEXT PRIMARY KEY,
+                    password TEXT NOT NULL
+                )""")
+    c.execute("""CREATE TABLE IF NOT EXISTS issued_books (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    username TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    author TEXT,
+                    source TEXT,
+                    location TEXT,
+                    issue_date TEXT,
+                    expiry_date TEXT
+                )""")
+    c.execute("""CREATE TABLE IF NOT EXISTS purchased_books (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    username TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    author TEXT,
+                    source TEXT,
+                    location TEXT,
+                    purchase_date TEXT,
+                    price REAL
+                )""")
+    c.execute("""CREATE TABLE IF NOT EXISTS books (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    title TEXT NOT NULL,
+                    author TEXT,
+                    source TEXT NOT NULL DEFAULT 'pdf',
+                    location TEXT
+                )""")
+
+def _migration_hot_query_indexes(c):
+    c.execute("CREATE INDEX IF NOT EXISTS idx_issued_user_title ON issued_books(username, title)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_issued_expiry ON issued_books(expiry_date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_purchased_user_date ON purchased_books(username, purchase_date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_books_title_lower ON books(lower(title))")
+
+def _migration_settings(c):
+    c.execute("""CREATE TABLE IF NOT EXISTS settings (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )""")
+
+def _migration_blob_digests(c):
+    for table in ("books", "issued_books", "purchased_books"):
+        c.execute(f"ALTER TABLE {table} ADD COLUMN digest TEXT")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_books_digest ON books(digest)")
+
+MIGRATIONS = [
+    (1, _migration_base_tables),
+    (2, _migration_hot_query_indexes),
+    (3, _migration_settings),
+    (4, _migration_blob_digests),
+]
+
+def get_setting(key, default=None):
+    row = db.query_one("SELECT value FROM settings WHERE key=?", (key,))
+    return row[0] if row else default
+
+def set_setting(key, value):
+    with db.transaction() as c:
+        c.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, str(value)))
+
+def current_schema_version():
+    row = db.query_one("SELECT MAX(version) FROM schema_version")
+    return (row and row[0]) or 0
+
+def migrate_db():
+    """Bring DB_PATH up to the latest schema, upgrading an existing file in place."""
+    with db.transaction() as c:
+        c.execute("""CREATE TABLE IF NOT EXISTS schema_version (
+                        version INTEGER PRIMARY KEY,
+                        applied_at TEXT NOT NULL
+                    )""")
+    current = current_schema_version()
+    if current > MIGRATIONS[-1][0]:
+        print(f"Database schema v{current} is newer than this app (v{MIGRATIONS[-1][0]}).")
+        return current
+    for version, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        with db.transaction() as c:
+            # re-check under the write lock in case another kiosk migrated meanwhile
+            if c.execute("SELECT 1 FROM schema_version WHERE version=?", (version,)).fetchone():
+                continue
+            migrate(c)
+            c.execute("INSERT INTO schema_version (version, applied_at) VALUES (?, ?)",
+                      (version, datetime.now().isoformat()))
+        current = version
+    return current
+
+# ---------- DB init ----------
+def init_db():
+    migrate_db()
+    init_index_db()
+
+# ---------- Issue expiry ----------
+class ExpiryEngine:
+    """Deletes expired issued_books rows in the background.
+
+    Upcoming expiry times sit in a min-heap, so a check with nothing due is a heap peek and
+    due rows are purged EXPIRY_BATCH at a time from a Tk timer. Reads never rely on the purge:
+    they filter on `expiry_date > now` themselves."""
+
+    def __init__(self):
+        self._heap = []
+        self._lock = threading.Lock()
+        self._widget = None
+        self._after_id = None
+
+    def load(self):
+        rows = db.query("SELECT expiry_date, id FROM issued_books WHERE expiry_date IS NOT NULL")
+        with self._lock:
+            self._heap = [(str(exp), _id) for exp, _id in rows]
+            heapq.heapify(self._heap)
+
+    def track(self, expiry_iso, issue_id):
+        with self._lock:
+            heapq.heappush(self._heap, (expiry_iso, issue_id))
+
+    def next_expiry(self):
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def purge_due(self, now_iso=None, batch=EXPIRY_BATCH):
+        """Delete up to `batch` expired issues. Returns (deleted, more_due)."""
+        now_iso = now_iso or datetime.now().isoformat()
+        with self._lock:
+            due = []
+            while self._heap and self._heap[0][0] <= now_iso and len(due) < batch:
+                due.append(heapq.heappop(self._heap)[1])
+            more = bool(self._heap) and self._heap[0][0] <= now_iso
+        if not due:
+            return 0, False
+        marks = ",".join("?" * len(due))
+        with db.transaction() as c:
+            # re-check the stored date: the row may have been returned or re-issued meanwhile
+            n = c.execute(f"DELETE FROM issued_books WHERE id IN ({marks}) AND expiry_date <= ?", (*due, now_iso)).rowcount
+        return n, more
+
+    def start(self, widget):
+        self._widget = widget
+        self.load()
+        self._schedule(0)
+
+    def stop(self):
+        if self._widget is not None and self._after_id is not None:
+            try:
+                self._widget.after_cancel(self._after_id)
+            except tk.TclError:
+                pass
+        self._after_id = None
+
+    def _schedule(self, delay_ms):
+        self._after_id = self._widget.after(int(delay_ms), self._tick)
+
+    def step(self):
+        """Purge one batch; returns how many ms to wait before the next step."""
+        try:
+            _, more = self.purge_due()
+        except sqlite3.OperationalError:
+            more = False  # locked for longer than the retries allow; try again next tick
+        if more:
+            return 50  # keep draining, but let the UI breathe between batches
+        delay = EXPIRY_SWEEP_MS
+        nxt = self.next_expiry()
+        if nxt:
+            try:
+                until = (datetime.fromisoformat(nxt) - datetime.now()).total_seconds() * 1000
+                delay = max(50, min(delay, until + 50))
+            except ValueError:
+                pass
+        return delay
+
+    def _tick(self):
+        self._after_id = None
+        self._schedule(self.step())
+
+expiry_engine = ExpiryEngine()
+
+# ---------- Passwords ----------
+# Stored hashes are self-describing, so every user keeps the parameters they were hashed with:
+#   scrypt$<n>$<r>$<p>$<salt hex>$<hash hex>      (default)
+#   pbkdf2_sha256$<iterations>$<salt hex>$<hash hex>  (when OpenSSL lacks scrypt)
+# Legacy rows hold an unsalted SHA-256 hex digest or plaintext and are rehashed on login.
+HAS_SCRYPT = hasattr(hashlib, "scrypt")
+DEFAULT_KDF_PARAMS = {"scheme": "scrypt", "n": 2 ** 14, "r": 8, "p": 1} if HAS_SCRYPT else \
+                     {"scheme": "pbkdf2_sha256", "iterations": 200_000}
+KDF_MAX_SCRYPT_N = 2 ** 16           # 64 MiB of memory per hash with r=8
+KDF_MAX_PBKDF2_ITERATIONS = 5_000_000
+_kdf_params = None
+
+def _kdf(password, salt, params):
+    pw = (password or "").encode("utf-8")
+    if params["scheme"] == "scrypt":
+        n, r, p = params["n"], params["r"], params["p"]
+        return hashlib.scrypt(pw, salt=salt, n=n, r=r, p=p, maxmem=256 * r * n + (1 << 20), dklen=32)
+    return hashlib.pbkdf2_hmac("sha256", pw, salt, params["iterations"])
+
+def current_kdf_params():
+    global _kdf_params
+    if _kdf_params is None:
+        try:
+            stored = get_setting("kdf_params")
+            _kdf_params = json.loads(stored) if stored else dict(DEFAULT_KDF_PARAMS)
+        except (sqlite3.Error, ValueError):
+            return dict(DEFAULT_KDF_PARAMS)
+    return _kdf_params
+
+def calibrate_kdf(target_ms=KDF_TARGET_MS, save=True):
+    """Benchmark the KDF on this machine and pick the cost that takes about `target_ms` per hash."""
+    global _kdf_params
+    salt = secrets.token_bytes(16)
+    params = dict(DEFAULT_KDF_PARAMS)
+    if params["scheme"] == "scrypt":
+        params["n"] = 2 ** 12
+        while params["n"] < KDF_MAX_SCRYPT_N:
+            t0 = time.perf_counter(); _kdf("calibration", salt, params)
+            elapsed_ms = (time.perf_counter() - t0) * 1000
+            if elapsed_ms * 1.5 >= target_ms:
+                break  # doubling n doubles the time, which would land further from the target
+            params["n"] *= 2
+    else:
+        params["iterations"] = 50_000
+        t0 = time.perf_counter(); _kdf("calibration", salt, params)
+        elapsed_ms = max(0.001, (time.perf_counter() - t0) * 1000)
+        params["iterations"] = min(KDF_MAX_PBKDF2_ITERATIONS,
+                                   max(100_000, int(params["iterations"] * target_ms / elapsed_ms)))
+    _kdf_params = params
+    if save:
+        set_setting("kdf_params", json.dumps(params))
+    return params
+
+def hash_password(password: str, params=None) -> str:
+    params = params or current_kdf_params()
+    salt = secrets.token_bytes(16)
+    digest = _kdf(password, salt, params).hex()
+    if params["scheme"] == "scrypt":
+        return f"scrypt${params['n']}${params['r']}${params['p']}${salt.hex()}${digest}"
+    return f"pbkdf2_sha256${params['iterations']}${salt.hex()}${digest}"
+
+def _parse_password_hash(stored):
+    parts = stored.split("$")
+    if parts[0] == "scrypt" and len(parts) == 6:
+        return {"scheme": "scrypt", "n": int(parts[1]), "r": int(parts[2]), "p": int(parts[3])}, parts[4], parts[5]
+    if parts[0] == "pbkdf2_sha256" and len(parts) == 4:
+        return {"scheme": "pbkdf2_sha256", "iterations": int(parts[1])}, parts[2], parts[3]
+    return None
+
+def verify_password(password, stored):
+    """Returns (ok, needs_rehash).
+
+    Values written by hash_password() start with "<scheme>$". Anything else is a legacy
+    unsalted SHA-256 hex digest or, before that, a plaintext password. A malformed hash or
+    an unknown scheme never verifies."""
+    stored = stored or ""
+    if re.match(r"[a-z][a-z0-9_]*\$", stored):
+        try:
+            parsed = _parse_password_hash(stored)
+            if not parsed:
+                return False, False
+            params, salt_hex, digest_hex = parsed
+            digest = _kdf(password, bytes.fromhex(salt_hex), params).hex()
+        except (ValueError, OverflowError, MemoryError):
+            return False, False
+        ok = hmac.compare_digest(digest.encode("ascii"), digest_hex.encode("utf-8"))
+        return ok, ok and params != current_kdf_params()
+    if re.fullmatch(r"[0-9a-f]{64}", stored):
+        # legacy unsalted SHA-256
+        ok = hmac.compare_digest(stored, hashlib.sha256((password or "").encode("utf-8")).hexdigest())
+    else:
+        # legacy plaintext
+        ok = hmac.compare_digest(stored.encode("utf-8"), (password or "").encode("utf-8"))
+    return ok, ok
+
+class AuthService:
+    """Registers and verifies customers on a small worker pool so the KDF never blocks Tk."""
+
+    def __init__(self, workers=AUTH_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="auth")
+
+    def _register(self, user, pwd):
+        hashed = hash_password(pwd)
+        with db.transaction() as c:
+            c.execute("INSERT INTO users (username, password) VALUES (?,?)", (user, hashed))
+        return True
+
+    def _login(self, user, pwd):
+        row = db.query_one("SELECT password FROM users WHERE username=?", (user,))
+        if not row:
+            # burn the same time as a real check so timing does not reveal which usernames exist
+            _kdf(pwd, b"\0" * 16, current_kdf_params())
+            return False
+        ok, needs_rehash = verify_password(pwd, row[0])
+        if ok and needs_rehash:
+            # transparent upgrade, like the old plaintext -> SHA-256 path
+            with db.transaction() as c:
+                c.execute("UPDATE users SET password=? WHERE username=? AND password=?", (hash_password(pwd), user, row[0]))
+        return ok
+
+    def register(self, user, pwd):
+        return self._pool.submit(self._register, user, pwd)
+
+    def login(self, user, pwd):
+        return self._pool.submit(self._login, user, pwd)
+
+    def calibrate_in_background(self):
+        """Calibrate once per database; later logins pick the stored parameters up."""
+        try:
+            if get_setting("kdf_params"):
+                return None
+        except sqlite3.Error:
+            return None
+        return self._pool.submit(calibrate_kdf)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+
+auth_service = AuthService()
+
+def call_when_done(widget, future, on_done, poll_ms=30, on_poll=None):
+    """Poll `future` from the Tk loop and call on_done(result, error) on the Tk thread.
+
+    `on_poll()`, if given, runs on every poll while the future is pending (progress display)."""
+    def poll():
+        if not future.done():
+            if on_poll:
+                on_poll()
+            widget.after(poll_ms, poll)
+            return
+        try:
+            result, error = future.result(), None
+        except Exception as e:
+            result, error = None, e
+        on_done(result, error)
+    widget.after(poll_ms, poll)
+
+# ---------- Catalog cache ----------
+class CatalogCache:
+    """Keeps a parsed copy of a file in memory and re-parses it only when the file changes.
+
+    Revalidation is a single os.stat(); when CATALOG_CACHE_HASH is enabled a changed
+    mtime/size is double-checked against the content hash before re-parsing."""
+
+    def __init__(self, loader, copier=None, use_hash=False):
+        self.loader = loader
+        self.copier = copier or (lambda data: data)
+        self.use_hash = use_hash
+        self.hits = 0
+        self.misses = 0
+        self._key = None
+        self._digest = None
+        self._data = None
+        self._lock = threading.Lock()
+
+    def _stat_key(self, path):
+        st = os.stat(path)
+        return (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+    def get(self, path):
+        with self._lock:
+            key = self._stat_key(path)
+            if self._data is not None and key == self._key:
+                self.hits += 1
+                return self.copier(self._data)
+            digest = file_sha256(path) if self.use_hash else None
+            if self._data is not None and digest and digest == self._digest and key[0] == self._key[0]:
+                # touched but not changed
+                self._key = key
+                self.hits += 1
+                return self.copier(self._data)
+            self.misses += 1
+            data = self.loader(path)
+            self._key, self._digest, self._data = key, digest, data
+            return self.copier(data)
+
+    def update(self, path, data):
+        """Replace the cached data after we wrote `path` ourselves, so the next get() is a hit."""
+        with self._lock:
+            self._key = self._stat_key(path)
+            self._digest = file_sha256(path) if self.use_hash else None
+            self._data = data
+
+    def invalidate(self):
+        with self._lock:
+            self._key = self._digest = self._data = None
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+# ---------- Book records ----------
+PDF_LOCATION_COLUMNS = ['location', 'filepath', 'path', 'file path', 'file', 'file_path']
+URL_COLUMNS = ['url', 'link', 'website']
+
+def book_location(rd, columns=PDF_LOCATION_COLUMNS + URL_COLUMNS):
+    for col in columns:
+        if rd.get(col):
+            return str(rd.get(col)).strip()
+    return ""
+
+class Book:
+    """One catalog entry, kept small because the app holds the whole catalog in memory.
+
+    Fixed __slots__ instead of a per-row dict, interned author strings (a few authors cover many
+    books), the normalize_text() title computed once for searching, and a single `location`
+    (file path for a PDF, URL for an e-book) resolved once from whichever column the row had.
+    get() and [] answer the old record-dict keys, 'filepath' and 'url' included."""
+
+    __slots__ = ("title", "author", "source", "location", "digest", "norm_title")
+
+    def __init__(self, title, author=None, source="pdf", location="", digest=None):
+        self.title = str(title or "").strip()
+        author = str(author).strip() if author is not None else ""
+        self.author = sys.intern(author) if author else None
+        self.source = source or "pdf"
+        self.location = str(location or "").strip()
+        self.digest = str(digest) if digest else None
+        self.norm_title = normalize_text(self.title)
+
+    @classmethod
+    def from_record(cls, rec):
+        """A Book from a record dict (sheet row, API payload, loan or purchase row); Books pass through."""
+        if isinstance(rec, cls):
+            return rec
+        source = rec.get('source') or 'pdf'
+        columns = PDF_LOCATION_COLUMNS + URL_COLUMNS if source == 'pdf' else URL_COLUMNS + PDF_LOCATION_COLUMNS
+        return cls(rec.get('title'), rec.get('author'), source, book_location(rec, columns), rec.get('digest'))
+
+    def get(self, key, default=None):
+        if key in ('filepath', 'url'):
+            return self.location if (key == 'filepath') == (self.source == 'pdf') else default
+        if key == 'norm_title' or key not in self.__slots__:
+            return default
+        return getattr(self, key)
+
+    def __getitem__(self, key):
+        value = self.get(key, KeyError)
+        if value is KeyError:
+            raise KeyError(key)
+        return value
+
+    def to_dict(self):
+        """The record-dict shape the HTTP API sends: location under 'filepath' or 'url'."""
+        if self.source == 'pdf':
+            return {'title': self.title, 'author': self.author, 'filepath': self.location, 'digest': self.digest, 'source': self.source}
+        return {'title': self.title, 'author': self.author, 'url': self.location, 'source': self.source}
+
+    def __repr__(self):
+        return f"Book({self.title!r}, {self.author!r}, {self.source!r})"
+
+# ---------- Excel helpers ----------
+def _normalize_columns(df):
+    df.columns = [str(c).lower().strip() for c in df.columns]
+    return df
+
+def _journal_seq(rows):
+    """The journal seq recorded in a JOURNAL_META_SHEET's rows (0 when absent)."""
+    for row in rows:
+        if len(row) >= 2 and row[0] == "journal_seq":
+            try:
+                return int(row[1])
+            except (TypeError, ValueError):
+                return 0
+    return 0
+
+def _read_workbook(path):
+    with pd.ExcelFile(path) as xls:
+        sheets = [name for name in xls.sheet_names if name != JOURNAL_META_SHEET]
+        pdf_sheet = SHEET_BOOK_PDF if SHEET_BOOK_PDF in sheets else (sheets[0] if len(sheets) >= 1 else None)
+        ebook_sheet = SHEET_EBOOK if SHEET_EBOOK in sheets else (sheets[1] if len(sheets) >= 2 else None)
+        pdf_df = pd.read_excel(xls, sheet_name=pdf_sheet) if pdf_sheet else pd.DataFrame()
+        ebook_df = pd.read_excel(xls, sheet_name=ebook_sheet) if ebook_sheet else pd.DataFrame()
+        seq = (_journal_seq(pd.read_excel(xls, sheet_name=JOURNAL_META_SHEET, header=None).values.tolist())
+               if JOURNAL_META_SHEET in xls.sheet_names else 0)
+    pdf_df = _normalize_columns(pdf_df)
+    pdf_df.attrs["journal_seq"] = seq  # survives .copy(), so cached copies know which edits they hold
+    return pdf_df, _normalize_columns(ebook_df)
+
+catalog_cache = CatalogCache(_read_workbook, copier=lambda frames: tuple(df.copy() for df in frames),
+                             use_hash=CATALOG_CACHE_HASH)
+
+def _sheet_rows(ws):
+    """Stream a worksheet as dicts keyed by its lower-cased, stripped header; blank rows are skipped."""
+    rows = ws.iter_rows(values_only=True)
+    header = next(rows, None)
+    if not header:
+        return
+    keys = [str(h).lower().strip() if h is not None else None for h in header]
+    for values in rows:
+        rec = {k: v for k, v in zip(keys, values) if k}
+        if any(v is not None and v != "" for v in rec.values()):
+            yield rec
+
+def iter_workbook_records(path, meta=None):
+    """Stream catalog records (dicts with a 'source' of 'pdf' or 'ebook') straight from the workbook.
+
+    Same sheets as load_excel(): "Book PDF" / "E-Book", else the first / second sheet. openpyxl's
+    read-only mode keeps memory flat however large the sheet is; empty cells come back as None.
+    A `meta` dict receives the workbook's 'journal_seq'."""
+    import openpyxl
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        names = [name for name in wb.sheetnames if name != JOURNAL_META_SHEET]
+        if meta is not None:
+            meta["journal_seq"] = (_journal_seq(wb[JOURNAL_META_SHEET].iter_rows(values_only=True))
+                                   if JOURNAL_META_SHEET in wb.sheetnames else 0)
+        pdf_sheet = SHEET_BOOK_PDF if SHEET_BOOK_PDF in names else (names[0] if names else None)
+        ebook_sheet = SHEET_EBOOK if SHEET_EBOOK in names else (names[1] if len(names) >= 2 else None)
+        for source, name in (("pdf", pdf_sheet), ("ebook", ebook_sheet)):
+            if name is None:
+                continue
+            for rec in _sheet_rows(wb[name]):
+                rec = {k: (None if v == "" else v) for k, v in rec.items()}
+                rec['source'] = source
+                yield rec
+    finally:
+        wb.close()
+
+def _read_workbook_books(path):
+    meta = {}
+    return [Book.from_record(r) for r in iter_workbook_records(path, meta)], meta["journal_seq"]
+
+workbook_records_cache = CatalogCache(_read_workbook_books, copier=lambda data: (list(data[0]), data[1]),
+                                      use_hash=CATALOG_CACHE_HASH)
+
+# Both loaders run on worker threads too (bulk edits, the API, warm-ups), so they raise
+# LibraryError and leave reporting to the caller on the Tk thread.
+@metrics.timed("load_excel")
+def load_excel():
+    if not os.path.exists(EXCEL_PATH):
+        raise LibraryError(f"Excel file not found at:\n{EXCEL_PATH}", "Error")
+    try:
+        return catalog_journal.replay_frames(*catalog_cache.get(EXCEL_PATH))
+    except Exception as e:
+        raise LibraryError(str(e), "Error loading Excel") from e
+
+@metrics.timed("load_excel_records")
+def load_excel_records():
+    """The workbook catalog as a list of Books, without going through pandas."""
+    if not os.path.exists(EXCEL_PATH):
+        raise LibraryError(f"Excel file not found at:\n{EXCEL_PATH}", "Error")
+    try:
+        return catalog_journal.replay_books(*workbook_records_cache.get(EXCEL_PATH))
+    except Exception as e:
+        raise LibraryError(str(e), "Error loading Excel") from e
+
+@metrics.timed("save_excel")
+def write_excel(pdf_df, ebook_df, path=None, journal_seq=None):
+    """Atomically (temp file + rename) write the two sheets; `journal_seq` marks the journaled
+    edits already folded into these frames, in a hidden JOURNAL_META_SHEET."""
+    path = path or EXCEL_PATH
+    root, ext = os.path.splitext(path)
+    tmp = f"{root}.tmp{ext}"  # pandas picks the writer by extension
+    try:
+        with pd.ExcelWriter(tmp, engine="openpyxl", mode="w") as writer:
+            pdf_df.to_excel(writer, index=False, sheet_name=SHEET_BOOK_PDF)
+            ebook_df.to_excel(writer, index=False, sheet_name=SHEET_EBOOK)
+            if journal_seq is not None:
+                pd.DataFrame([["journal_seq", journal_seq]]).to_excel(writer, index=False, header=False, sheet_name=JOURNAL_META_SHEET)
+                writer.sheets[JOURNAL_META_SHEET].sheet_state = "hidden"
+        with open(tmp, "r+b") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except Exception:
+        catalog_cache.invalidate()
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    if _is_catalog_workbook(path):
+        # keep the in-memory copy in step with what we just wrote (blank cells read back as NaN)
+        frames = tuple(_normalize_columns(df.replace("", float("nan"))) for df in (pdf_df.copy(), ebook_df.copy()))
+        frames[0].attrs["journal_seq"] = journal_seq or 0
+        catalog_cache.update(path, frames)
+
+def save_excel(pdf_df, ebook_df):
+    try:
+        write_excel(pdf_df, ebook_df)
+        messagebox.showinfo("Saved", "Excel file updated.")
+    except Exception as e:
+        messagebox.showerror("Error saving Excel", str(e))
+
+# ---------- Catalog journal ----------
+JOURNAL_OPS = ("add", "delete", "modify")
+
+@contextmanager
+def interprocess_lock(path):
+    """Exclusive advisory lock on the file `path` (created if missing), held across processes:
+    flock() on POSIX, msvcrt.locking() on Windows. Blocks until it is free."""
+    with open(path, "a+b") as f:
+        if sys.platform.startswith("win"):
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass  # LK_LOCK gives up after about 10 s; keep waiting
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+class CatalogJournal:
+    """Append-only log of catalog edits for the "excel" backend, next to the workbook.
+
+    An add/delete/modify is one fsync'd JSON line with a rising `seq` instead of a workbook
+    rewrite; load_excel() and load_excel_records() replay the lines newer than the snapshot on
+    top of Books.xlsx. compact() folds them in: it writes the workbook (temp file + rename) with
+    the folded seq in its hidden JOURNAL_META_SHEET, then rewrites the log down to a "compacted"
+    marker. Replay skips entries the workbook already holds, so a crash between the two steps
+    cannot apply an edit twice, and a line torn by a crash is ignored.
+
+    Several processes (the app, --serve, --ingest) may share the files. Appending and rewriting
+    the log hold an OS lock on `<workbook>.journal.lock`, and a whole compaction holds one on
+    `<workbook>.compact.lock`, so appends from other processes only wait for the short rewrite.
+    Lock order: compaction before log, OS lock right after the matching thread lock."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._compacting = threading.Lock()
+        self._cache = (None, [])
+        self.last_append = 0.0
+
+    @property
+    def path(self):
+        return EXCEL_PATH + ".journal"
+
+    def _log_lock(self):
+        return interprocess_lock(EXCEL_PATH + ".journal.lock")
+
+    def _compact_lock(self):
+        return interprocess_lock(EXCEL_PATH + ".compact.lock")
+
+    def stat_key(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_size, st.st_mtime_ns)
+
+    def entries(self):
+        """Every readable entry, oldest first."""
+        key = self.stat_key()
+        if key is None:
+            return []
+        if self._cache[0] == (self.path, key):
+            return self._cache[1]
+        entries = []
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(entry, dict) and isinstance(entry.get("seq"), int):
+                    entries.append(entry)
+        self._cache = ((self.path, key), entries)
+        return entries
+
+    def pending(self, since, upto=None):
+        """Edits with since < seq <= upto."""
+        return [e for e in self.entries()
+                if e["seq"] > since and (upto is None or e["seq"] <= upto) and e.get("op") in JOURNAL_OPS]
+
+    def append(self, *edits):
+        """Durably log `edits` (dicts with an 'op' of add/delete/modify). Returns the last seq."""
+        with self._lock, self._log_lock():
+            entries = self.entries()
+            # an empty log continues from the workbook's seq, or new edits would look already folded
+            seq = entries[-1]["seq"] if entries else self._workbook_seq()
+            lines = []
+            for edit in edits:
+                seq += 1
+                lines.append(json.dumps(dict(edit, seq=seq), ensure_ascii=False))
+            with open(self.path, "a+b") as f:
+                torn = False
+                if f.seek(0, os.SEEK_END):
+                    f.seek(-1, os.SEEK_END)
+                    torn = f.read(1) != b"\n"  # a crash cut the last line short; don't glue onto it
+                f.write((("\n" if torn else "") + "\n".join(lines) + "\n").encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+                size = f.tell()
+            self.last_append = time.monotonic()
+        if size > CATALOG_JOURNAL_COMPACT_BYTES:
+            self.compact_in_background()
+        return seq
+
+    @staticmethod
+    def _workbook_seq():
+        return workbook_records_cache.get(EXCEL_PATH)[1] if os.path.exists(EXCEL_PATH) else 0
+
+    def replay_books(self, books, since, upto=None):
+        edits = self.pending(since, upto)
+        if not edits:
+            return books
+        groups = {"pdf": [b for b in books if b.source == "pdf"], "ebook": [b for b in books if b.source != "pdf"]}
+        for e in edits:
+            if e["op"] == "add":
+                groups[e["source"]].append(Book(e["title"], e.get("author"), e["source"], e.get("location")))
+                continue
+            key = _title_key(e["title"])
+            if not key:
+                continue
+            for source, group in groups.items():
+                if e["op"] == "delete":
+                    groups[source] = [b for b in group if _title_key(b.title) != key]
+                else:  # cached Books are shared, so a rename makes a new one
+                    groups[source] = [Book(e.get("new_title") or b.title, e.get("new_author") or b.author, b.source, b.location, b.digest)
+                                      if _title_key(b.title) == key else b for b in group]
+        return groups["pdf"] + groups["ebook"]
+
+    def replay_frames(self, pdf_df, ebook_df, upto=None):
+        edits = self.pending(pdf_df.attrs.get("journal_seq", 0), upto)
+        frames = {"pdf": pdf_df, "ebook": ebook_df}
+        adds = {"pdf": [], "ebook": []}
+        def flush_adds():
+            for source, rows in adds.items():
+                if rows:
+                    cols = ['title', 'author', SHEET_LOCATION_COLUMN[source]]
+                    frames[source] = pd.concat([_ensure_columns(frames[source], cols), pd.DataFrame(rows, columns=cols)], ignore_index=True)
+                    rows.clear()
+        for e in edits:
+            if e["op"] == "add":
+                adds[e["source"]].append([e["title"], e.get("author"), e.get("location") or ""])
+                continue
+            flush_adds()
+            for source, df in frames.items():
+                mask = _title_mask(df, e["title"])
+                if not mask.any():
+                    continue
+                if e["op"] == "delete":
+                    frames[source] = df[~mask].copy()
+                else:
+                    if e.get("new_title"): df.loc[mask, 'title'] = e["new_title"]
+                    if e.get("new_author"): df.loc[mask, 'author'] = e["new_author"]
+        flush_adds()
+        return frames["pdf"], frames["ebook"]
+
+    def compact(self):
+        """Fold every journaled edit into the workbook. Returns the number folded."""
+        with self._compacting, self._compact_lock():
+            entries = self.entries()
+            if not entries or entries == [{"seq": entries[-1]["seq"], "op": "compacted"}] or not os.path.exists(EXCEL_PATH):
+                return 0
+            upto = entries[-1]["seq"]
+            pdf_df, ebook_df = catalog_cache.get(EXCEL_PATH)
+            folded = len(self.pending(pdf_df.attrs.get("journal_seq", 0), upto))
+            if folded:
+                write_excel(*self.replay_frames(pdf_df, ebook_df, upto), journal_seq=upto)
+            with self._lock, self._log_lock():
+                self._truncate(upto)
+            return folded
+
+    def _truncate(self, upto):
+        keep = [e for e in self.entries() if e["seq"] > upto]  # edits logged while the workbook was written
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for e in [{"seq": upto, "op": "compacted"}] + keep:
+                f.write(json.dumps(e, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    @contextmanager
+    def exclusive(self):
+        """Hold off appends and compaction while the caller reads, edits and rewrites the whole catalog."""
+        with self._compacting, self._compact_lock(), self._lock, self._log_lock():
+            yield
+
+    def fold(self, pdf_df, ebook_df):
+        """Write frames that already include every journaled edit (load_excel() output, edited)
+        and empty the log. Call inside exclusive()."""
+        entries = self.entries()
+        upto = entries[-1]["seq"] if entries else self._workbook_seq()
+        write_excel(pdf_df, ebook_df, journal_seq=upto)
+        if entries:
+            self._truncate(upto)
+
+    def compact_in_background(self):
+        if not self._compacting.locked():
+            threading.Thread(target=self._compact_quietly, name="journal-compact", daemon=True).start()
+
+    def _compact_quietly(self):
+        try:
+            self.compact()
+        except Exception as e:
+            print("Catalog journal compaction failed:", e)
+
+    def compact_if_idle(self, idle_ms=CATALOG_JOURNAL_IDLE_MS):
+        entries = self.entries()
+        if entries and entries[-1].get("op") != "compacted" and time.monotonic() - self.last_append >= idle_ms / 1000:
+            self.compact_in_background()
+
+catalog_journal = CatalogJournal()
+
+# ---------- Catalog store ----------
+# The books table keeps one row per title; `location` holds the sheet's filepath (pdf) or url (ebook).
+SHEET_LOCATION_COLUMN = {"pdf": "filepath", "ebook": "url"}
+
+def _ensure_columns(df, columns):
+    for col in columns:
+        if col not in df.columns:
+            df[col] = None
+    return df
+
+def _title_key(title):
+    """What edits match titles on: stripped and lower-cased; a missing title (None/NaN) is "" and matches nothing."""
+    if title is None or (isinstance(title, float) and math.isnan(title)):
+        return ""
+    return str(title).strip().lower()
+
+def _title_mask(df, title):
+    key = _title_key(title)
+    if not key or 'title' not in df.columns:
+        return pd.Series(False, index=df.index)
+    return df['title'].fillna("").astype(str).str.strip().str.lower() == key
+
+def _bump_catalog_generation(c):
+    c.execute("""INSERT INTO settings (key, value) VALUES ('catalog_generation', '1')
+                 ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1""")
+
+def catalog_version():
+    """Changes whenever the catalog does (in this or any other process)."""
+    if CATALOG_BACKEND == "sqlite":
+        row = db.query_one("SELECT value FROM settings WHERE key='catalog_generation'")
+        return ("sqlite", DB_PATH, row[0] if row else "0")
+    try:
+        st = os.stat(EXCEL_PATH)
+        return ("excel", EXCEL_PATH, st.st_mtime_ns, st.st_size, catalog_journal.stat_key())
+    except OSError:
+        return ("excel", EXCEL_PATH)
+
+def load_catalog():
+    """Return the catalog as (pdf_df, ebook_df), in the same shape load_excel() produces."""
+    if CATALOG_BACKEND != "sqlite":
+        return load_excel()
+    conn = db.connect()
+    pdf_df = pd.read_sql_query("SELECT title, author, location AS filepath, digest FROM books WHERE source='pdf' ORDER BY id", conn)
+    ebook_df = pd.read_sql_query("SELECT title, author, location AS url FROM books WHERE source<>'pdf' ORDER BY id", conn)
+    return pdf_df, ebook_df
+
+def catalog_add(title, author, typ, location=""):
+    source = "pdf" if typ == "pdf" else "ebook"
+    if CATALOG_BACKEND == "sqlite":
+        digest = blob_store.put(location) if source == "pdf" and location and os.path.isfile(location) else None
+        with db.transaction() as conn:
+            conn.execute("INSERT INTO books (title, author, source, location, digest) VALUES (?, ?, ?, ?, ?)",
+                         (title, author, source, location, digest))
+            _bump_catalog_generation(conn)
+        return
+    # if user didn't provide a filepath, leave it blank — app will search script folder by title when opening
+    catalog_journal.append({"op": "add", "title": title, "author": author, "source": source, "location": location})
+
+def catalog_delete(title):
+    """Delete every book whose title matches (case-insensitive). Returns the number of rows removed."""
+    key = _title_key(title)
+    if not key:
+        return 0
+    if CATALOG_BACKEND == "sqlite":
+        with db.transaction() as conn:
+            _bump_catalog_generation(conn)
+            return conn.execute("DELETE FROM books WHERE lower(title) = ?", (key,)).rowcount
+    n = sum(1 for b in load_excel_records() if _title_key(b.title) == key)
+    if n:
+        catalog_journal.append({"op": "delete", "title": title})
+    return n
+
+def catalog_modify(old_title, new_title="", new_author=""):
+    """Rename/re-author every book titled `old_title`. Returns the number of rows matched."""
+    key = _title_key(old_title)
+    if not key:
+        return 0
+    if CATALOG_BACKEND == "sqlite":
+        with db.transaction() as conn:
+            _bump_catalog_generation(conn)
+            return conn.execute("""UPDATE books SET title = COALESCE(NULLIF(?, ''), title),
+                                                    author = COALESCE(NULLIF(?, ''), author)
+                                   WHERE lower(title) = ?""", (new_title, new_author, key)).rowcount
+    matched = sum(1 for b in load_excel_records() if _title_key(b.title) == key)
+    if matched and (new_title or new_author):
+        catalog_journal.append({"op": "modify", "title": old_title, "new_title": new_title, "new_author": new_author})
+    return matched
+
+def _catalog_rows(records):
+    """(title, author, source, location, digest) rows for the books table, from catalog records."""
+    for rec in records:
+        title = rec.get('title')
+        if title is None or not str(title).strip():
+            continue
+        author, digest = rec.get('author'), rec.get('digest')
+        loc_cols = (SHEET_LOCATION_COLUMN[rec['source']], 'path', 'file path', 'file', 'file_path', 'url', 'link', 'website')
+        location = next((str(rec[c]).strip() for c in loc_cols if rec.get(c) is not None and str(rec[c]).strip()), "")
+        yield (str(title).strip(), None if author is None else str(author).strip(), rec['source'], location,
+               None if digest is None else str(digest))
+
+def _is_catalog_workbook(path):
+    return not path or os.path.abspath(path) == os.path.abspath(EXCEL_PATH)
+
+def import_catalog_from_excel(path=None):
+    """Replace the books table with the contents of the workbook. Returns the number of books imported."""
+    if _is_catalog_workbook(path):
+        catalog_journal.compact()  # edits still in the journal are part of the catalog too
+    with db.transaction() as conn:
+        conn.execute("DELETE FROM books")
+        n = conn.executemany("INSERT INTO books (title, author, source, location, digest) VALUES (?, ?, ?, ?, ?)",
+                             _catalog_rows(iter_workbook_records(path or EXCEL_PATH))).rowcount
+        _bump_catalog_generation(conn)
+    return n
+
+def export_catalog_to_excel(path=None):
+    """Write the books table out to the "Book PDF" / "E-Book" sheets of a workbook."""
+    pdf_df, ebook_df = load_catalog()
+    if _is_catalog_workbook(path):
+        # the export supersedes any journaled edits; fold() keeps the seq rising so none replay on top
+        with catalog_journal.exclusive():
+            catalog_journal.fold(pdf_df, ebook_df)
+    else:
+        write_excel(pdf_df, ebook_df, path)
+    return len(pdf_df) + len(ebook_df)
+
+def seed_catalog_from_excel():
+    # first run against this DB: books has never held a row, so pull the existing workbook in
+    if CATALOG_BACKEND != "sqlite" or not os.path.exists(EXCEL_PATH):
+        return
+    try:
+        used = db.query_one("SELECT 1 FROM sqlite_sequence WHERE name='books'")
+    except sqlite3.OperationalError:
+        used = None  # sqlite_sequence does not exist until the first AUTOINCREMENT insert
+    if not used:
+        try:
+            import_catalog_from_excel()
+        except Exception as e:
+            print("Failed to import catalog from Excel:", e)
+
+# ---------- Bulk catalog edits ----------
+def _excel_catalog_frame(pdf_df, ebook_df):
+    """Both sheets as one frame (key, title, author, source, location, digest); key is (source, sheet row)."""
+    parts = []
+    for source, df in (("pdf", pdf_df), ("ebook", ebook_df)):
+        if df.empty or 'title' not in df.columns:
+            continue
+        location = pd.Series("", index=df.index)
+        for col in reversed([c for c in (SHEET_LOCATION_COLUMN[source], *PDF_LOCATION_COLUMNS, *URL_COLUMNS) if c in df.columns]):
+            values = df[col].fillna("").astype(str).str.strip()
+            location = values.where(values != "", location)  # first non-empty column wins
+        parts.append(pd.DataFrame({
+            'key': [(source, i) for i in df.index],
+            'title': df['title'].fillna("").astype(str).str.strip(),
+            'author': df['author'] if 'author' in df.columns else None,
+            'source': source,
+            'location': location,
+            'digest': df['digest'] if 'digest' in df.columns else None,
+        }))
+    if not parts:
+        return pd.DataFrame(columns=['key', 'title', 'author', 'source', 'location', 'digest'])
+    return pd.concat(parts, ignore_index=True)
+
+def _bulk_mask(cat, titles=None, author=None, pattern=None, missing_file=False):
+    """Rows matching every given condition, as one boolean Series over `cat`."""
+    titles = {str(t).strip().lower() for t in (titles or ()) if str(t).strip()}
+    author = (author or "").strip().lower()
+    if not (titles or author or pattern or missing_file):
+        raise LibraryError("Choose at least one condition.", "Bulk edit")
+    mask = pd.Series(True, index=cat.index)
+    if titles:
+        mask &= cat['title'].str.lower().isin(titles)
+    if author:
+        mask &= cat['author'].fillna("").astype(str).str.strip().str.lower() == author
+    if pattern:
+        try:
+            rx = re.compile(pattern, re.IGNORECASE)
+        except re.error as e:
+            raise LibraryError(f"Invalid title pattern: {e}", "Bulk edit")
+        # rx.search rather than str.contains: the pattern may carry groups for the substitution
+        mask &= cat['title'].fillna("").astype(str).map(rx.search).notna()
+    if missing_file:
+        # the filesystem has to be asked per file, but only for PDF rows still in play, once per distinct row
+        candidates = mask & (cat['source'] == 'pdf')
+        found = {}
+        def present(title, location, digest):
+            # the same exact check that opening and serving the book use: a file whose name merely
+            # contains the title is another book, so this one is still missing
+            title, location, digest = (v if isinstance(v, str) else None for v in (title, location, digest))
+            key = (title, location, digest)
+            if key not in found:
+                found[key] = bool(blob_store.find(digest) or exact_pdf(title, location))
+            return found[key]
+        sub = cat[candidates]
+        missing = pd.Series(False, index=cat.index)
+        missing[candidates] = [not present(t, l, d) for t, l, d in zip(sub['title'], sub['location'], sub['digest'])]
+        mask &= missing
+    return mask
+
+def _bulk_conflict(detail):
+    return LibraryError(f"The catalog changed since the preview ({detail}). Preview again.", "Bulk edit", "conflict")
+
+def _same_value(a, b):
+    return (pd.isna(a) and pd.isna(b)) or a == b
+
+@metrics.timed("catalog_bulk")
+def catalog_bulk(action, titles=None, author=None, pattern=None, missing_file=False,
+                 new_title="", new_author="", dry_run=False, keys=None):
+    """Delete or modify every book matching all the given conditions, in one write.
+
+    Conditions: exact `titles` (case-insensitive), `author`, a title regex `pattern` and/or
+    `missing_file` (PDF rows whose file cannot be found). For "modify", `new_author` replaces the
+    author and `new_title` replaces the title, or with a `pattern` is its re.sub() replacement
+    (so \\1 works). Returns the affected rows (key, title, author, source, location, plus
+    new_title / new_author for modify); with dry_run nothing is written.
+
+    Rows are matched without holding a lock (the missing-file check can take seconds) and then
+    written by key in one short write that re-checks each row's title and author. Passing a dry
+    run's `key` column as `keys` applies exactly that preview. If the rows matched now differ
+    from it, or a row was edited in between, LibraryError is raised and nothing is written."""
+    if action not in ("delete", "modify"):
+        raise ValueError(f"unknown bulk action {action!r}")
+    if action == "modify" and not (new_title or new_author):
+        raise LibraryError("Enter a new title and/or author.", "Bulk edit")
+
+    def plan(cat):
+        hit = cat[_bulk_mask(cat, titles, author, pattern, missing_file)].copy()
+        if action == "modify":
+            if new_title and pattern:
+                hit['new_title'] = hit['title'].str.replace(pattern, new_title, case=False, regex=True)
+            else:
+                hit['new_title'] = new_title or hit['title']
+            hit['new_author'] = new_author or hit['author']
+        return hit
+
+    if CATALOG_BACKEND == "sqlite":
+        hit = plan(pd.read_sql_query("SELECT id AS key, title, author, source, location, digest FROM books "
+                                     "ORDER BY source<>'pdf', id", db.connect()))
+    else:
+        hit = plan(_excel_catalog_frame(*load_excel()))
+    if keys is not None and set(hit['key']) != set(keys):
+        raise _bulk_conflict(f"{len(hit)} books match now, {len(keys)} were previewed")
+    if dry_run or not len(hit):
+        return hit.drop(columns=['digest']).reset_index(drop=True)
+
+    authors = [None if pd.isna(a) else a for a in hit['author']]
+    if CATALOG_BACKEND == "sqlite":
+        ids = [int(k) for k in hit['key']]
+        with db.transaction() as conn:
+            if action == "delete":
+                n = conn.executemany("DELETE FROM books WHERE id=? AND title=? AND author IS ?",
+                                     zip(ids, hit['title'], authors)).rowcount
+            else:
+                n = conn.executemany("UPDATE books SET title=?, author=? WHERE id=? AND title=? AND author IS ?",
+                                     zip(hit['new_title'], [None if pd.isna(a) else a for a in hit['new_author']],
+                                         ids, hit['title'], authors)).rowcount
+            if n != len(ids):  # raising rolls the whole write back
+                raise _bulk_conflict(f"{len(ids) - n} of the books were edited or removed")
+            _bump_catalog_generation(conn)
+    else:
+        with catalog_journal.exclusive():
+            pdf_df, ebook_df = load_excel()
+            cat = _excel_catalog_frame(pdf_df, ebook_df)
+            current = dict(zip(cat['key'], zip(cat['title'], cat['author'])))
+            for key, title, auth in zip(hit['key'], hit['title'], authors):
+                now = current.get(key)
+                if now is None or now[0] != title or not _same_value(now[1], auth):
+                    raise _bulk_conflict(f"'{title}' was edited or removed")
+            frames = {"pdf": pdf_df, "ebook": ebook_df}
+            for source in frames:
+                rows = hit[hit['source'] == source]
+                index = [k[1] for k in rows['key']]
+                if not index:
+                    continue
+                df = frames[source]
+                if action == "delete":
+                    frames[source] = df.drop(index=index)
+                else:
+                    df.loc[index, 'title'] = rows['new_title'].to_numpy()
+                    df.loc[index, 'author'] = rows['new_author'].to_numpy()
+            catalog_journal.fold(frames["pdf"], frames["ebook"])
+    return hit.drop(columns=['digest']).reset_index(drop=True)
+
+# ---------- Bulk ingestion ----------
+INGEST_LOCATION_COLUMNS = ['location', 'filepath', 'path', 'file path', 'file', 'file_path', 'url', 'link', 'website']
+
+def _lower_keys(rec):
+    return {str(k).lower().strip(): v for k, v in rec.items() if k is not None}
+
+def iter_ingest_records(path):
+    """Stream raw records (dicts with lower-cased keys) from a .csv, .jsonl/.ndjson or .xlsx file.
+
+    Workbook rows from the "Book PDF" / "E-Book" sheets get their source from the sheet name."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".csv", ".tsv"):
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            for rec in csv.DictReader(f, delimiter="\t" if ext == ".tsv" else ","):
+                yield _lower_keys(rec)
+    elif ext in (".jsonl", ".ndjson"):
+        with open(path, encoding="utf-8") as f:
+            for lineno, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    yield {"_error": f"line {lineno}: not valid JSON"}
+                    continue
+                yield _lower_keys(rec) if isinstance(rec, dict) else {"_error": f"line {lineno}: not a JSON object"}
+    elif ext in (".xlsx", ".xlsm"):
+        import openpyxl
+        wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            for ws in wb.worksheets:
+                if ws.title == JOURNAL_META_SHEET:
+                    continue
+                sheet_source = {SHEET_BOOK_PDF: "pdf", SHEET_EBOOK: "ebook"}.get(ws.title)
+                for rec in _sheet_rows(ws):
+                    if sheet_source and not rec.get('source') and not rec.get('type'):
+                        rec['source'] = sheet_source
+                    yield rec
+        finally:
+            wb.close()
+    else:
+        raise ValueError(f"Unsupported file type '{ext}' (use .csv, .jsonl or .xlsx)")
+
+def _ingest_row(rec):
+    """(title, author, source, location) for a raw record; raises ValueError when it is unusable."""
+    if "_error" in rec:
+        raise ValueError(rec["_error"])
+    def text(value):
+        return "" if value is None or (isinstance(value, float) and pd.isna(value)) else str(value).strip()
+    title = text(rec.get('title'))
+    if not title:
+        raise ValueError("missing title")
+    location = next((text(rec.get(c)) for c in INGEST_LOCATION_COLUMNS if text(rec.get(c))), "")
+    kind = text(rec.get('source') or rec.get('type')).lower()
+    if kind in ("pdf", "book pdf"):
+        source = "pdf"
+    elif kind in ("ebook", "e-book", "online", "url"):
+        source = "ebook"
+    elif not kind:
+        source = "ebook" if is_url(location) else "pdf"
+    else:
+        raise ValueError(f"unknown type '{kind}'")
+    return title, text(rec.get('author')) or None, source, location
+
+def ingest_catalog(paths, batch_size=INGEST_BATCH, progress=None):
+    """Validate, de-duplicate and append books from `paths` to the catalog.
+
+    Duplicates (same normalized title and author, in the catalog or earlier in the input) are
+    skipped. On the sqlite backend every row goes in with executemany() batches of `batch_size`
+    inside one write transaction; the excel backend rewrites the workbook once at the end.
+    `progress(stats)` is called after each batch. Returns the stats dict."""
+    if isinstance(paths, str):
+        paths = [paths]
+    stats = {"read": 0, "added": 0, "duplicates": 0, "invalid": 0, "errors": [], "seconds": 0.0, "rows_per_sec": 0.0}
+    started = time.perf_counter()
+
+    def tick():
+        stats["seconds"] = time.perf_counter() - started
+        stats["rows_per_sec"] = stats["read"] / stats["seconds"] if stats["seconds"] else 0.0
+        if progress:
+            progress(stats)
+
+    def batches(seen):
+        batch = []
+        for path in paths:
+            for rec in iter_ingest_records(path):
+                stats["read"] += 1
+                try:
+                    row = _ingest_row(rec)
+                except ValueError as e:
+                    stats["invalid"] += 1
+                    if len(stats["errors"]) < 20:
+                        stats["errors"].append(f"{os.path.basename(path)} #{stats['read']}: {e}")
+                    continue
+                key = (normalize_text(row[0]), normalize_text(row[1] or ""))
+                if key in seen:
+                    stats["duplicates"] += 1
+                    continue
+                seen.add(key)
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    if CATALOG_BACKEND == "sqlite":
+        with db.transaction() as conn:
+            seen = {(normalize_text(t), normalize_text(a or "")) for t, a in conn.execute("SELECT title, author FROM books")}
+            for batch in batches(seen):
+                conn.executemany("INSERT INTO books (title, author, source, location) VALUES (?, ?, ?, ?)", batch)
+                stats["added"] += len(batch)
+                tick()
+            if stats["added"]:
+                _bump_catalog_generation(conn)
+    else:
+        seen = {(b.norm_title, normalize_text(b.author or "")) for b in load_excel_records()}
+        for batch in batches(seen):
+            # one fsync'd journal append per batch; the compactor folds them into the workbook
+            catalog_journal.append(*({"op": "add", "title": title, "author": author, "source": source, "location": location}
+                                     for title, author, source, location in batch))
+            stats["added"] += len(batch)
+            tick()
+    tick()
+    return stats
+
+# ---------- Blob store ----------
+class BlobStore:
+    """PDFs stored once, under their SHA-256: `<root>/<first two hex digits>/<digest>.pdf`.
+
+    Catalog, issue and purchase rows carry the digest, so opening a book is a path join
+    instead of a title search, and renaming or re-adding a file cannot break or duplicate it."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest + ".pdf")
+
+    def find(self, digest):
+        if not digest:
+            return None
+        p = self.path(digest)
+        return p if os.path.isfile(p) else None
+
+    def put(self, src, digest=None):
+        """Add `src` (no copy if its content is already stored). Returns the digest.
+
+        The blob's mtime is set to now either way: the row that will reference it is written
+        after this returns, and gc() leaves blobs that recent alone."""
+        digest = digest or file_sha256(src)
+        dst = self.path(digest)
+        if not os.path.isfile(dst):
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            deliver_file(src, dst, hardlink=False)
+        os.utime(dst)
+        return digest
+
+    def hash_many(self, paths, workers=BLOB_HASH_WORKERS):
+        """{path: digest} for `paths`, hashed in parallel (hashlib releases the GIL on each chunk)."""
+        def digest_or_none(p):
+            try:
+                return file_sha256(p)
+            except OSError:
+                return None
+        paths = list(paths)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hash") as pool:
+            return dict(zip(paths, pool.map(digest_or_none, paths)))
+
+    def digests(self):
+        if not os.path.isdir(self.root):
+            return
+        for sub in os.scandir(self.root):
+            if sub.is_dir():
+                for entry in os.scandir(sub.path):
+                    if entry.name.endswith(".pdf") and entry.is_file():
+                        yield entry.name[:-4]
+
+    def gc(self, referenced, dry_run=False, grace_s=BLOB_GC_GRACE_S):
+        """Delete blobs whose digest is not in `referenced` and that were not put in the last
+        `grace_s` seconds. Returns (count, bytes) removed."""
+        count = freed = 0
+        cutoff = time.time() - grace_s
+        for digest in list(self.digests()):
+            if digest in referenced:
+                continue
+            p = self.path(digest)
+            st = os.stat(p)
+            if st.st_mtime > cutoff:
+                continue  # may belong to a row being written right now
+            freed += st.st_size
+            count += 1
+            if not dry_run:
+                os.remove(p)
+        return count, freed
+
+blob_store = BlobStore(BLOB_DIR)
+BLOB_TABLES = ("books", "issued_books", "purchased_books")
+
+def referenced_digests():
+    digests = set()
+    for table in BLOB_TABLES:
+        digests.update(r[0] for r in db.query(f"SELECT DISTINCT digest FROM {table} WHERE digest IS NOT NULL"))
+    return digests
+
+def ingest_blobs(workers=BLOB_HASH_WORKERS):
+    """Copy every PDF the database points at into the blob store and record its digest on the row.
+    Returns counts of rows linked, unique blobs and unresolved rows.
+
+    A row is linked only through its stored path or a file named exactly like its title: the
+    digest then wins over every other lookup, so a partial-title guess could tie the row to
+    another book for good."""
+    refs, missing = {}, 0
+    for table in BLOB_TABLES:
+        for rid, title, location in db.query(f"SELECT id, title, location FROM {table} WHERE source='pdf' AND digest IS NULL"):
+            path = exact_pdf(title, location)
+            if path:
+                refs.setdefault(path, []).append((table, rid))
+            else:
+                missing += 1
+    digests = {p: d for p, d in blob_store.hash_many(refs, workers).items() if d}
+    for path, digest in digests.items():
+        blob_store.put(path, digest)
+    linked = 0
+    with db.transaction() as c:
+        for path, digest in digests.items():
+            for table, rid in refs[path]:
+                c.execute(f"UPDATE {table} SET digest=? WHERE id=?", (digest, rid))
+                linked += 1
+        if any(table == "books" for path in digests for table, _ in refs[path]):
+            _bump_catalog_generation(c)
+    return {"linked": linked, "blobs": len(set(digests.values())), "missing": missing + len(refs) - len(digests)}
+
+def gc_blobs(dry_run=False):
+    return blob_store.gc(referenced_digests(), dry_run)
+
+# ---------- PDF metadata ----------
+HAS_PYMUPDF = importlib.util.find_spec("fitz") is not None
+HAS_PYPDF = importlib.util.find_spec("pypdf") is not None
+PDF_METADATA_FIELDS = ("pages", "title", "author", "subject", "producer", "thumbnail")
+
+def _pdf_string(value):
+    value = str(value).strip() if value is not None else ""
+    return value or None
+
+def _pdf_literal(raw):
+    """Decode the bytes of a PDF (...) string: backslash escapes, then UTF-16 or (close enough to
+    PDFDocEncoding and the usual WinAnsi fonts) cp1252."""
+    escapes = {b"n": b"\n", b"r": b"\r", b"t": b"\t", b"b": b"\b", b"f": b"\f"}
+    def unescape(m):
+        e = m.group(1)
+        if e[:1].isdigit():
+            return bytes([int(e, 8) & 0xFF])
+        return escapes.get(e, e if e not in (b"\r\n", b"\n", b"\r") else b"")
+    data = re.sub(rb"\\([0-7]{1,3}|\r\n|.)", unescape, raw, flags=re.S)
+    if data.startswith(b"\xfe\xff"):
+        return data[2:].decode("utf-16-be", "replace")
+    return data.decode("cp1252", "replace")
+
+def extract_pdf_metadata(path, thumb_width=THUMB_WIDTH):
+    """Page count, document info and a first-page PNG thumbnail for one PDF (runs in a worker process).
+
+    Uses PyMuPDF when installed (the only backend that renders thumbnails), else pypdf, else a
+    byte-level scan that only sees uncompressed page/info objects."""
+    info = dict.fromkeys(PDF_METADATA_FIELDS)
+    if HAS_PYMUPDF:
+        import fitz
+        with fitz.open(path) as doc:
+            meta = doc.metadata or {}
+            info.update({k: _pdf_string(meta.get(k)) for k in ("title", "author", "subject", "producer")})
+            info["pages"] = doc.page_count
+            if doc.page_count:
+                page = doc.load_page(0)
+                zoom = thumb_width / (page.rect.width or thumb_width)
+                info["thumbnail"] = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom)).tobytes("png")
+        return info
+    if HAS_PYPDF:
+        from pypdf import PdfReader
+        reader = PdfReader(path)
+        meta = reader.metadata or {}
+        info.update({k: _pdf_string(meta.get("/" + k.capitalize())) for k in ("title", "author", "subject", "producer")})
+        info["pages"] = len(reader.pages)
+        return info
+    with open(path, "rb") as f:
+        data = f.read()
+    # the same page-tree walk as the full-text indexer, so both report the same page count
+    info["pages"] = len(_pdf_pages(_pdf_objects(data))) or None
+    for key in ("title", "author", "subject", "producer"):
+        m = re.search(rb"/" + key.capitalize().encode() + rb"\s*\(((?:\\.|[^\\)])*)\)", data)
+        if m:
+            info[key] = _pdf_string(_pdf_literal(m.group(1)))
+    return info
+
+def spawn_pool(workers):
+    """Process pool with the spawn start method (fork is unsafe next to Tk and worker threads)."""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+class MetadataPipeline:
+    """Runs extract_pdf_metadata() over PDFs in a process pool and caches the results in
+    INDEX_DB_PATH keyed by (path, mtime, size), so an unchanged file is only ever read once.
+
+    Lookups (cached()) are a single indexed query and never wait for extraction."""
+
+    def __init__(self, workers=METADATA_WORKERS):
+        self.workers = workers
+        self._pool = None
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return os.path.abspath(path), st.st_mtime_ns, st.st_size
+
+    def cached(self, path):
+        """Metadata dict for `path` if the cache is current for it, else None."""
+        key = self._key(path) if path else None
+        if not key:
+            return None
+        row = index_db.query_one(f"SELECT {', '.join(PDF_METADATA_FIELDS)}, error FROM pdf_metadata WHERE path=? AND mtime_ns=? AND size=?", key)
+        if not row:
+            return None
+        meta = dict(zip(PDF_METADATA_FIELDS + ("error",), row))
+        meta["size"] = key[2]
+        return meta
+
+    def pending(self, path):
+        return bool(path) and os.path.abspath(path) in self._pending
+
+    def submit(self, paths):
+        """Queue every path whose cache entry is missing or stale. Returns the number queued."""
+        queued = 0
+        for path in paths:
+            key = self._key(path) if path else None
+            if not key or key[0] in self._pending or self.cached(path):
+                continue
+            with self._lock:
+                if self._pool is None:
+                    self._pool = spawn_pool(self.workers)
+                future = self._pool.submit(extract_pdf_metadata, key[0])
+                self._pending[key[0]] = future
+            future.add_done_callback(functools.partial(self._store, key))
+            queued += 1
+        return queued
+
+    def _store(self, key, future):
+        try:
+            meta, error = future.result(), None
+        except Exception as e:
+            meta, error = dict.fromkeys(PDF_METADATA_FIELDS), f"{type(e).__name__}: {e}"
+        try:
+            with index_db.transaction() as c:
+                c.execute(f"""INSERT OR REPLACE INTO pdf_metadata (path, mtime_ns, size, {', '.join(PDF_METADATA_FIELDS)}, error, extracted_at)
+                              VALUES (?, ?, ?, {', '.join('?' * len(PDF_METADATA_FIELDS))}, ?, ?)""",
+                          key + tuple(meta.get(k) for k in PDF_METADATA_FIELDS) + (error, datetime.now().isoformat()))
+        finally:
+            self._pending.pop(key[0], None)
+
+    def wait(self):
+        for future in list(self._pending.values()):
+            try:
+                future.result()
+            except Exception:
+                pass
+        while self._pending:  # done-callbacks may still be writing
+            time.sleep(0.01)
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+def init_index_db():
+    with index_db.transaction() as c:
+        c.execute("""CREATE TABLE IF NOT EXISTS pdf_metadata (
+                        path TEXT PRIMARY KEY,
+                        mtime_ns INTEGER NOT NULL,
+                        size INTEGER NOT NULL,
+                        pages INTEGER,
+                        title TEXT,
+                        author TEXT,
+                        subject TEXT,
+                        producer TEXT,
+                        thumbnail BLOB,
+                        error TEXT,
+                        extracted_at TEXT
+                    )""")
+        c.execute("""CREATE TABLE IF NOT EXISTS fts_files (
+                        path TEXT PRIMARY KEY,
+                        mtime_ns INTEGER NOT NULL,
+                        size INTEGER NOT NULL,
+                        pages INTEGER,
+                        indexed_at TEXT
+                    )""")
+        c.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS fts_pages
+                     USING fts5(text, path UNINDEXED, page UNINDEXED, tokenize='unicode61 remove_diacritics 2')""")
+
+metadata_pipeline = MetadataPipeline()
+
+# ---------- Full-text index ----------
+def _pdf_objects(data):
+    """{object number: body bytes}, including objects packed into compressed object streams."""
+    objects = {int(m.group(1)): m.group(2) for m in re.finditer(rb"(\d+)\s+\d+\s+obj\b(.*?)\bendobj", data, re.S)}
+    for body in [b for b in objects.values() if re.search(rb"/Type\s*/ObjStm\b", b[:512])]:
+        first = re.search(rb"/First\s+(\d+)", body)
+        packed = _pdf_stream(body)
+        if not first or not packed:
+            continue
+        first = int(first.group(1))
+        header = [int(x) for x in packed[:first].split()]
+        offsets = list(zip(header[::2], header[1::2]))
+        for i, (num, off) in enumerate(offsets):
+            end = first + offsets[i + 1][1] if i + 1 < len(offsets) else len(packed)
+            objects.setdefault(num, packed[first + off:end])
+    return objects
+
+def _pdf_refs(body, key):
+    m = re.search(rb"/" + key + rb"\s*(\[[^\]]*\]|\d+\s+\d+\s+R)", body)
+    return [int(n) for n in re.findall(rb"(\d+)\s+\d+\s+R", m.group(1))] if m else []
+
+def _pdf_stream(body):
+    m = re.search(rb"stream\r?\n(.*?)\r?\n?endstream", body, re.S)
+    if not m:
+        return b""
+    if b"/FlateDecode" in body[:m.start()]:
+        try:
+            return zlib.decompress(m.group(1))
+        except zlib.error:
+            return b""
+    return m.group(1)
+
+def _pdf_pages(objects):
+    """Page object bodies in document order, by walking the page tree from its root.
+
+    Counting "/Type /Page" in the raw bytes instead misses pages packed into object streams
+    and counts pages superseded by incremental updates twice."""
+    kids = {n for body in objects.values() for n in _pdf_refs(body, b"Kids")}
+    roots = [n for n, body in objects.items() if re.search(rb"/Type\s*/Pages\b", body) and n not in kids]
+    pages, stack, seen = [], list(reversed(roots)), set()
+    while stack:
+        n = stack.pop()
+        if n in seen or n not in objects:
+            continue
+        seen.add(n)
+        body = objects[n]
+        if re.search(rb"/Type\s*/Pages\b", body):
+            stack.extend(reversed(_pdf_refs(body, b"Kids")))
+        elif re.search(rb"/Type\s*/Page\b", body):
+            pages.append(body)
+    return pages
+
+def _content_text(content):
+    """Text shown by Tj/TJ/'/" operators in a content stream, with spaces for kerning gaps and moves."""
+    out = []
+    token = re.compile(rb"\[((?:\((?:\\.|[^\\)])*\)|<[0-9A-Fa-f\s]*>|[^\]])*)\]\s*TJ"
+                       rb"|\(((?:\\.|[^\\)])*)\)\s*(?:Tj|'|\")|<([0-9A-Fa-f\s]*)>\s*Tj|\b(T\*|Td|TD|Tm|ET)\b", re.S)
+    part = re.compile(rb"\(((?:\\.|[^\\)])*)\)|<([0-9A-Fa-f\s]*)>|(-?\d+(?:\.\d+)?)")
+    for m in token.finditer(content):
+        if m.group(1) is not None:
+            for p in part.finditer(m.group(1)):
+                if p.group(3) is not None:
+                    if float(p.group(3)) < -150:
+                        out.append(" ")
+                else:
+                    out.append(_pdf_literal(p.group(1)) if p.group(1) is not None else bytes.fromhex(p.group(2).decode()).decode("latin-1"))
+        elif m.group(2) is not None:
+            out.append(_pdf_literal(m.group(2)))
+        elif m.group(3) is not None:
+            out.append(bytes.fromhex(m.group(3).decode()).decode("latin-1"))
+        elif out and not out[-1].endswith(" "):
+            out.append(" ")
+    return " ".join(re.sub(r"[\x00-\x08\x0b\x0c\x0e-\x1f]", "", "".join(out)).split())
+
+def extract_pdf_text(path):
+    """[(page number, text)] for one PDF (runs in a worker process).
+
+    PyMuPDF or pypdf when installed; otherwise the page tree is walked by hand, which handles
+    plain and Flate-compressed content streams with simple font encodings."""
+    if HAS_PYMUPDF:
+        import fitz
+        with fitz.open(path) as doc:
+            return [(i + 1, page.get_text()) for i, page in enumerate(doc)]
+    if HAS_PYPDF:
+        from pypdf import PdfReader
+        return [(i + 1, page.extract_text() or "") for i, page in enumerate(PdfReader(path).pages)]
+    with open(path, "rb") as f:
+        objects = _pdf_objects(f.read())
+    pages = _pdf_pages(objects)
+    def contents(body):
+        for ref in _pdf_refs(body, b"Contents"):
+            obj = objects.get(ref, b"")
+            if b"stream" in obj:
+                yield _pdf_stream(obj)
+            else:  # /Contents pointing at an array object
+                yield from (_pdf_stream(objects.get(int(r), b"")) for r in re.findall(rb"(\d+)\s+\d+\s+R", obj))
+    return [(i + 1, _content_text(b"\n".join(contents(body)))) for i, body in enumerate(pages)]
+
+def _fts_query(text):
+    """User text -> FTS5 query: words are ANDed, "quoted phrases" kept, the last word is a prefix."""
+    terms = re.findall(r'"[^"]+"|[^\s"]+', text or "")
+    out = []
+    for i, term in enumerate(terms):
+        phrase = term.strip('"').replace('"', "")
+        if not phrase.strip():
+            continue
+        prefix = i == len(terms) - 1 and not term.startswith('"')
+        out.append(f'"{phrase}"' + ("*" if prefix else ""))
+    return " ".join(out)
+
+class FullTextIndex:
+    """FTS5 index of PDF page text in INDEX_DB_PATH (next to the user database).
+
+    update() extracts text in worker processes, but only for files whose (mtime, size) changed
+    since they were last indexed; files that disappeared are dropped from the index."""
+
+    def __init__(self, workers=METADATA_WORKERS):
+        self.workers = workers
+        self._lock = threading.Lock()
+
+    def update(self, paths, progress=None):
+        with self._lock:
+            started = time.perf_counter()
+            keys = {}
+            for path in paths:
+                key = MetadataPipeline._key(path)
+                if key:
+                    keys[key[0]] = key
+            known = {r[0]: (r[0], r[1], r[2]) for r in index_db.query("SELECT path, mtime_ns, size FROM fts_files")}
+            stale = [p for p, key in keys.items() if known.get(p) != key]
+            gone = [p for p in known if p not in keys]
+            with index_db.transaction() as c:
+                for p in gone:
+                    c.execute("DELETE FROM fts_pages WHERE path=?", (p,))
+                    c.execute("DELETE FROM fts_files WHERE path=?", (p,))
+            stats = {"indexed": 0, "unchanged": len(keys) - len(stale), "removed": len(gone), "failed": 0, "pages": 0}
+            if stale:
+                with spawn_pool(min(self.workers, len(stale))) as pool:
+                    futures = {pool.submit(extract_pdf_text, p): p for p in stale}
+                    for future in as_completed(futures):
+                        path = futures[future]
+                        try:
+                            pages = future.result()
+                        except Exception:
+                            pages, stats["failed"] = [], stats["failed"] + 1
+                        with index_db.transaction() as c:
+                            c.execute("DELETE FROM fts_pages WHERE path=?", (path,))
+                            c.executemany("INSERT INTO fts_pages (text, path, page) VALUES (?, ?, ?)",
+                                          [(text, path, n) for n, text in pages if text and text.strip()])
+                            c.execute("INSERT OR REPLACE INTO fts_files (path, mtime_ns, size, pages, indexed_at) VALUES (?, ?, ?, ?, ?)",
+                                      keys[path] + (len(pages), datetime.now().isoformat()))
+                        stats["indexed"] += 1
+                        stats["pages"] += len(pages)
+                        if progress:
+                            progress(stats, path)
+            stats["seconds"] = time.perf_counter() - started
+            return stats
+
+    def search(self, query, limit=20):
+        """[{'path', 'page', 'snippet', 'score'}] best match first; snippets mark hits with [ ]."""
+        q = _fts_query(query)
+        if not q:
+            return []
+        rows = index_db.query("""SELECT path, page, snippet(fts_pages, 0, '[', ']', '…', 12), bm25(fts_pages) AS score
+                                 FROM fts_pages WHERE fts_pages MATCH ? ORDER BY score LIMIT ?""", (q, limit))
+        return [{"path": p, "page": page, "snippet": snip, "score": score} for p, page, snip, score in rows]
+
+fulltext_index = FullTextIndex()
+
+def library_pdfs():
+    """Every PDF in the library folder (next to the script) and the blob store."""
+    found = []
+    for folder in (script_dir(), BLOB_DIR):
+        for root, _dirs, files in os.walk(folder):
+            found.extend(os.path.join(root, f) for f in files if f.lower().endswith(".pdf"))
+            if root == script_dir():
+                break  # only the top level of the script folder
+    return found
+
+# ---------- Search index ----------
+def _trigrams(key):
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+class SearchIndex:
+    """Inverted index over normalize_text() title/author keys.
+
+    Words map to record ids (prefix lookups bisect a sorted word list) and character
+    trigrams map to record ids (substring lookups intersect posting sets, then verify).
+    Record ids are positions in the list the index was built from."""
+
+    # rank of a hit, best first
+    EXACT, PREFIX, WORD_PREFIX, SUBSTRING, AUTHOR_PREFIX, AUTHOR_SUBSTRING = range(6)
+
+    def __init__(self, records):
+        self.titles = []
+        self.authors = []
+        self._words = {}
+        self._trigram_postings = {}
+        self._gram_counts = []
+        self._sorted_words = None
+        self._author_keys = {}  # authors repeat, so normalize (and store) each one once
+        for rd in records:
+            self.add(rd)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def add(self, rd):
+        rid = len(self.titles)
+        title = rd.norm_title if isinstance(rd, Book) else normalize_text(str(rd.get('title') or ""))
+        raw_author = str(rd.get('author') or "")
+        author = self._author_keys.get(raw_author)
+        if author is None:
+            author = self._author_keys[raw_author] = normalize_text(raw_author)
+        self.titles.append(title)
+        self.authors.append(author)
+        grams = _trigrams(title) | _trigrams(author)
+        for key in (title, author):
+            for w in key.split():
+                self._words.setdefault(w, set()).add(rid)
+        for g in grams:
+            self._trigram_postings.setdefault(g, set()).add(rid)
+        self._gram_counts.append(len(grams))
+        self._sorted_words = None
+        return rid
+
+    def _word_prefix_ids(self, prefix):
+        if self._sorted_words is None:
+            self._sorted_words = sorted(self._words)
+        ids = set()
+        i = bisect.bisect_left(self._sorted_words, prefix)
+        while i < len(self._sorted_words) and self._sorted_words[i].startswith(prefix):
+            ids |= self._words[self._sorted_words[i]]
+            i += 1
+        return ids
+
+    def _candidates(self, q):
+        if len(q) < 3:
+            # too short for trigrams: fall back to word prefixes
+            return self._word_prefix_ids(q)
+        postings = []
+        for g in _trigrams(q):
+            p = self._trigram_postings.get(g)
+            if not p:
+                return set()
+            postings.append(p)
+        postings.sort(key=len)
+        return postings[0].intersection(*postings[1:])
+
+    def rank(self, rid, q):
+        """Rank of record `rid` for normalized query `q`, or None if it does not match."""
+        title, author = self.titles[rid], self.authors[rid]
+        if title == q:
+            return self.EXACT
+        if title.startswith(q):
+            return self.PREFIX
+        if " " + q in " " + title:
+            return self.WORD_PREFIX
+        if q in title:
+            return self.SUBSTRING
+        if author.startswith(q) or " " + q in " " + author:
+            return self.AUTHOR_PREFIX
+        if q in author:
+            return self.AUTHOR_SUBSTRING
+        return None
+
+    @metrics.timed("search")
+    def search(self, query, limit=None):
+        """Ids of records whose title or author contains `query`, best matches first."""
+        q = normalize_text(query)
+        if not q:
+            return []
+        hits = []
+        for rid in self._candidates(q):
+            r = self.rank(rid, q)
+            if r is not None:
+                hits.append((r, rid))
+        hits.sort()
+        ids = [rid for _, rid in hits]
+        return ids[:limit] if limit else ids
+
+    @metrics.timed("search_fuzzy")
+    def fuzzy(self, query, k=FUZZY_TOP_K, min_score=FUZZY_MIN_SCORE):
+        """Typo-tolerant top-k: [(score, rid)] best first, by trigram similarity to title + author.
+
+        The score is mostly the share of the query's trigrams a record contains, with a little
+        Dice similarity to prefer closer lengths. Only records that can still reach `min_score`
+        are counted: they must hit one of the query's rarest trigrams (pigeonhole), and the common
+        trigrams are then just set-membership checks on those candidates. Very common trigrams
+        ("the") are left out of candidate generation once FUZZY_MAX_CANDIDATES is exceeded, so a
+        query made only of them returns nothing rather than scanning the whole catalog."""
+        q = normalize_text(query)
+        grams = _trigrams(q)
+        if not grams:
+            return []
+        n = len(grams)
+        need = max(1, math.ceil(min_score * n))
+        postings = sorted((self._trigram_postings.get(g, ()) for g in grams), key=len)
+        rare, common = postings[:n - need + 1], postings[n - need + 1:]
+        while rare and sum(map(len, rare)) > FUZZY_MAX_CANDIDATES:
+            common.insert(0, rare.pop())
+        counts = {}
+        for p in rare:
+            for rid in p:
+                counts[rid] = counts.get(rid, 0) + 1
+        scored = []
+        for rid, shared in counts.items():
+            shared += sum(1 for p in common if rid in p)
+            if shared < need:
+                continue
+            score = 0.8 * shared / n + 0.2 * 2 * shared / (n + self._gram_counts[rid])
+            scored.append((score, rid))
+        return heapq.nlargest(k, scored, key=lambda t: (t[0], -t[1]))
+
+    def word_rank(self, rid, q):
+        """rank() restricted to the records a short (word-prefix) query can find."""
+        if len(q) >= 3:
+            return self.rank(rid, q)
+        if " " + q in " " + self.titles[rid] or " " + q in " " + self.authors[rid]:
+            return self.rank(rid, q)
+        return None
+
+    def reorder(self, matched_ids):
+        """Matched ids first, then every other record in its original order (a lazy view)."""
+        return MatchesFirst(matched_ids, len(self.titles))
+
+class MatchesFirst:
+    """Read-only sequence of `matched` ids followed by the rest of range(n) in order.
+
+    Nothing beyond the matched ids is materialized: position p past them maps to the
+    (p - len(matched))-th unmatched id, found by bisecting the sorted matched ids."""
+
+    def __init__(self, matched, n):
+        self.matched = list(matched)
+        self._sorted = sorted(self.matched)
+        self.n = n
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, pos):
+        if pos < 0:
+            pos += self.n
+        if not 0 <= pos < self.n:
+            raise IndexError(pos)
+        m = len(self.matched)
+        if pos < m:
+            return self.matched[pos]
+        k = pos - m
+        # smallest id with k + 1 unmatched ids at or below it
+        lo, hi = k, k + m
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if mid + 1 - bisect.bisect_right(self._sorted, mid) > k:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+class SearchController:
+    """As-you-type search over a SearchIndex.
+
+    Keystrokes are debounced with after(); a newer keystroke cancels the pending query.
+    When the new query extends the previous one, the previous hits are narrowed instead of
+    querying the index again, so each keystroke only touches the shrinking result set."""
+
+    def __init__(self, widget, index, on_results, delay_ms=SEARCH_DEBOUNCE_MS):
+        self.widget = widget
+        self.index = index
+        self.on_results = on_results  # on_results(query, ranked_ids or None for "no filter")
+        self.delay_ms = delay_ms
+        self._pending = None
+        self._generation = 0
+        self._last_query = ""
+        self._last_ids = None
+
+    def schedule(self, query):
+        self.cancel()
+        gen = self._generation
+        self._pending = self.widget.after(self.delay_ms, lambda: self._run(gen, query))
+
+    def cancel(self):
+        self._generation += 1
+        if self._pending is not None:
+            try:
+                self.widget.after_cancel(self._pending)
+            except tk.TclError:
+                pass
+            self._pending = None
+
+    def _run(self, gen, query):
+        self._pending = None
+        if gen != self._generation:
+            return  # superseded by a later keystroke
+        q = normalize_text(query)
+        if q == self._last_query and (q or self._last_ids is None):
+            return  # nothing changed (e.g. arrow keys), keep the current rendering
+        self.on_results(query, self.search(query))
+
+    @metrics.timed("search_as_you_type")
+    def search(self, query):
+        q = normalize_text(query)
+        prev_q, prev_ids = self._last_query, self._last_ids
+        if not q:
+            ids = None
+        elif prev_ids is not None and q.startswith(prev_q) and (len(prev_q) >= 3 or len(q) < 3):
+            # short queries match word prefixes and longer ones substrings, so only narrow
+            # within the same mode (or from substring hits, which cover everything), with
+            # the same predicate a fresh index.search(q) applies
+            hits = []
+            for rid in prev_ids:
+                r = self.index.word_rank(rid, q)
+                if r is not None:
+                    hits.append((r, rid))
+            hits.sort()
+            ids = [rid for _, rid in hits]
+        else:
+            ids = self.index.search(q)
+        self._last_query, self._last_ids = q, ids
+        if ids is not None and len(ids) < FUZZY_FILL and len(q) >= 3:
+            # few exact hits (often a typo): follow them with the closest fuzzy matches;
+            # _last_ids stays exact so narrowing on the next keystroke is unaffected
+            seen = set(ids)
+            ids = ids + [rid for _, rid in self.index.fuzzy(q) if rid not in seen]
+        return ids
+
+# ---------- Downloads ----------
+class DownloadError(Exception):
+    pass
+
+class DownloadJob:
+    """One transfer. Worker threads update `received`/`total`/`state`; the Tk side only reads them."""
+
+    def __init__(self, url, dst, expected_size=None, sha256=None, headers=None):
+        self.url, self.dst = url, dst
+        self.expected_size, self.sha256 = expected_size, sha256
+        self.headers = dict(headers or {})
+        self.received = 0
+        self.total = expected_size
+        self.state = "queued"
+        self.future = None
+        self._cancel = threading.Event()
+
+    @property
+    def fraction(self):
+        return min(self.received / self.total, 1.0) if self.total else None
+
+    def cancel(self):
+        self._cancel.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    def done(self):
+        return self.future is not None and self.future.done()
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+class DownloadManager:
+    """Streams downloads on a worker pool, at most `max_transfers` at a time.
+
+    Bytes go to `<dst>.part` in DOWNLOAD_CHUNK pieces; a dropped connection is retried with an
+    HTTP Range request from where the part file ends. The part is checked against the
+    announced size (and `sha256` when given) and only then renamed over `dst`."""
+
+    def __init__(self, max_transfers=DOWNLOAD_WORKERS, chunk_size=DOWNLOAD_CHUNK,
+                 retries=DOWNLOAD_RETRIES, timeout=DOWNLOAD_TIMEOUT):
+        self.chunk_size, self.retries, self.timeout = chunk_size, retries, timeout
+        self._slots = threading.BoundedSemaphore(max_transfers)
+        self._pool = ThreadPoolExecutor(max_workers=max_transfers, thread_name_prefix="download")
+
+    def submit(self, url, dst, expected_size=None, sha256=None, headers=None):
+        job = DownloadJob(url, dst, expected_size, sha256, headers)
+        job.future = self._pool.submit(self.fetch, job)
+        return job
+
+    def submit_call(self, fn, url, dst):
+        """Queue fn(job) as a job; fn is expected to call fetch(job) for any network transfer."""
+        job = DownloadJob(url, dst)
+        job.future = self._pool.submit(fn, job)
+        return job
+
+    def download(self, url, dst, **kw):
+        return self.fetch(DownloadJob(url, dst, **kw))
+
+    def fetch(self, job):
+        """Run `job` in the calling thread (bounded by the transfer slots). Returns job.dst."""
+        with self._slots:
+            job.state = "running"
+            try:
+                self._transfer(job)
+                self._verify(job)
+                os.replace(job.dst + ".part", job.dst)
+            except BaseException:
+                job.state = "cancelled" if job._cancel.is_set() else "failed"
+                raise
+            job.state = "done"
+            return job.dst
+
+    def _transfer(self, job):
+        import urllib.request, http.client
+        part = job.dst + ".part"
+        failures = 0
+        while True:
+            offset = os.path.getsize(part) if os.path.exists(part) else 0
+            headers = dict(job.headers)
+            if offset:
+                headers["Range"] = f"bytes={offset}-"
+            try:
+                with urllib.request.urlopen(urllib.request.Request(job.url, headers=headers), timeout=self.timeout) as resp:
+                    m = re.match(r"bytes (\d+)-\d+/(\d+|\*)", resp.headers.get("Content-Range", ""))
+                    if offset and resp.status == 206 and m and int(m.group(1)) == offset:
+                        mode = "ab"
+                        job.total = int(m.group(2)) if m.group(2) != "*" else job.expected_size
+                    else:
+                        mode, offset = "wb", 0  # server ignored the Range: start over
+                        length = resp.headers.get("Content-Length")
+                        job.total = int(length) if length else job.expected_size
+                    job.received = offset
+                    with open(part, mode) as f:
+                        for chunk in iter(lambda: resp.read(self.chunk_size), b""):
+                            if job._cancel.is_set():
+                                raise DownloadError("Download cancelled.")
+                            f.write(chunk)
+                            job.received += len(chunk)
+                if job.total and job.received < job.total:
+                    raise ConnectionError(f"connection closed after {job.received} of {job.total} bytes")
+                return
+            except urllib.error.HTTPError as e:
+                if e.code == 416 and offset:
+                    m = re.match(r"bytes \*/(\d+)", e.headers.get("Content-Range", ""))
+                    if m and int(m.group(1)) == offset:
+                        job.total = job.received = offset  # the part file is already complete
+                        return
+                    os.remove(part)  # stale part file from another version of the file
+                    continue
+                if e.code < 500 or failures >= self.retries:
+                    raise
+            except (urllib.error.URLError, http.client.HTTPException, OSError) as e:
+                if failures >= self.retries:
+                    raise DownloadError(f"Download failed after {failures + 1} attempts: {e}") from e
+            failures += 1
+            if job._cancel.wait(min(0.5 * 2 ** failures, 8)):
+                raise DownloadError("Download cancelled.")
+
+    def _verify(self, job):
+        part = job.dst + ".part"
+        size = os.path.getsize(part)
+        for expected in (job.total, job.expected_size):
+            if expected is not None and size != expected:
+                os.remove(part)
+                raise DownloadError(f"Size mismatch for {os.path.basename(job.dst)}: got {size} bytes, expected {expected}.")
+        if job.sha256 and file_sha256(part).lower() != job.sha256.lower():
+            os.remove(part)
+            raise DownloadError(f"Checksum mismatch for {os.path.basename(job.dst)}.")
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+download_manager = DownloadManager()
+
+# ---------- Library service ----------
+
+class LibraryError(Exception):
+    """A failure meant for the user: str(e) is the message, `title` the dialog heading and
+    `code` a stable machine-readable reason (it survives the trip through the HTTP API)."""
+
+    def __init__(self, message, title="Error", code="error"):
+        super().__init__(message)
+        self.title = title
+        self.code = code
+
+def is_url(text):
+    return bool(text) and (text.startswith("http://") or text.startswith("https://"))
+
+def stored_pdf_path(location):
+    """The stored location as an existing local file (relative paths: cwd, then script folder), else None."""
+    loc = os.path.expanduser((location or "").strip())
+    if not loc or is_url(loc):
+        return None
+    for candidate in ((loc,) if os.path.isabs(loc) else (loc, os.path.join(script_dir(), loc))):
+        if os.path.isfile(candidate):
+            return os.path.abspath(candidate)
+    return None
+
+@metrics.timed("pdf_resolve")
+def resolve_pdf(title, location="", search_downloads=False):
+    """Local PDF for a book: the stored path, then (optionally) Downloads and the script folder by
+    exact title, then the script folder by partial title."""
+    found = stored_pdf_path(location)
+    if found:
+        return found
+    if search_downloads:
+        found = find_pdf_by_title(title, (get_downloads_folder(), script_dir()), substring=False)
+        if found:
+            return found
+    return find_pdf_in_script_dir_by_title(title)
+
+def exact_pdf(title, location=""):
+    """The stored path, else a script-folder PDF named exactly like `title` (no partial matches)."""
+    return stored_pdf_path(location) or find_pdf_by_title(title or "", substring=False)
+
+def catalog_records():
+    """The whole catalog as Books, PDFs first (no DataFrames involved)."""
+    if CATALOG_BACKEND != "sqlite":
+        return load_excel_records()
+    rows = db.query("SELECT title, author, source, location, digest FROM books ORDER BY source<>'pdf', id")
+    return [Book(*row) for row in rows]
+
+class LibraryService:
+    """Catalog, issue, purchase and download logic without any Tk dependency.
+
+    The Tk app and the HTTP API both drive the library through this class. Methods are safe
+    to call from worker threads (each thread gets its own DB connection) and report
+    user-facing failures as LibraryError."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._records = []
+        self._index = None
+        self._pdf_paths = (None, {})
+
+    # ---- catalog ----
+    def _indexed(self):
+        version = catalog_version()
+        with self._lock:
+            if version != self._version or self._index is None:
+                records = catalog_records()
+                self._records, self._index, self._version = records, SearchIndex(records), version
+            return self._records, self._index
+
+    def catalog(self):
+        return list(self._indexed()[0])
+
+    def search(self, query, limit=50):
+        records, index = self._indexed()
+        if not (query or "").strip():
+            return records[:limit]
+        return [records[i] for i in index.search(query, limit)]
+
+    def find_book(self, title):
+        """Exact (case-insensitive) title first, then the best partial title match."""
+        q = (title or "").strip().lower()
+        if not q:
+            return None
+        records, index = self._indexed()
+        ranked = index.search(q)
+        for rid in ranked:
+            if records[rid].title.lower() == q:
+                return records[rid]
+        for rid in ranked:
+            if q in records[rid].title.lower():
+                return records[rid]
+        return None
+
+    def suggest(self, title, k=3):
+        """Closest catalog titles for a misspelt `title`, best first."""
+        records, index = self._indexed()
+        return [records[rid].title for _, rid in index.fuzzy(title or "", k)]
+
+    # ---- accounts ----
+    def login_async(self, user, pwd):
+        return auth_service.login(user, pwd)
+
+    def register_async(self, user, pwd):
+        return auth_service.register(user, pwd)
+
+    def login(self, user, pwd):
+        return self.login_async(user, pwd).result()
+
+    def register(self, user, pwd):
+        try:
+            return self.register_async(user, pwd).result()
+        except sqlite3.IntegrityError:
+            raise LibraryError("Username exists.", code="user_exists")
+
+    # ---- loans & purchases ----
+    def issue(self, user, book):
+        """Issue `book` to `user` for ISSUE_DAYS days. Returns the expiry datetime."""
+        book = Book.from_record(book)
+        title, author, source, location = book.title, book.author or "", book.source, book.location
+        now = datetime.now()
+        expiry_date = now + timedelta(days=ISSUE_DAYS)
+        with db.transaction() as c:
+            r = c.execute("SELECT id, expiry_date FROM issued_books WHERE username=? AND title=?", (user, title)).fetchone()
+            if r:
+                try: expiry = datetime.fromisoformat(r[1])
+                except (TypeError, ValueError): expiry = None
+                if expiry and expiry > now:
+                    raise LibraryError(f"You already issued '{title}' until {expiry.date()}.", "Already issued", "already_issued")
+                c.execute("DELETE FROM issued_books WHERE id=?", (r[0],))
+            cur = c.execute("""INSERT INTO issued_books (username, title, author, source, location, issue_date, expiry_date, digest)
+                               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", (user, title, author, source, location, now.isoformat(), expiry_date.isoformat(), book.digest))
+        expiry_engine.track(expiry_date.isoformat(), cur.lastrowid)
+        return expiry_date
+
+    def return_issue(self, user, issue_id):
+        with db.transaction() as c:
+            n = c.execute("DELETE FROM issued_books WHERE id=? AND username=?", (issue_id, user)).rowcount
+        if not n:
+            raise LibraryError("That book is not issued to you.", "Not found", "not_found")
+
+    def buy(self, user, book, price=BOOK_PRICE):
+        """Record a purchase and return it as a dict (id, title, author, source, location, digest)."""
+        book = Book.from_record(book)
+        title, author, source, location, digest = book.title, book.author or "", book.source, book.location, book.digest
+        with db.transaction() as c:
+            cur = c.execute("""INSERT INTO purchased_books (username, title, author, source, location, purchase_date, price, digest)
+                               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", (user, title, author, source, location, datetime.now().isoformat(), price, digest))
+        return {'id': cur.lastrowid, 'title': title, 'author': author, 'source': source, 'location': location, 'digest': digest}
+
+    def my_books(self, user):
+        """{'issued': [...active loans], 'purchased': [...]} as lists of dicts."""
+        issued = db.query("SELECT id, title, author, source, location, digest, issue_date, expiry_date FROM issued_books WHERE username=? AND expiry_date > ?", (user, datetime.now().isoformat()))
+        purchased = db.query("SELECT id, title, author, source, location, digest, purchase_date, price FROM purchased_books WHERE username=? ORDER BY purchase_date", (user,))
+        return {
+            'issued': [dict(zip(('id', 'title', 'author', 'source', 'location', 'digest', 'issue_date', 'expiry_date'), r)) for r in issued],
+            'purchased': [dict(zip(('id', 'title', 'author', 'source', 'location', 'digest', 'purchase_date', 'price'), r)) for r in purchased],
+        }
+
+    def can_read(self, user, book):
+        """True if `user` has a live loan of `book` or has bought it."""
+        title = Book.from_record(book).title
+        return db.query_one("""SELECT 1 FROM issued_books WHERE username=? AND title=? AND expiry_date > ?
+                               UNION ALL SELECT 1 FROM purchased_books WHERE username=? AND title=? LIMIT 1""",
+                            (user, title, datetime.now().isoformat(), user, title)) is not None
+
+    def purchase(self, user, purchase_id):
+        r = db.query_one("SELECT id, title, author, source, location, digest FROM purchased_books WHERE id=? AND username=?", (purchase_id, user))
+        if not r:
+            raise LibraryError("No such purchase.", "Not found", "not_found")
+        return dict(zip(('id', 'title', 'author', 'source', 'location', 'digest'), r))
+
+    # ---- files ----
+    def book_pdf(self, book):
+        """Local path of a catalog book or loan's PDF, or None. Rows with a digest never search,
+        and a file whose name merely contains the title is never served as the book."""
+        book = Book.from_record(book)
+        if book.source != 'pdf':
+            return None
+        return blob_store.find(book.digest) or exact_pdf(book.title, book.location)
+
+    def book_metadata(self, book):
+        """Cached file details for a catalog PDF: None without a local file, {'pending': True}
+        while extraction is queued, else the extract_pdf_metadata() fields plus 'size'."""
+        path = self.book_pdf(book)
+        if not path:
+            return None
+        meta = metadata_pipeline.cached(path)
+        if meta is None:
+            metadata_pipeline.submit([path])
+            return {"pending": True}
+        return meta
+
+    def warm_metadata(self):
+        """Queue metadata extraction for every catalog PDF; paths are resolved on a background thread."""
+        def run():
+            try:
+                metadata_pipeline.submit([p for p in map(self.book_pdf, self.catalog()) if p])
+            except LibraryError as e:
+                print("Metadata warm-up skipped:", e)
+        threading.Thread(target=run, name="metadata-warm", daemon=True).start()
+
+    # ---- full text ----
+    def _books_by_pdf(self):
+        version = catalog_version()
+        if self._pdf_paths[0] != version:
+            paths = {}
+            for rd in self.catalog():
+                path = self.book_pdf(rd)
+                if path:
+                    paths.setdefault(os.path.abspath(path), rd)
+            self._pdf_paths = (version, paths)
+        return self._pdf_paths[1]
+
+    def update_text_index(self, progress=None):
+        return fulltext_index.update(set(library_pdfs()) | set(self._books_by_pdf()), progress)
+
+    def warm_text_index(self):
+        def run():
+            try:
+                self.update_text_index()
+            except LibraryError as e:
+                print("Full-text index update skipped:", e)
+        threading.Thread(target=run, name="fts-update", daemon=True).start()
+
+    def search_text(self, query, limit=20):
+        """Pages whose text matches `query`, best first: dicts with title, author, page, snippet,
+        path and in_catalog (False for PDFs in the library folder that have no catalog row)."""
+        books = self._books_by_pdf()
+        results, seen = [], set()
+        for hit in fulltext_index.search(query, limit * 2):
+            rd = books.get(hit["path"])
+            title = str(rd.get('title')) if rd else os.path.splitext(os.path.basename(hit["path"]))[0]
+            if (title, hit["page"]) in seen:
+                continue  # the same file in the folder and in the blob store
+            seen.add((title, hit["page"]))
+            results.append({"title": title, "author": rd.get('author') if rd else None, "page": hit["page"],
+                            "snippet": hit["snippet"], "path": hit["path"], "in_catalog": rd is not None})
+        return results[:limit]
+
+    def purchased_pdf(self, user, purchase):
+        return blob_store.find(purchase.get('digest')) or resolve_pdf(str(purchase.get('title') or "").strip(), purchase.get('location') or "", search_downloads=True)
+
+    def deliver_purchase_async(self, user, purchase, dst):
+        """deliver_purchase() on the download manager; returns the DownloadJob."""
+        return download_manager.submit_call(lambda job: self.deliver_purchase(user, purchase, dst, job),
+                                            purchase.get('location') or "", dst)
+
+    def deliver_purchase(self, user, purchase, dst, job=None):
+        """Copy (or fetch) a purchased PDF to `dst`. Returns dst; raises LibraryError when nothing is found."""
+        title = str(purchase.get('title') or "book").strip()
+        src = (purchase.get('location') or "").strip()
+        tried = []
+        # 1) blob store, then the stored path (absolute or relative to the script dir)
+        if src and not is_url(src):
+            tried.append(src)
+        local = blob_store.find(purchase.get('digest')) or stored_pdf_path(src)
+        if local:
+            deliver_file(local, dst)
+            return dst
+        # 2) stored URL
+        if is_url(src):
+            try:
+                return download_manager.fetch(job or DownloadJob(src, dst))
+            except Exception:
+                tried.append(src)
+        # 3) script directory by title (best-effort)
+        found = find_pdf_in_script_dir_by_title(title)
+        if found:
+            deliver_file(found, dst)
+            return dst
+        details = "\n".join(tried) if tried else "(no candidate paths)"
+        raise LibraryError(f"Could not locate original PDF for '{title}'.\nTried:\n{details}", "Missing", "not_found")
+
+# ---------- HTTP API ----------
+HTTP_REASONS = {200: "OK", 206: "Partial Content", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed",
+                409: "Conflict", 413: "Payload Too Large", 416: "Range Not Satisfiable", 500: "Internal Server Error"}
+
+class HTTPError(Exception):
+    def __init__(self, status, message, title="Error", code="error"):
+        super().__init__(message)
+        self.status, self.title, self.code = status, title, code
+
+class LibraryHTTPServer:
+    """JSON-over-HTTP front end for a LibraryService, on asyncio streams (stdlib only).
+
+    At most SERVER_MAX_CONCURRENCY requests are handled at once; blocking service calls run on
+    a SERVER_WORKERS thread pool and PDFs are streamed with loop.sendfile(). Customers log in
+    for a bearer token:
+
+        POST /api/register {username, password}     POST /api/login {username, password} -> {token}
+        GET  /api/books    GET /api/search?q=&limit=  GET  /api/search-text?q=&limit=  GET  /api/my-books
+        POST /api/issue {title}   POST /api/return {id}   POST /api/buy {title}
+        GET  /api/file?title= (needs a live loan or a purchase)   GET  /api/download?id=<purchase id>
+        GET  /metrics  (Prometheus text; empty unless metrics are enabled)"""
+
+    ERROR_STATUS = {"not_found": 404, "forbidden": 403, "already_issued": 409, "user_exists": 409}
+
+    def __init__(self, service, host=SERVER_HOST, port=SERVER_PORT,
+                 max_concurrency=SERVER_MAX_CONCURRENCY, workers=SERVER_WORKERS):
+        self.service = service
+        self.host, self.port = host, port
+        self.max_concurrency = max_concurrency
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api")
+        self._tokens = {}
+        self._server = None
+        self.routes = {
+            ("POST", "/api/register"): self.api_register,
+            ("POST", "/api/login"): self.api_login,
+            ("POST", "/api/logout"): self.api_logout,
+            ("GET", "/api/books"): self.api_books,
+            ("GET", "/api/search"): self.api_search,
+            ("GET", "/api/search-text"): self.api_search_text,
+            ("GET", "/api/my-books"): self.api_my_books,
+            ("POST", "/api/issue"): self.api_issue,
+            ("POST", "/api/return"): self.api_return,
+            ("POST", "/api/buy"): self.api_buy,
+            ("GET", "/api/file"): self.api_file,
+            ("GET", "/api/download"): self.api_download,
+            ("GET", "/metrics"): self.api_metrics,
+        }
+
+    # ---- plumbing ----
+    async def start(self):
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, limit=SERVER_MAX_BODY)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        await self.start()
+        print(f"E-Book Library API listening on http://{self.host}:{self.port}")
+        tasks = [asyncio.create_task(self._expiry_loop())]
+        if metrics.enabled:
+            tasks.append(asyncio.create_task(self._metrics_loop()))
+        if CATALOG_BACKEND != "sqlite":
+            tasks.append(asyncio.create_task(self._journal_loop()))
+        try:
+            async with self._server:
+                await self._server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        self._pool.shutdown(wait=False)
+
+    async def _expiry_loop(self):
+        await self._run(expiry_engine.load)
+        while True:
+            delay_ms = await self._run(expiry_engine.step)
+            await asyncio.sleep(delay_ms / 1000)
+
+    async def _metrics_loop(self):
+        while True:
+            await asyncio.sleep(METRICS_EXPORT_MS / 1000)
+            await self._run(metrics.export)
+
+    async def _journal_loop(self):
+        # the Tk app does this from after(); here it keeps Books.xlsx current for anyone reading the file
+        while True:
+            await asyncio.sleep(CATALOG_JOURNAL_IDLE_MS / 1000)
+            await self._run(catalog_journal.compact_if_idle)
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._pool, functools.partial(fn, *args))
+
+    async def _read_request(self, reader):
+        head = await reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("iso-8859-1").split("\r\n")
+        try:
+            method, target, _version = lines[0].split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Malformed request line.")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                k, v = line.split(":", 1)
+                headers[k.strip().lower()] = v.strip()
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise HTTPError(400, "Invalid Content-Length.")
+        if length > SERVER_MAX_BODY:
+            raise HTTPError(413, "Request body too large.")
+        body = await reader.readexactly(length) if length else b""
+        url = urllib.parse.urlsplit(target)
+        return {"method": method.upper(), "path": url.path, "headers": headers, "body": body,
+                "query": {k: v[-1] for k, v in urllib.parse.parse_qs(url.query).items()}}
+
+    async def _handle(self, reader, writer):
+        async with self._slots:
+            try:
+                try:
+                    req = await asyncio.wait_for(self._read_request(reader), SERVER_READ_TIMEOUT)
+                    handler = self.routes.get((req["method"], req["path"]))
+                    if handler is None:
+                        if any(path == req["path"] for _, path in self.routes):
+                            raise HTTPError(405, "Method not allowed.")
+                        raise HTTPError(404, "No such endpoint.", "Not found", "not_found")
+                    with metrics.span("http " + req["path"]):
+                        result = await handler(req)
+                except LibraryError as e:
+                    raise HTTPError(self.ERROR_STATUS.get(e.code, 400), str(e), e.title, e.code)
+                if isinstance(result, tuple) and result[0] == "file":
+                    await self._send_file(writer, result[1], result[2], req["headers"].get("range", ""))
+                elif isinstance(result, tuple) and result[0] == "text":
+                    body = result[1].encode("utf-8")
+                    writer.write(self._head(200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8",
+                                                  "Content-Length": len(body)}) + body)
+                    await writer.drain()
+                else:
+                    await self._send_json(writer, 200, result)
+            except HTTPError as e:
+                await self._send_json(writer, e.status, {"error": str(e), "title": e.title, "code": e.code})
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                pass
+            except Exception as e:
+                try:
+                    await self._send_json(writer, 500, {"error": str(e), "title": "Error", "code": "error"})
+                except Exception:
+                    pass
+            finally:
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except Exception:
+                    pass
+
+    def _head(self, status, headers):
+        lines = [f"HTTP/1.1 {status} {HTTP_REASONS.get(status, 'OK')}", "Connection: close"]
+        lines += [f"{k}: {v}" for k, v in headers.items()]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("iso-8859-1")
+
+    async def _send_json(self, writer, status, payload):
+        body = json.dumps(payload, default=str).encode("utf-8")
+        writer.write(self._head(status, {"Content-Type": "application/json; charset=utf-8", "Content-Length": len(body)}) + body)
+        await writer.drain()
+
+    async def _send_file(self, writer, path, filename, range_header=""):
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            headers = {"Content-Type": "application/pdf", "Accept-Ranges": "bytes",
+                       "Content-Disposition": f"attachment; filename*=UTF-8''{urllib.parse.quote(filename)}"}
+            status, offset = 200, 0
+            m = re.fullmatch(r"bytes=(\d+)-", range_header.strip())
+            if m:  # resume: only open-ended ranges, which is what DownloadManager sends
+                offset = int(m.group(1))
+                if offset >= size:
+                    writer.write(self._head(416, {"Content-Range": f"bytes */{size}", "Content-Length": 0}))
+                    await writer.drain()
+                    return
+                status, headers["Content-Range"] = 206, f"bytes {offset}-{size - 1}/{size}"
+            headers["Content-Length"] = size - offset
+            writer.write(self._head(status, headers))
+            await writer.drain()
+            await asyncio.get_running_loop().sendfile(writer.transport, f, offset)
+
+    def _json_body(self, req):
+        try:
+            data = json.loads(req["body"] or b"{}")
+        except ValueError:
+            raise HTTPError(400, "Body must be JSON.")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "Body must be a JSON object.")
+        return data
+
+    def _user(self, req):
+        auth = req["headers"].get("authorization", "")
+        token = auth[7:].strip() if auth.lower().startswith("bearer ") else ""
+        entry = self._tokens.get(token)
+        if not entry or entry[1] < time.time():
+            self._tokens.pop(token, None)
+            raise HTTPError(401, "Please log in.", "Login required", "unauthorized")
+        return entry[0]
+
+    def _id(self, value):
+        """A row id from a request (JSON int or numeric string); anything else is a 400."""
+        try:
+            n = int(value) if isinstance(value, (int, str)) and not isinstance(value, bool) else None
+        except ValueError:
+            n = None
+        if n is None or not 0 < n < 1 << 63:
+            raise HTTPError(400, "id must be a whole number.", "Input", "bad_request")
+        return n
+
+    def _book(self, title):
+        book = self.service.find_book(title)
+        if not book:
+            close = self.service.suggest(title)
+            hint = "\nDid you mean: " + ", ".join(f"'{t}'" for t in close) + "?" if close else ""
+            raise LibraryError("No book matching the search entry." + hint, "Not found", "not_found")
+        return book
+
+    # ---- endpoints ----
+    async def api_register(self, req):
+        data = self._json_body(req)
+        user, pwd = str(data.get("username") or "").strip(), str(data.get("password") or "").strip()
+        if not user or not pwd:
+            raise HTTPError(400, "Provide username and password.", "Input")
+        await self._run(self.service.register, user, pwd)
+        return {"ok": True}
+
+    async def api_login(self, req):
+        data = self._json_body(req)
+        user, pwd = str(data.get("username") or "").strip(), str(data.get("password") or "").strip()
+        if not user or not pwd or not await self._run(self.service.login, user, pwd):
+            raise HTTPError(401, "Invalid credentials.", "Error", "unauthorized")
+        now = time.time()
+        for stale in [t for t, (_, expires) in self._tokens.items() if expires < now]:
+            del self._tokens[stale]
+        token = secrets.token_urlsafe(32)
+        self._tokens[token] = (user, now + SERVER_TOKEN_TTL)
+        return {"token": token, "username": user}
+
+    async def api_logout(self, req):
+        self._user(req)
+        self._tokens.pop(req["headers"]["authorization"][7:].strip(), None)
+        return {"ok": True}
+
+    async def api_books(self, req):
+        return {"books": [b.to_dict() for b in await self._run(self.service.catalog)]}
+
+    async def api_search(self, req):
+        try:
+            limit = max(1, min(int(req["query"].get("limit") or 50), 1000))
+        except ValueError:
+            raise HTTPError(400, "limit must be a number.")
+        books = await self._run(self.service.search, req["query"].get("q", ""), limit)
+        return {"books": [b.to_dict() for b in books]}
+
+    async def api_search_text(self, req):
+        try:
+            limit = max(1, min(int(req["query"].get("limit") or 20), 200))
+        except ValueError:
+            raise HTTPError(400, "limit must be a number.")
+        hits = await self._run(self.service.search_text, req["query"].get("q", ""), limit)
+        return {"results": [{k: v for k, v in h.items() if k != "path"} for h in hits]}
+
+    async def api_metrics(self, req):
+        return ("text", metrics.prometheus_text())
+
+    async def api_my_books(self, req):
+        return await self._run(self.service.my_books, self._user(req))
+
+    async def api_issue(self, req):
+        user = self._user(req)
+        book = await self._run(self._book, self._json_body(req).get("title"))
+        expiry = await self._run(self.service.issue, user, book)
+        return {"title": book.get('title'), "expiry_date": expiry.isoformat()}
+
+    async def api_return(self, req):
+        user = self._user(req)
+        await self._run(self.service.return_issue, user, self._id(self._json_body(req).get("id")))
+        return {"ok": True}
+
+    async def api_buy(self, req):
+        user = self._user(req)
+        book = await self._run(self._book, self._json_body(req).get("title"))
+        return await self._run(self.service.buy, user, book)
+
+    async def api_file(self, req):
+        user = self._user(req)
+        book = await self._run(self._book, req["query"].get("title"))
+        if not await self._run(self.service.can_read, user, book):
+            raise HTTPError(403, f"Issue or buy '{book.get('title')}' to read it.", "Not issued", "forbidden")
+        path = await self._run(self.service.book_pdf, book)
+        if not path:
+            raise HTTPError(404, f"PDF not found for '{book.get('title')}'.", "Not found", "not_found")
+        return ("file", path, sanitize_filename(str(book.get('title'))) + ".pdf")
+
+    async def api_download(self, req):
+        user = self._user(req)
+        purchase = await self._run(self.service.purchase, user, self._id(req["query"].get("id")))
+        if purchase.get('source') != 'pdf':
+            raise HTTPError(404, "This item is not a downloadable PDF.", "Not Available", "not_found")
+        path = blob_store.find(purchase.get('digest')) or await self._run(exact_pdf, purchase['title'], purchase.get('location') or "")
+        if not path:
+            raise HTTPError(404, f"Could not locate original PDF for '{purchase['title']}'.", "Missing", "not_found")
+        return ("file", path, sanitize_filename(purchase['title']) + ".pdf")
+
+def run_server(address=None):
+    host, port = SERVER_HOST, SERVER_PORT
+    if address:
+        h, _, p = address.rpartition(":")
+        host, port = (h or host), int(p)
+    ensure_excel_exists()
+    init_db()
+    seed_catalog_from_excel()
+    server = LibraryHTTPServer(LibraryService(), host, port)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+# ---------- Remote client ----------
+class RemoteLibraryService:
+    """LibraryService look-alike that forwards to a LibraryHTTPServer; used by the Tk client mode.
+
+    The `user` arguments are ignored: the server knows who is logged in from the token."""
+
+    def __init__(self, base_url, timeout=30, cache_dir=None, cache_max_bytes=REMOTE_CACHE_MAX_BYTES):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.token = None
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="remote")
+        # private to this OS user: other accounts must not read (or plant) fetched PDFs
+        self.cache_dir = cache_dir or os.path.join(get_user_cache_folder(), "remote")
+        self.cache_max_bytes = cache_max_bytes
+
+    def _request(self, method, path, params=None, body=None, dst=None):
+        import urllib.request
+        url = self.base_url + path + ("?" + urllib.parse.urlencode(params) if params else "")
+        headers = {"Accept": "application/json"}
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        req = urllib.request.Request(url, data=data, method=method, headers=headers)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                if dst is None:
+                    return json.loads(resp.read() or b"null")
+                tmp = dst + ".part"
+                with open(tmp, "wb") as f:
+                    shutil.copyfileobj(resp, f, 1 << 16)
+                os.replace(tmp, dst)
+                return dst
+        except urllib.error.HTTPError as e:
+            try:
+                payload = json.loads(e.read() or b"{}")
+            except ValueError:
+                payload = {}
+            raise LibraryError(payload.get("error") or str(e), payload.get("title") or "Error", payload.get("code") or "error")
+        except urllib.error.URLError as e:
+            raise LibraryError(f"Library server unreachable:\n{e.reason}", "Offline", "offline")
+
+    def _cached_path(self, name):
+        os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+        os.chmod(self.cache_dir, 0o700)  # makedirs() honours the umask and skips existing folders
+        return os.path.join(self.cache_dir, sanitize_filename(name) + ".pdf")
+
+    def _fetch_cached(self, path, params, name):
+        dst = self._request("GET", path, params, dst=self._cached_path(name))
+        self._evict(keep=dst)
+        return dst
+
+    def _evict(self, keep):
+        """Drop the least recently fetched files until the cache fits in cache_max_bytes.
+
+        Every open re-fetches its file, so mtime is the time of last use."""
+        entries, total = [], 0
+        with os.scandir(self.cache_dir) as it:
+            for e in it:
+                try:
+                    st = e.stat()
+                except OSError:
+                    continue
+                if not e.is_file():
+                    continue
+                total += st.st_size
+                if e.path != keep:
+                    entries.append((st.st_mtime, st.st_size, e.path))
+        for _, size, path in sorted(entries):
+            if total <= self.cache_max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass  # e.g. still open in a viewer on Windows
+
+    def catalog(self):
+        return [Book.from_record(r) for r in self._request("GET", "/api/books")["books"]]
+
+    def search(self, query, limit=50):
+        return [Book.from_record(r) for r in self._request("GET", "/api/search", {"q": query, "limit": limit})["books"]]
+
+    def login(self, user, pwd):
+        try:
+            self.token = self._request("POST", "/api/login", body={"username": user, "password": pwd})["token"]
+            return True
+        except LibraryError as e:
+            if e.code == "unauthorized":
+                return False
+            raise
+
+    def register(self, user, pwd):
+        return self._request("POST", "/api/register", body={"username": user, "password": pwd})
+
+    def login_async(self, user, pwd):
+        return self._pool.submit(self.login, user, pwd)
+
+    def register_async(self, user, pwd):
+        return self._pool.submit(self.register, user, pwd)
+
+    def issue(self, user, book):
+        return datetime.fromisoformat(self._request("POST", "/api/issue", body={"title": book.get('title')})["expiry_date"])
+
+    def return_issue(self, user, issue_id):
+        self._request("POST", "/api/return", body={"id": issue_id})
+
+    def buy(self, user, book, price=BOOK_PRICE):
+        return self._request("POST", "/api/buy", body={"title": book.get('title')})
+
+    def my_books(self, user):
+        return self._request("GET", "/api/my-books")
+
+    def book_pdf(self, book):
+        if (book.get('source') or 'pdf') != 'pdf':
+            return None
+        title = str(book.get('title') or "")
+        try:
+            return self._fetch_cached("/api/file", {"title": title}, title)
+        except LibraryError as e:
+            if e.code == "not_found":
+                return None
+            raise
+
+    def search_text(self, query, limit=20):
+        return self._request("GET", "/api/search-text", {"q": query, "limit": limit})["results"]
+
+    def book_metadata(self, book):
+        return None  # file details are only extracted next to the files, on the server
+
+    def warm_metadata(self):
+        pass
 
-def ensure_excel_exists():
-    folder = os.path.dirname(EXCEL_PATH)
-    if folder and not os.path.exists(folder):
+    def purchased_pdf(self, user, purchase):
         try:
-            os.makedirs(folder, exist_ok=True)
-        except Exception:
-            pass
-    if not os.path.exists(EXCEL_PATH):
-        pdf_df = pd.DataFrame(columns=["title", "author", "filepath"])
-        ebook_df = pd.DataFrame(columns=["title", "author", "url"])
+            return self._fetch_cached("/api/download", {"id": purchase['id']}, str(purchase.get('title') or "book"))
+        except LibraryError as e:
+            if e.code == "not_found":
+                return None
+            raise
+
+    def deliver_purchase_async(self, user, purchase, dst):
+        return download_manager.submit_call(lambda job: self.deliver_purchase(user, purchase, dst, job), "", dst)
+
+    def deliver_purchase(self, user, purchase, dst, job=None):
+        src = (purchase.get('location') or "").strip()
+        if not is_url(src):
+            src = self.base_url + "/api/download?" + urllib.parse.urlencode({"id": purchase['id']})
+        job = job or DownloadJob(src, dst)
+        job.url = src
+        if self.token:
+            job.headers["Authorization"] = f"Bearer {self.token}"
         try:
-            with pd.ExcelWriter(EXCEL_PATH, engine="openpyxl") as writer:
-                pdf_df.to_excel(writer, index=False, sheet_name=SHEET_BOOK_PDF)
-                ebook_df.to_excel(writer, index=False, sheet_name=SHEET_EBOOK)
-        except Exception as e:
-            print("Failed to create initial Excel:", e)
+            return download_manager.fetch(job)
+        except urllib.error.HTTPError as e:
+            try:
+                payload = json.loads(e.read() or b"{}")
+            except ValueError:
+                payload = {}
+            raise LibraryError(payload.get("error") or str(e), payload.get("title") or "Error", payload.get("code") or "error")
 
-# ---------- DB init ----------
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("""CREATE TABLE IF NOT EXISTS users (
-                    username TEXT PRIMARY KEY,
-                    password TEXT NOT NULL
-                )""")
-    c.execute("""CREATE TABLE IF NOT EXISTS issued_books (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT NOT NULL,
-                    title TEXT NOT NULL,
-                    author TEXT,
-                    source TEXT,
-                    location TEXT,
-                    issue_date TEXT,
-                    expiry_date TEXT
-                )""")
-    c.execute("""CREATE TABLE IF NOT EXISTS purchased_books (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT NOT NULL,
-                    title TEXT NOT NULL,
-                    author TEXT,
-                    source TEXT,
-                    location TEXT,
-                    purchase_date TEXT,
-                    price REAL
-                )""")
-    conn.commit()
-    conn.close()
+# ---------- Virtualized result list ----------
+class VirtualListbox:
+    """A Listbox that only materializes the visible rows (plus LIST_OVERSCAN) of a result list.
 
-def hash_password(password: str) -> str:
-    if password is None:
-        password = ""
-    return hashlib.sha256(password.encode("utf-8")).hexdigest()
+    `ids` is the ordered list of record ids to show; `formatter(position, record_id)` builds
+    a row label. Selection is tracked as a record id, so callers never parse labels."""
 
-# ---------- Excel helpers ----------
-def load_excel():
-    if not os.path.exists(EXCEL_PATH):
-        messagebox.showerror("Error", f"Excel file not found at:\n{EXCEL_PATH}")
-        return pd.DataFrame(), pd.DataFrame()
-    try:
-        xls = pd.ExcelFile(EXCEL_PATH)
-        sheets = xls.sheet_names
-        pdf_sheet = SHEET_BOOK_PDF if SHEET_BOOK_PDF in sheets else (sheets[0] if len(sheets) >= 1 else None)
-        ebook_sheet = SHEET_EBOOK if SHEET_EBOOK in sheets else (sheets[1] if len(sheets) >= 2 else None)
-        pdf_df = pd.read_excel(xls, sheet_name=pdf_sheet) if pdf_sheet else pd.DataFrame()
-        ebook_df = pd.read_excel(xls, sheet_name=ebook_sheet) if ebook_sheet else pd.DataFrame()
-        pdf_df.columns = [c.lower().strip() for c in pdf_df.columns]
-        ebook_df.columns = [c.lower().strip() for c in ebook_df.columns]
-        return pdf_df, ebook_df
-    except Exception as e:
-        messagebox.showerror("Error loading Excel", str(e))
-        return pd.DataFrame(), pd.DataFrame()
+    def __init__(self, master, formatter, font=("Segoe UI", 11), overscan=LIST_OVERSCAN, on_select=None):
+        self.formatter = formatter
+        self.on_select = on_select
+        self.overscan = overscan
+        self.ids = []
+        self.top = 0          # position shown in the first visible row
+        self._start = 0       # position held by listbox row 0
+        self._end = 0
+        self._selected_pos = None
+        self._row_h = max(1, tkfont.Font(font=font).metrics("linespace") + 1)
 
-def save_excel(pdf_df, ebook_df):
-    try:
-        with pd.ExcelWriter(EXCEL_PATH, engine="openpyxl", mode="w") as writer:
-            pdf_df.to_excel(writer, index=False, sheet_name=SHEET_BOOK_PDF)
-            ebook_df.to_excel(writer, index=False, sheet_name=SHEET_EBOOK)
-        messagebox.showinfo("Saved", "Excel file updated.")
-    except Exception as e:
-        messagebox.showerror("Error saving Excel", str(e))
+        self.frame = tb.Frame(master)
+        self.scrollbar = tk.Scrollbar(self.frame, orient="vertical", command=self._on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        self.listbox = tk.Listbox(self.frame, font=font, exportselection=False, activestyle="none")
+        self.listbox.pack(side="left", fill="both", expand=True)
+
+        lb = self.listbox
+        lb.bind("<Configure>", lambda e: self._refresh())
+        lb.bind("<<ListboxSelect>>", self._on_listbox_select)
+        lb.bind("<MouseWheel>", lambda e: self._wheel(-1 if e.delta > 0 else 1))
+        lb.bind("<Button-4>", lambda e: self._wheel(-1))
+        lb.bind("<Button-5>", lambda e: self._wheel(1))
+        lb.bind("<Up>", lambda e: self._step(-1))
+        lb.bind("<Down>", lambda e: self._step(1))
+        lb.bind("<Prior>", lambda e: self._step(-self.visible_rows()))
+        lb.bind("<Next>", lambda e: self._step(self.visible_rows()))
+        lb.bind("<Home>", lambda e: self._step(-len(self.ids)))
+        lb.bind("<End>", lambda e: self._step(len(self.ids)))
+
+    def pack(self, **kw):
+        self.frame.pack(**kw)
+
+    def visible_rows(self):
+        bbox = self.listbox.bbox(0)
+        if bbox:
+            self._row_h = max(1, bbox[3] + 1)
+        return max(1, self.listbox.winfo_height() // self._row_h)
+
+    def set_items(self, ids):
+        self.ids = ids
+        self.top = 0
+        self._selected_pos = None
+        self._refresh(force=True)
+
+    def selected_id(self):
+        if self._selected_pos is None or self._selected_pos >= len(self.ids):
+            return None
+        return self.ids[self._selected_pos]
+
+    def scroll_to(self, pos):
+        rows = self.visible_rows()
+        self.top = max(0, min(pos, len(self.ids) - rows))
+        self._refresh()
+
+    def see(self, pos):
+        rows = self.visible_rows()
+        if pos < self.top:
+            self.scroll_to(pos)
+        elif pos >= self.top + rows:
+            self.scroll_to(pos - rows + 1)
+
+    def select_position(self, pos):
+        if not self.ids:
+            return
+        self._selected_pos = max(0, min(pos, len(self.ids) - 1))
+        self.see(self._selected_pos)
+        self._apply_selection()
+        if self.on_select:
+            self.on_select(self.selected_id())
+
+    def _refresh(self, force=False):
+        n = len(self.ids)
+        rows = self.visible_rows()
+        self.top = max(0, min(self.top, n - rows))
+        start = max(0, self.top - self.overscan)
+        end = min(n, self.top + rows + self.overscan)
+        if force or start < self._start or end > self._end or (self._end - self._start) > 2 * (rows + 2 * self.overscan):
+            # only re-materialize when the visible part leaves the window we already hold
+            start = max(0, self.top - 2 * self.overscan)
+            end = min(n, self.top + rows + 2 * self.overscan)
+            self.listbox.delete(0, "end")
+            if end > start:
+                self.listbox.insert("end", *[self.formatter(p, self.ids[p]) for p in range(start, end)])
+            self._start, self._end = start, end
+        self.listbox.yview(self.top - self._start)
+        if n:
+            self.scrollbar.set(self.top / n, min(1.0, (self.top + rows) / n))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        self._apply_selection()
+
+    def _apply_selection(self):
+        self.listbox.selection_clear(0, "end")
+        pos = self._selected_pos
+        if pos is not None and self._start <= pos < self._end:
+            self.listbox.selection_set(pos - self._start)
+            self.listbox.activate(pos - self._start)
+
+    def _on_scrollbar(self, *args):
+        rows = self.visible_rows()
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * len(self.ids)))
+        elif args[0] == "scroll":
+            step = int(args[1]) * (rows if args[2] == "pages" else 1)
+            self.scroll_to(self.top + step)
+
+    def _wheel(self, direction):
+        self.scroll_to(self.top + 3 * direction)
+        return "break"
+
+    def _step(self, delta):
+        cur = self._selected_pos if self._selected_pos is not None else self.top - 1
+        self.select_position(cur + delta)
+        return "break"
+
+    def _on_listbox_select(self, _evt=None):
+        sel = self.listbox.curselection()
+        if not sel:
+            return
+        self._selected_pos = self._start + sel[0]
+        if self.on_select:
+            self.on_select(self.selected_id())
 
 # ---------- Reusable searchable window ----------
 def open_search_window(master, data_list, title="Search Books", on_select=None):
@@ -288,69 +3633,37 @@ def open_search_window(master, data_list, title="Search Books", on_select=None):
     search_entry.pack(fill="x", padx=12, pady=(6,8))
     search_entry.configure(font=("Segoe UI", 12))
 
-    list_frame = tb.Frame(win)
-    list_frame.pack(fill="both", expand=True, padx=12, pady=(0,8))
+    working = [Book.from_record(item) for item in data_list]
 
-    scrollbar = tk.Scrollbar(list_frame, orient="vertical")
-    scrollbar.pack(side="right", fill="y")
-    listbox = tk.Listbox(list_frame, yscrollcommand=scrollbar.set, font=("Segoe UI", 11))
-    listbox.pack(side="left", fill="both", expand=True)
-    scrollbar.config(command=listbox.yview)
+    def format_row(pos, rid):
+        rd = working[rid]
+        typ = "PDF" if rd.source == 'pdf' else "Online"
+        return f"{pos}: {rd.title} — {rd.author or ''}  ({typ})"
 
-    working = []
-    for item in data_list:
-        if isinstance(item, dict):
-            working.append(item.copy())
-        else:
-            working.append({k: (None if pd.isna(v) else v) for k, v in item.items()})
-
-    def render(items):
-        listbox.delete(0, "end")
-        for idx, rd in enumerate(items):
-            t = str(rd.get('title') or "")
-            a = str(rd.get('author') or "")
-            typ = "PDF" if rd.get('source') == 'pdf' else "Online"
-            listbox.insert("end", f"{idx}: {t} — {a}  ({typ})")
-
-    def filter_reorder(_=None):
-        q = search_var.get().strip().lower()
-        if not q:
-            render(working)
-            return
-        matched = [rd for rd in working if q in str(rd.get('title') or "").lower()]
-        others = [rd for rd in working if rd not in matched]
-        render(matched + others)
+    def fill_with_select(rid):
+        if rid is not None:
+            search_var.set(working[rid].title)
 
-    render(working)
-    search_entry.bind("<KeyRelease>", filter_reorder)
+    results = VirtualListbox(win, format_row, on_select=fill_with_select)
+    results.pack(fill="both", expand=True, padx=12, pady=(0,8))
 
-    def fill_with_select(evt):
-        sel = listbox.curselection()
-        if not sel:
-            return
-        text = listbox.get(sel[0])
-        try:
-            selected_index = int(text.split(":", 1)[0])
-        except Exception:
-            selected_index = sel[0]
-        if selected_index < 0 or selected_index >= len(working):
-            return
-        chosen = working[selected_index]
-        search_var.set(str(chosen.get('title') or ""))
+    index = SearchIndex(working)
+    all_ids = list(range(len(working)))
 
-    listbox.bind("<<ListboxSelect>>", fill_with_select)
+    def show_results(_query, ids):
+        results.set_items(all_ids if ids is None else index.reorder(ids))
+
+    controller = SearchController(win, index, show_results)
+    results.set_items(all_ids)
+    search_entry.bind("<KeyRelease>", lambda _=None: controller.schedule(search_var.get()))
+    win.bind("<Destroy>", lambda _=None: controller.cancel(), add="+")
 
     def do_select():
-        sel = listbox.curselection()
-        if not sel:
+        rid = results.selected_id()
+        if rid is None:
             messagebox.showwarning("Select", "Please select a book from the list first.")
             return
-        text = listbox.get(sel[0])
-        try:
-            selected_index = int(text.split(":", 1)[0])
-        except Exception:
-            selected_index = sel[0]
-        chosen = working[selected_index]
+        chosen = working[rid]
         if on_select:
             on_select(chosen)
         win.destroy()
@@ -364,17 +3677,45 @@ def open_search_window(master, data_list, title="Search Books", on_select=None):
 
 # ---------- Application ----------
 class LibraryApp:
-    def __init__(self):
-        ensure_excel_exists()
-        init_db()
+    def __init__(self, service=None):
+        # a RemoteLibraryService makes this a thin client of a --serve instance
+        self.remote = service is not None
+        self.service = service or LibraryService()
         # Use a dark theme: 'darkly' is a good dark theme in ttkbootstrap
         self.root = tb.Window(themename="darkly")
         self.root.title("E-Book Library System")
         self.root.geometry(WIN_GEOM)
         self.root.resizable(False, False)
         self.current_user = None
-        self.cleanup_expired_issues_on_startup()
+        self.root.after(METRICS_EXPORT_MS, self._export_metrics)
         self.create_main_menu()
+        if not self.remote:
+            # the menu is drawn by an idle callback, so queueing the timer from one keeps it behind the first frame
+            self.root.after_idle(lambda: self.root.after(0, self._startup))
+
+    def _startup(self):
+        """Local-mode setup and maintenance, run once the main menu is on screen."""
+        ensure_excel_exists()
+        init_db()
+        seed_catalog_from_excel()
+        expiry_engine.start(self.root)
+        auth_service.calibrate_in_background()
+        self.root.after(1500, self.service.warm_metadata)
+        self.root.after(3000, self.service.warm_text_index)
+        if CATALOG_BACKEND != "sqlite":
+            self.root.after(CATALOG_JOURNAL_IDLE_MS, self._compact_catalog_journal)
+
+    def _compact_catalog_journal(self):
+        catalog_journal.compact_if_idle()
+        self.root.after(CATALOG_JOURNAL_IDLE_MS, self._compact_catalog_journal)
+
+    def _export_metrics(self):
+        if metrics.enabled:
+            try:
+                metrics.export()
+            except OSError:
+                pass
+        self.root.after(METRICS_EXPORT_MS, self._export_metrics)
 
     def create_main_menu(self):
         for w in self.root.winfo_children():
@@ -388,6 +3729,9 @@ class LibraryApp:
 
     # ---------- management ----------
     def management_login(self):
+        if self.remote:
+            messagebox.showinfo("Management", "Catalog management runs on the library server's machine.")
+            return
         popup = tb.Toplevel(self.root)
         popup.title("Management Login")
         popup.geometry(f"{POPUP_W}x{POPUP_H}")
@@ -432,9 +3776,63 @@ class LibraryApp:
         tb.Button(frm, text="Add Book", bootstyle="success", width=22, command=self.add_book_popup).pack(pady=8)
         tb.Button(frm, text="Delete Book", bootstyle="danger", width=22, command=self.delete_book_popup).pack(pady=8)
         tb.Button(frm, text="Modify Book", bootstyle="info", width=22, command=self.modify_book_popup).pack(pady=8)
+        tb.Button(frm, text="Bulk Edit", bootstyle="info-outline", width=22, command=self.bulk_edit_popup).pack(pady=8)
         tb.Button(frm, text="Search Books", bootstyle="secondary", width=22, command=self.management_search).pack(pady=8)
         tb.Button(frm, text="Show All Books", bootstyle="light", width=22, command=self.show_all_books).pack(pady=8)
+        if CATALOG_BACKEND == "sqlite":
+            tb.Button(frm, text="Import from Excel", bootstyle="warning", width=22, command=self.import_from_excel).pack(pady=8)
+            tb.Button(frm, text="Export to Excel", bootstyle="warning", width=22, command=self.export_to_excel).pack(pady=8)
         tb.Button(frm, text="🔙 Back", bootstyle="secondary", width=18, command=self.create_main_menu).pack(pady=18)
+        # hidden: Ctrl+Shift+D opens the diagnostics panel while the management panel is showing
+        self.root.bind("<Control-D>", lambda e: self.diagnostics_panel() if frm.winfo_exists() else None)
+
+    def diagnostics_panel(self):
+        win = tb.Toplevel(self.root)
+        win.title("Diagnostics")
+        win.geometry(f"{POPUP_W + 160}x{POPUP_H}")
+        frm = tb.Frame(win, padding=12)
+        frm.pack(fill="both", expand=True)
+        tb.Label(frm, text="Diagnostics", font=HEADER_FONT).pack(anchor="w")
+        state = tb.Label(frm, font=("Segoe UI", 10))
+        state.pack(anchor="w", pady=(2, 8))
+        table = tk.Text(frm, font=("Consolas", 10), height=18, wrap="none")
+        table.pack(fill="both", expand=True)
+        btns = tb.Frame(frm)
+        btns.pack(fill="x", pady=(8, 0))
+
+        def refresh():
+            if not win.winfo_exists():
+                return
+            state.configure(text=("Collecting timings" if metrics.enabled else "Metrics are off (start with EBOOK_METRICS=1 or press Enable)")
+                            + f" — exported to {METRICS_FILE}")
+            lines = [f"{'span':<24}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'avg ms':>10}{'total s':>10}"]
+            for name, st in metrics.snapshot().items():
+                avg = st["sum"] / st["count"] if st["count"] else 0.0
+                lines.append(f"{name[:23]:<24}{st['count']:>8}{st['p50'] * 1e3:>10.1f}{st['p95'] * 1e3:>10.1f}"
+                             f"{st['max'] * 1e3:>10.1f}{avg * 1e3:>10.1f}{st['sum']:>10.2f}")
+            table.configure(state="normal")
+            table.delete("1.0", "end")
+            table.insert("end", "\n".join(lines))
+            table.configure(state="disabled")
+            toggle.configure(text="Disable" if metrics.enabled else "Enable")
+            win.after(1000, refresh)
+
+        def toggle_metrics():
+            metrics.enabled = not metrics.enabled
+            refresh()
+
+        def export():
+            try:
+                messagebox.showinfo("Exported", f"Metrics written to {metrics.export()}", parent=win)
+            except OSError as e:
+                messagebox.showerror("Export failed", str(e), parent=win)
+
+        toggle = tb.Button(btns, bootstyle="info", width=10, command=toggle_metrics)
+        toggle.pack(side="left")
+        tb.Button(btns, text="Reset", bootstyle="warning", width=10, command=metrics.reset).pack(side="left", padx=6)
+        tb.Button(btns, text="Export", bootstyle="secondary", width=10, command=export).pack(side="left")
+        tb.Button(btns, text="Close", bootstyle="secondary", width=10, command=win.destroy).pack(side="right")
+        refresh()
 
     # ...existing code...
     def add_book_popup(self):
@@ -483,8 +3881,6 @@ class LibraryApp:
         on_type_change()
 
         def do_add():
-            # reload the excel fresh to avoid closure/local variable issues
-            pdf_df, ebook_df = load_excel()
             title = (title_e.get() or "").strip()
             author = (author_e.get() or "").strip()
             typ = (type_var.get() or "").strip().lower()
@@ -492,25 +3888,27 @@ class LibraryApp:
             if not title or not author or not typ:
                 messagebox.showwarning("Input", "Please fill title, author and type.")
                 return
-            if typ == "pdf":
-                if 'title' not in pdf_df.columns: pdf_df['title'] = []
-                if 'author' not in pdf_df.columns: pdf_df['author'] = []
-                if 'filepath' not in pdf_df.columns: pdf_df['filepath'] = []
-                # if user didn't provide a filepath, leave it blank — app will search script folder by title when opening
-                new = pd.DataFrame([[title, author, loc]], columns=['title','author','filepath'])
-                pdf_df = pd.concat([pdf_df, new], ignore_index=True)
-            else:
-                if 'title' not in ebook_df.columns: ebook_df['title'] = []
-                if 'author' not in ebook_df.columns: ebook_df['author'] = []
-                if 'url' not in ebook_df.columns: ebook_df['url'] = []
-                new = pd.DataFrame([[title, author, loc]], columns=['title','author','url'])
-                ebook_df = pd.concat([ebook_df, new], ignore_index=True)
-            save_excel(pdf_df, ebook_df)
-            popup.destroy()
+            # a PDF is hashed and copied into the blob store first, which can take a while: do
+            # it on the transfer pool and come back to the Tk thread when the row is written
+            add_btn.configure(state="disabled")
+
+            def done(_result, error):
+                if popup.winfo_exists():
+                    add_btn.configure(state="normal")
+                if error:
+                    messagebox.showerror("Error saving catalog", str(error))
+                    return
+                messagebox.showinfo("Saved", "Catalog updated.")
+                if popup.winfo_exists():
+                    popup.destroy()
+
+            job = download_manager.submit_call(lambda _job: catalog_add(title, author, typ, loc), "", loc)
+            call_when_done(self.root, job.future, done)
 
         btns = tb.Frame(frm)
         btns.pack(fill="x", pady=(6,0))
-        tb.Button(btns, text="Add Book", bootstyle="success", width=BTN_WIDTH, command=do_add).pack(side="left", padx=6)
+        add_btn = tb.Button(btns, text="Add Book", bootstyle="success", width=BTN_WIDTH, command=do_add)
+        add_btn.pack(side="left", padx=6)
         tb.Button(btns, text="Cancel", bootstyle="secondary", width=BTN_WIDTH, command=popup.destroy).pack(side="right", padx=6)
 
     def delete_book_popup(self):
@@ -529,13 +3927,12 @@ class LibraryApp:
             if not title:
                 messagebox.showwarning("Input", "Please enter title.")
                 return
-            pdf_df2, ebook_df2 = load_excel()
-            # guard if columns absent
-            if 'title' in pdf_df2.columns:
-                pdf_df2 = pdf_df2[~(pdf_df2.get('title','').astype(str).str.lower() == title.lower())]
-            if 'title' in ebook_df2.columns:
-                ebook_df2 = ebook_df2[~(ebook_df2.get('title','').astype(str).str.lower() == title.lower())]
-            save_excel(pdf_df2, ebook_df2)
+            try:
+                removed = catalog_delete(title)
+            except Exception as e:
+                messagebox.showerror("Error saving catalog", str(e))
+                return
+            messagebox.showinfo("Saved", f"Catalog updated ({removed} removed).")
             popup.destroy()
 
         btns = tb.Frame(frm)
@@ -564,22 +3961,12 @@ class LibraryApp:
                 return
             new_title = (new_t_e.get() or "").strip()
             new_author = (new_a_e.get() or "").strip()
-            pdf_df2, ebook_df2 = load_excel()
-            modified = False
-            if 'title' in pdf_df2.columns:
-                mask = pdf_df2['title'].astype(str).str.lower() == old_title.lower()
-                if mask.any():
-                    if new_title: pdf_df2.loc[mask, 'title'] = new_title
-                    if new_author: pdf_df2.loc[mask, 'author'] = new_author
-                    modified = True
-            if 'title' in ebook_df2.columns:
-                mask2 = ebook_df2['title'].astype(str).str.lower() == old_title.lower()
-                if mask2.any():
-                    if new_title: ebook_df2.loc[mask2, 'title'] = new_title
-                    if new_author: ebook_df2.loc[mask2, 'author'] = new_author
-                    modified = True
+            try:
+                modified = catalog_modify(old_title, new_title, new_author)
+            except Exception as e:
+                messagebox.showerror("Error saving catalog", str(e))
+                return
             if modified:
-                save_excel(pdf_df2, ebook_df2)
                 messagebox.showinfo("Success", "Book updated.")
                 popup.destroy()
             else:
@@ -590,44 +3977,131 @@ class LibraryApp:
         tb.Button(btns, text="Update", bootstyle="primary", width=BTN_WIDTH, command=do_modify).pack(side="left", padx=6)
         tb.Button(btns, text="Cancel", bootstyle="secondary", width=BTN_WIDTH, command=popup.destroy).pack(side="right", padx=6)
 
+    def bulk_edit_popup(self):
+        popup = tb.Toplevel(self.root)
+        popup.title("Bulk Edit")
+        popup.geometry(f"{POPUP_W + 120}x{POPUP_H + 160}")
+        frm = tb.Frame(popup, padding=14); frm.pack(fill="both", expand=True)
+        tb.Label(frm, text="Bulk Edit — books matching all conditions", font=HEADER_FONT).pack(anchor="w", pady=(0,8))
+        tb.Label(frm, text="Titles (exact, one per line)", font=LABEL_FONT).pack(anchor="w")
+        titles_t = tk.Text(frm, height=4, font=("Segoe UI", 11)); titles_t.pack(fill="x", pady=(0,6))
+        row = tb.Frame(frm); row.pack(fill="x")
+        tb.Label(row, text="Author", font=LABEL_FONT).grid(row=0, column=0, sticky="w")
+        tb.Label(row, text="Title matches (regex)", font=LABEL_FONT).grid(row=0, column=1, sticky="w", padx=(8,0))
+        author_e = tb.Entry(row); author_e.grid(row=1, column=0, sticky="ew")
+        pattern_e = tb.Entry(row); pattern_e.grid(row=1, column=1, sticky="ew", padx=(8,0))
+        row.columnconfigure((0, 1), weight=1)
+        missing_var = tk.BooleanVar(value=False)
+        tb.Checkbutton(frm, text="PDF file is missing", variable=missing_var).pack(anchor="w", pady=6)
+
+        action_var = tk.StringVar(value="delete")
+        acts = tb.Frame(frm); acts.pack(fill="x")
+        tb.Radiobutton(acts, text="Delete", value="delete", variable=action_var).pack(side="left")
+        tb.Radiobutton(acts, text="Modify", value="modify", variable=action_var).pack(side="left", padx=12)
+        row2 = tb.Frame(frm); row2.pack(fill="x", pady=(4,0))
+        tb.Label(row2, text="New title (with a regex: replacement, \\1 = group)", font=LABEL_FONT).grid(row=0, column=0, sticky="w")
+        tb.Label(row2, text="New author", font=LABEL_FONT).grid(row=0, column=1, sticky="w", padx=(8,0))
+        new_t_e = tb.Entry(row2); new_t_e.grid(row=1, column=0, sticky="ew")
+        new_a_e = tb.Entry(row2); new_a_e.grid(row=1, column=1, sticky="ew", padx=(8,0))
+        row2.columnconfigure((0, 1), weight=1)
+
+        status = tb.Label(frm, text="Preview shows the affected rows before anything is written.", font=("Segoe UI", 10))
+        status.pack(anchor="w", pady=(8,4))
+        preview = {"rows": []}
+
+        def format_row(pos, rid):
+            r = preview["rows"][rid]
+            text = f"{pos}: {r['title']} — {r['author'] or ''} ({r['source']})"
+            if 'new_title' in r:
+                text += f"  →  {r['new_title']} — {r['new_author'] or ''}"
+            return text
+
+        results = VirtualListbox(frm, format_row)
+        results.pack(fill="both", expand=True)
+        pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bulk")
+        popup.bind("<Destroy>", lambda e: pool.shutdown(wait=False) if e.widget is popup else None, add="+")
+        busy = {"on": False}
+
+        def submit(action, params, dry_run, confirm=False, keys=None):
+            busy["on"] = True
+            status.configure(text="Checking the catalog…")
+
+            def done(hit, error):
+                busy["on"] = False
+                if not popup.winfo_exists():
+                    return
+                if error:
+                    status.configure(text="")
+                    messagebox.showerror(getattr(error, "title", "Bulk edit failed"), str(error), parent=popup)
+                    return
+                preview["rows"] = hit.where(hit.notna(), None).to_dict("records")
+                results.set_items(list(range(len(preview["rows"]))))
+                verb = "deleted" if action == "delete" else "modified"
+                status.configure(text=f"{len(hit)} books would be {verb}." if dry_run else f"{len(hit)} books {verb}.")
+                if confirm and len(hit) and messagebox.askyesno("Apply", f"{len(hit)} books will be {verb}. Apply now?", parent=popup):
+                    submit(action, params, False, keys=list(hit['key']))  # exactly the rows just confirmed
+
+            call_when_done(popup, pool.submit(catalog_bulk, action, dry_run=dry_run, keys=keys, **params), done)
+
+        def run(dry_run, confirm=False):
+            if busy["on"]:
+                return
+            params = dict(titles=titles_t.get("1.0", "end").splitlines(), author=author_e.get(), pattern=pattern_e.get().strip(),
+                          missing_file=missing_var.get(), new_title=new_t_e.get().strip(), new_author=new_a_e.get().strip())
+            submit(action_var.get(), params, dry_run, confirm)
+
+        btns = tb.Frame(frm); btns.pack(fill="x", pady=(8,0))
+        tb.Button(btns, text="Preview", bootstyle="info", width=BTN_WIDTH, command=lambda: run(True)).pack(side="left", padx=6)
+        tb.Button(btns, text="Apply…", bootstyle="danger", width=BTN_WIDTH,
+                  command=lambda: run(True, confirm=True)).pack(side="left", padx=6)
+        tb.Button(btns, text="Close", bootstyle="secondary", width=BTN_WIDTH, command=popup.destroy).pack(side="right", padx=6)
+
+    def import_from_excel(self):
+        if not messagebox.askyesno("Import", f"Replace the catalog with the contents of:\n{EXCEL_PATH}?"):
+            return
+        try:
+            n = import_catalog_from_excel()
+        except Exception as e:
+            messagebox.showerror("Import failed", str(e))
+            return
+        messagebox.showinfo("Imported", f"{n} books imported from Excel.")
+
+    def export_to_excel(self):
+        try:
+            n = export_catalog_to_excel()
+        except Exception as e:
+            messagebox.showerror("Export failed", str(e))
+            return
+        messagebox.showinfo("Exported", f"{n} books written to:\n{EXCEL_PATH}")
+
     def management_search(self):
-        pdf_df, ebook_df = load_excel()
-        if pdf_df.empty and ebook_df.empty:
-            messagebox.showinfo("No books", "No books in Excel.")
+        try:
+            data_list = catalog_records()
+        except LibraryError as e:
+            messagebox.showerror(e.title, str(e)); return
+        if not data_list:
+            messagebox.showinfo("No books", "No books in the catalog.")
             return
-        if not pdf_df.empty: pdf_df['source'] = 'pdf'
-        if not ebook_df.empty: ebook_df['source'] = 'ebook'
-        combined = pd.concat([pdf_df, ebook_df], ignore_index=True, sort=False)
-        data_list = []
-        for _, r in combined.iterrows():
-            data_list.append({k:(None if pd.isna(v) else v) for k,v in r.items()})
         def on_select(chosen):
-            title = chosen.get('title') or ""
-            author = chosen.get('author') or ""
-            typ = chosen.get('source') or ""
-            loc = chosen.get('filepath') or chosen.get('url') or ""
-            messagebox.showinfo("Book Selected", f"Title: {title}\nAuthor: {author}\nType: {typ}\nLocation: {loc}")
+            messagebox.showinfo("Book Selected", f"Title: {chosen.title}\nAuthor: {chosen.author or ''}\nType: {chosen.source}\nLocation: {chosen.location}")
         open_search_window(self.root, data_list, title="Management: Search Books", on_select=on_select)
 
     # ...existing code...
     def show_all_books(self):
-        pdf_df, ebook_df = load_excel()
+        try:
+            records = catalog_records()
+        except LibraryError as e:
+            messagebox.showerror(e.title, str(e)); return
         lines = []
-        if not pdf_df.empty:
-            lines.append("📘 Book PDFs:")
-            for i, row in pdf_df.iterrows():
-                title = row.get('title') or ""
-                author = row.get('author') or ""
-                path = row.get('filepath') or row.get('path') or ""
-                lines.append(f"{i+1}. {title} — {author}" + (f" ({path})" if path else ""))
-            lines.append("")  # blank line between sections
-        if not ebook_df.empty:
-            lines.append("🌐 E-Books:")
-            for i, row in ebook_df.iterrows():
-                title = row.get('title') or ""
-                author = row.get('author') or ""
-                url = row.get('url') or ""
-                lines.append(f"{i+1}. {title} — {author}" + (f" ({url})" if url else ""))
+        for source, heading in (("pdf", "📘 Book PDFs:"), ("ebook", "🌐 E-Books:")):
+            rows = [r for r in records if r.source == source]
+            if not rows:
+                continue
+            if lines:
+                lines.append("")  # blank line between sections
+            lines.append(heading)
+            for i, row in enumerate(rows):
+                lines.append(f"{i+1}. {row.title} — {row.author or ''}" + (f" ({row.location})" if row.location else ""))
         out = "\n".join(lines) if lines else "No books found."
         messagebox.showinfo("All Books", out)
 # ...existing code...
@@ -645,57 +4119,59 @@ class LibraryApp:
         tb.Label(frm, text="Password", font=LABEL_FONT).pack(anchor="w")
         pwd_e = tb.Entry(frm, show="*"); pwd_e.pack(fill="x", pady=(0,12)); pwd_e.configure(font=("Segoe UI",12))
 
+        busy = {"on": False}
+
+        def run_auth(future, on_ok):
+            busy["on"] = True
+            popup.configure(cursor="watch")
+            def done(result, error):
+                busy["on"] = False
+                if not popup.winfo_exists():
+                    return
+                popup.configure(cursor="")
+                on_ok(result, error)
+            call_when_done(popup, future, done)
+
         def do_register():
+            if busy["on"]:
+                return
             user = (user_e.get() or "").strip()
             pwd = (pwd_e.get() or "").strip()
             if not user or not pwd:
                 messagebox.showwarning("Input", "Provide username and password.")
                 return
-            conn = sqlite3.connect(DB_PATH); c = conn.cursor()
-            try:
-                hashed = hash_password(pwd)
-                c.execute("INSERT INTO users (username, password) VALUES (?,?)", (user, hashed))
-                conn.commit()
-                messagebox.showinfo("Registered", "Registration successful. Please login.")
-            except sqlite3.IntegrityError:
-                messagebox.showerror("Error", "Username exists.")
-            finally:
-                conn.close()
+            def registered(_result, error):
+                if isinstance(error, sqlite3.IntegrityError):
+                    messagebox.showerror("Error", "Username exists.")
+                elif isinstance(error, LibraryError):
+                    messagebox.showerror(error.title, str(error))
+                elif error:
+                    messagebox.showerror("Error", f"Registration failed:\n{error}")
+                else:
+                    messagebox.showinfo("Registered", "Registration successful. Please login.")
+            run_auth(self.service.register_async(user, pwd), registered)
 
         def do_login():
+            if busy["on"]:
+                return
             user = (user_e.get() or "").strip()
             pwd = (pwd_e.get() or "").strip()
             if not user or not pwd:
                 messagebox.showwarning("Input", "Provide username and password.")
                 return
-            conn = sqlite3.connect(DB_PATH); c = conn.cursor()
-            try:
-                c.execute("SELECT password FROM users WHERE username=?", (user,))
-                row = c.fetchone()
-                if not row:
-                    messagebox.showerror("Error", "Invalid credentials.")
-                    return
-                stored = row[0] or ""
-                hashed_input = hash_password(pwd)
-                # If stored value length is 64 assume it's already a SHA-256 hash
-                if len(stored) == 64:
-                    ok = stored == hashed_input
-                else:
-                    # fallback: compare plaintext (for legacy DBs); then upgrade by storing hash
-                    ok = stored == pwd
-                    if ok:
-                        c.execute("UPDATE users SET password=? WHERE username=?", (hashed_input, user))
-                        conn.commit()
-                if ok:
+            def logged_in(ok, error):
+                if isinstance(error, LibraryError):
+                    messagebox.showerror(error.title, str(error))
+                elif error:
+                    messagebox.showerror("Error", f"Login failed:\n{error}")
+                elif ok:
                     self.current_user = user
-                    self.cleanup_expired_issues_for_user(user)
                     messagebox.showinfo("Welcome", f"Welcome {user}!")
                     popup.destroy()
                     self.customer_dashboard()
                 else:
                     messagebox.showerror("Error", "Invalid credentials.")
-            finally:
-                conn.close()
+            run_auth(self.service.login_async(user, pwd), logged_in)
 
         btns = tb.Frame(frm); btns.pack(fill="x", pady=(6,0))
         tb.Button(btns, text="Register", bootstyle="success", width=BTN_WIDTH, command=do_register).pack(side="left", padx=6)
@@ -715,39 +4191,15 @@ class LibraryApp:
         self.current_user = None
         self.create_main_menu()
 
-    def cleanup_expired_issues_on_startup(self):
-        conn = sqlite3.connect(DB_PATH); c = conn.cursor()
-        try:
-            now_iso = datetime.now().isoformat()
-            c.execute("DELETE FROM issued_books WHERE expiry_date <= ?", (now_iso,))
-            conn.commit()
-        finally:
-            conn.close()
-
-    def cleanup_expired_issues_for_user(self, username):
-        # Remove expired issues for everyone (keeps logic same as original) but we could restrict to username if desired
-        conn = sqlite3.connect(DB_PATH); c = conn.cursor()
-        try:
-            now_iso = datetime.now().isoformat()
-            c.execute("DELETE FROM issued_books WHERE expiry_date <= ?", (now_iso,))
-            conn.commit()
-        finally:
-            conn.close()
-
     # ---------- Read / Issue / Buy ----------
     def customer_read_book(self):
-        pdf_df, ebook_df = load_excel()
-        pdf_df.columns = [c.lower().strip() for c in pdf_df.columns] if not pdf_df.empty else pdf_df.columns
-        ebook_df.columns = [c.lower().strip() for c in ebook_df.columns] if not ebook_df.empty else ebook_df.columns
-        if not pdf_df.empty: pdf_df['source'] = 'pdf'
-        if not ebook_df.empty: ebook_df['source'] = 'ebook'
-        combined = pd.concat([pdf_df, ebook_df], ignore_index=True, sort=False) if (not pdf_df.empty or not ebook_df.empty) else pd.DataFrame()
-        if combined.empty:
+        try:
+            display_list = self.service.catalog()
+        except LibraryError as e:
+            messagebox.showerror(e.title, str(e)); return
+        if not display_list:
             messagebox.showinfo("No books", "No books available.")
             return
-        display_list = []
-        for _, r in combined.iterrows():
-            display_list.append({k:(None if pd.isna(v) else v) for k,v in r.items()})
 
         win = tb.Toplevel(self.root)
         win.title("Read / Issue / Buy")
@@ -758,98 +4210,99 @@ class LibraryApp:
         search_var = tb.StringVar()
         search_entry = tb.Entry(win, textvariable=search_var)
         search_entry.pack(fill="x", padx=12, pady=(6,8))
-        list_frame = tb.Frame(win); list_frame.pack(fill="both", expand=True, padx=12, pady=(0,8))
-        sbar = tk.Scrollbar(list_frame, orient="vertical"); sbar.pack(side="right", fill="y")
-        lbox = tk.Listbox(list_frame, yscrollcommand=sbar.set, font=("Segoe UI", 11)); lbox.pack(side="left", fill="both", expand=True)
-        sbar.config(command=lbox.yview)
 
+        def format_row(pos, rid):
+            rd = display_list[rid]
+            typ = "PDF" if rd.source == 'pdf' else "Online"
+            return f"{pos}: {rd.title} — {rd.author or ''}  ({typ})"
 
-        # ...existing code...
-        # keep track of the currently shown (rendered) items so selection maps correctly
-        shown = []
-
-        def render(data):
-            nonlocal shown
-            shown.clear()
-            lbox.delete(0, "end")
-            for i, rd in enumerate(data):
-                shown.append(rd)
-                t = str(rd.get('title') or "")
-                a = str(rd.get('author') or "")
-                typ = "PDF" if rd.get('source') == 'pdf' else "Online"
-                lbox.insert("end", f"{i}: {t} — {a}  ({typ})")
-
-        render(display_list)
-
-        def filter_reorder(_=None):
-            q = (search_var.get() or "").strip().lower()
-            if not q:
-                render(display_list); return
-            matched = [rd for rd in display_list if q in str(rd.get('title') or "").lower()]
-            others = [rd for rd in display_list if rd not in matched]
-            render(matched + others)
+        def fill_from_select(rid):
+            if rid is not None:
+                search_var.set(display_list[rid].title)
+                shown["rid"] = rid
+                show_details(rid)
 
-        search_entry.bind("<KeyRelease>", filter_reorder)
+        results = VirtualListbox(win, format_row, on_select=fill_from_select)
+        results.pack(fill="both", expand=True, padx=12, pady=(0,8))
 
-        def fill_from_select(evt):
-            sel = lbox.curselection()
-            if not sel:
+        details = tb.Frame(win); details.pack(fill="x", padx=12)
+        thumb_lbl = tb.Label(details); thumb_lbl.pack(side="left")
+        info_lbl = tb.Label(details, text="", font=("Segoe UI", 10), justify="left"); info_lbl.pack(side="left", padx=10)
+        shown = {"rid": None, "img": None}
+
+        def show_details(rid, tries=0):
+            # metadata comes from the pipeline's cache; while a file is queued, look again shortly
+            if rid != shown["rid"] or not win.winfo_exists():
+                return
+            rd = display_list[rid]
+            meta = self.service.book_metadata(rd) if rd.source == 'pdf' else None
+            if not meta or meta.get("pending"):
+                thumb_lbl.configure(image=""); shown["img"] = None
+                waiting = bool(meta) and tries < 40
+                info_lbl.configure(text="Reading file details…" if waiting else "")
+                if waiting:
+                    win.after(250, lambda: show_details(rid, tries + 1))
                 return
-            idx = sel[0]  # index into the currently shown list
-            if 0 <= idx < len(shown):
-                search_var.set(str(shown[idx].get('title') or ""))
-        lbox.bind("<<ListboxSelect>>", fill_from_select)
+            if meta.get("error"):
+                info_lbl.configure(text=f"{meta['size'] / 1e6:.1f} MB · unreadable PDF"); return
+            lines = [" · ".join(x for x in (f"{meta['pages']} pages" if meta.get('pages') else "", f"{meta['size'] / 1e6:.1f} MB") if x)]
+            lines += [f"{label}: {meta[k]}" for k, label in (("title", "Title"), ("author", "Author"), ("producer", "Producer")) if meta.get(k)]
+            info_lbl.configure(text="\n".join(lines))
+            shown["img"] = tk.PhotoImage(data=base64.b64encode(meta["thumbnail"])) if meta.get("thumbnail") else None
+            thumb_lbl.configure(image=shown["img"] or "")
+        all_ids = list(range(len(display_list)))
+        results.set_items(all_ids)
+
+        index = SearchIndex(display_list)
+
+        def show_results(_query, ids):
+            results.set_items(all_ids if ids is None else index.reorder(ids))
+
+        controller = SearchController(win, index, show_results)
+        search_entry.bind("<KeyRelease>", lambda _=None: controller.schedule(search_var.get() or ""))
+        win.bind("<Destroy>", lambda _=None: controller.cancel(), add="+")
 
         def get_chosen_by_title():
             q = (search_var.get() or "").strip().lower()
             if not q:
                 messagebox.showwarning("Select", "Type or choose a book title in the search box first.")
                 return None
-            # prefer exact match among currently shown items, then fall back to full list
-            for rd in shown:
-                if q == str(rd.get('title') or "").strip().lower():
-                    return rd
-            for rd in display_list:
-                if q == str(rd.get('title') or "").strip().lower():
-                    return rd
-            # then try partial matches (shown first)
-            for rd in shown:
-                if q in str(rd.get('title') or "").strip().lower():
-                    return rd
-            for rd in display_list:
-                if q in str(rd.get('title') or "").strip().lower():
+            # the highlighted row wins when it is the title in the box (duplicate titles stay distinct)
+            rid = results.selected_id()
+            if rid is not None and q == display_list[rid].title.lower():
+                return display_list[rid]
+            # the index ranks title hits exact, then prefix, then word prefix and substring (the
+            # order the list shows them in); a hit on the author alone does not name the book
+            top = index.search(q, limit=1)
+            if top and index.rank(top[0], normalize_text(q)) <= index.SUBSTRING:
+                return display_list[top[0]]
+            # no title contains the text, so it is probably misspelt: offer the closest title
+            best = index.fuzzy(q, k=1)
+            if best:
+                rd = display_list[best[0][1]]
+                if messagebox.askyesno("Not found", f"No book matching '{search_var.get().strip()}'.\n\nDid you mean '{rd.title}'?"):
+                    search_var.set(rd.title)
                     return rd
+                return None
             messagebox.showerror("Not found", "No book matching the search entry.")
             return None
 
-        # ...existing code...
         def action_read():
             rd = get_chosen_by_title()
             if not rd: return
-            if rd.get('source') == 'pdf':
-                filepath = ""
-                for col in ['filepath','path','file path','file','file_path']:
-                    if col in rd and rd.get(col):
-                        filepath = str(rd.get(col)).strip()
-                        break
-                if filepath and os.path.exists(filepath):
-                    if not open_pdf_in_chrome(filepath):
-                        open_pdf_in_acrobat(filepath)
-                    return
-                # fallback: search script directory by title only
-                title = str(rd.get('title') or "").strip()
-                found = find_pdf_in_script_dir_by_title(title)
+            if rd.source == 'pdf':
+                try:
+                    found = self.service.book_pdf(rd)
+                except LibraryError as e:
+                    messagebox.showerror(e.title, str(e)); return
                 if found:
                     if not open_pdf_in_chrome(found):
                         open_pdf_in_acrobat(found)
                     return
-                messagebox.showerror("Not found", f"PDF not found:\n{filepath or '(no stored path)'}\nSearched script folder for '{title}'.")
+                messagebox.showerror("Not found", f"PDF not found:\n{rd.location or '(no stored path)'}\nSearched script folder for '{rd.title}'.")
             else:
-                url = ""
-                for col in ['url','link','website']:
-                    if col in rd and rd.get(col):
-                        url = str(rd.get(col)).strip(); break
-                if url and (url.startswith("http://") or url.startswith("https://")):
+                url = rd.location
+                if is_url(url):
                     try_open_url_in_chrome(url)
                 else:
                     messagebox.showerror("Invalid URL", f"URL missing or invalid:\n{url}")
@@ -857,67 +4310,131 @@ class LibraryApp:
         def action_issue():
             rd = get_chosen_by_title()
             if not rd: return
-            title = str(rd.get('title') or "").strip(); author = str(rd.get('author') or "").strip()
-            source = rd.get('source') or 'pdf'
-            location = ""
-            for col in ['filepath','path','file path','file','file_path','url','link','website']:
-                if col in rd and rd.get(col):
-                    location = str(rd.get(col)).strip(); break
-            conn = sqlite3.connect(DB_PATH); c = conn.cursor()
-            c.execute("SELECT id, expiry_date FROM issued_books WHERE username=? AND title=?", (self.current_user, title))
-            r = c.fetchone(); now = datetime.now()
-            if r:
-                try: expiry = datetime.fromisoformat(r[1])
-                except: expiry = None
-                if expiry and expiry > now:
-                    messagebox.showinfo("Already issued", f"You already issued '{title}' until {expiry.date()}.")
-                    conn.close(); return
+            title = rd.title
+            try:
+                expiry_date = self.service.issue(self.current_user, rd)
+            except LibraryError as e:
+                if e.code == "already_issued":
+                    messagebox.showinfo(e.title, str(e))
                 else:
-                    c.execute("DELETE FROM issued_books WHERE id=?", (r[0],)); conn.commit()
-            issue_date = now; expiry_date = now + timedelta(days=10)
-            c.execute("""INSERT INTO issued_books (username, title, author, source, location, issue_date, expiry_date)
-                         VALUES (?, ?, ?, ?, ?, ?, ?)""", (self.current_user, title, author, source, location, issue_date.isoformat(), expiry_date.isoformat()))
-            conn.commit(); conn.close()
-            messagebox.showinfo("Issued", f"'{title}' issued for 10 days until {expiry_date.date()}.")
+                    messagebox.showerror(e.title, str(e))
+                return
+            messagebox.showinfo("Issued", f"'{title}' issued for {ISSUE_DAYS} days until {expiry_date.date()}.")
 
         def action_buy():
             rd = get_chosen_by_title()
             if not rd: return
-            title = str(rd.get('title') or "").strip(); author = str(rd.get('author') or "").strip()
-            source = rd.get('source') or 'pdf'
-            location = ""
-            for col in ['filepath','path','file path','file','file_path','url','link','website']:
-                if col in rd and rd.get(col):
-                    location = str(rd.get(col)).strip(); break
-            confirm = messagebox.askyesno("Confirm Payment", f"Buy '{title}' for ₹100?")
+            title = rd.title
+            confirm = messagebox.askyesno("Confirm Payment", f"Buy '{title}' for ₹{BOOK_PRICE:g}?")
             if not confirm: return
-            conn = sqlite3.connect(DB_PATH); c = conn.cursor()
-            c.execute("""INSERT INTO purchased_books (username, title, author, source, location, purchase_date, price)
-                         VALUES (?, ?, ?, ?, ?, ?, ?)""", (self.current_user, title, author, source, location, datetime.now().isoformat(), 100.0))
-            conn.commit(); conn.close()
+            try:
+                purchase = self.service.buy(self.current_user, rd)
+            except LibraryError as e:
+                messagebox.showerror(e.title, str(e)); return
             messagebox.showinfo("Payment Success", f"You purchased '{title}'.")
-            if source == 'pdf' and location:
-                downloads = get_downloads_folder()
-                try:
-                    if os.path.exists(location):
-                        dst_name = sanitize_filename(title) + ".pdf"
-                        dst_path = os.path.join(downloads, dst_name)
-                        shutil.copy2(location, dst_path)
-                        messagebox.showinfo("Downloaded", f"✅ Book downloaded to:\n{dst_path}")
-                    else:
-                        messagebox.showerror("File missing", f"PDF path not found:\n{location}")
-                except Exception as e:
-                    messagebox.showerror("Download error", str(e))
+            if purchase['source'] == 'pdf' and purchase['location']:
+                self.deliver_to_downloads(purchase, status)
 
+        status = tb.Label(win, text="", font=("Segoe UI", 10)); status.pack(fill="x", padx=12)
         actf = tb.Frame(win); actf.pack(pady=8)
         tb.Button(actf, text="Read Selected", bootstyle="primary", width=BTN_WIDTH, command=action_read).grid(row=0, column=0, padx=6)
         tb.Button(actf, text="Issue Selected", bootstyle="info", width=BTN_WIDTH, command=action_issue).grid(row=0, column=1, padx=6)
-        tb.Button(actf, text="Buy Selected (₹100)", bootstyle="success", width=BTN_WIDTH, command=action_buy).grid(row=0, column=2, padx=6)
+        tb.Button(actf, text=f"Buy Selected (₹{BOOK_PRICE:g})", bootstyle="success", width=BTN_WIDTH, command=action_buy).grid(row=0, column=2, padx=6)
         tb.Button(actf, text="Close", bootstyle="secondary", width=BTN_WIDTH, command=win.destroy).grid(row=0, column=3, padx=6)
+        tb.Button(actf, text="Search Inside Books", bootstyle="info-outline", width=BTN_WIDTH * 2,
+                  command=lambda: self.search_inside_books(win, search_var)).grid(row=1, column=0, columnspan=4, pady=(8,0))
+
+    def search_inside_books(self, parent, title_var):
+        """Full-text search over PDF contents; 'Use Title' hands the book back to the Read/Issue/Buy window."""
+        pop = tb.Toplevel(parent)
+        pop.title("Search Inside Books")
+        pop.geometry(f"{POPUP_W - 100}x{POPUP_H // 2}")
+        frm = tb.Frame(pop, padding=12); frm.pack(fill="both", expand=True)
+        tb.Label(frm, text="Find a word, name or \"exact phrase\":", font=LABEL_FONT).pack(anchor="w")
+        query_var = tb.StringVar()
+        entry = tb.Entry(frm, textvariable=query_var); entry.pack(fill="x", pady=(4,8)); entry.focus_set()
+        lb = tk.Listbox(frm, font=("Segoe UI", 11)); lb.pack(fill="both", expand=True)
+        status = tb.Label(frm, text="", font=("Segoe UI", 10)); status.pack(anchor="w", pady=(4,0))
+        hits = []
+
+        def run_query(_evt=None):
+            q = (query_var.get() or "").strip()
+            if not q:
+                return
+            try:
+                hits[:] = self.service.search_text(q, limit=100)
+            except (LibraryError, sqlite3.OperationalError) as e:
+                messagebox.showerror("Search", str(e)); return
+            lb.delete(0, "end")
+            for h in hits:
+                lb.insert("end", f"{h['title']} — p. {h['page']}:  {h['snippet']}")
+            status.configure(text=f"{len(hits)} matching pages" if hits else "No matches (new or changed books may still be indexing).")
+
+        def chosen():
+            sel = lb.curselection()
+            if not sel:
+                messagebox.showwarning("Select", "Select a result first."); return None
+            return hits[sel[0]]
+
+        def open_hit():
+            h = chosen()
+            if not h: return
+            try:
+                path = h.get('path') or self.service.book_pdf({'title': h['title'], 'source': 'pdf'})
+            except LibraryError as e:
+                messagebox.showerror(e.title, str(e)); return
+            if not path or not open_pdf_in_chrome(path, h['page']):
+                if path: open_pdf_in_acrobat(path)
+                else: messagebox.showerror("Not found", f"PDF not found for '{h['title']}'.")
+
+        def use_title():
+            h = chosen()
+            if not h: return
+            if not h.get('in_catalog', True):
+                messagebox.showinfo("Not in catalog", f"'{h['title']}' is in the library folder but not in the catalog."); return
+            title_var.set(h['title'])
+            pop.destroy()
+
+        entry.bind("<Return>", run_query)
+        btns = tb.Frame(frm); btns.pack(fill="x", pady=(8,0))
+        tb.Button(btns, text="Search", bootstyle="primary", width=BTN_WIDTH, command=run_query).pack(side="left", padx=6)
+        tb.Button(btns, text="Open at Page", bootstyle="info", width=BTN_WIDTH, command=open_hit).pack(side="left", padx=6)
+        tb.Button(btns, text="Use Title", bootstyle="success", width=BTN_WIDTH, command=use_title).pack(side="left", padx=6)
+        tb.Button(btns, text="Close", bootstyle="secondary", width=BTN_WIDTH, command=pop.destroy).pack(side="right", padx=6)
+
+    def deliver_to_downloads(self, purchase, status=None):
+        """Copy/download a purchased PDF into Downloads on the download manager, showing progress in `status`."""
+        title = str(purchase.get('title') or "book").strip()
+        downloads = get_downloads_folder()
+        try:
+            os.makedirs(downloads, exist_ok=True)
+        except Exception:
+            pass
+        dst = os.path.join(downloads, f"{sanitize_filename(title)}.pdf")
+        job = self.service.deliver_purchase_async(self.current_user, purchase, dst)
+
+        def set_status(text):
+            if status is not None and status.winfo_exists():
+                status.configure(text=text)
+
+        def show_progress():
+            if job.fraction is not None:
+                set_status(f"Downloading '{title}'… {job.fraction:.0%}")
+            elif job.received:
+                set_status(f"Downloading '{title}'… {job.received // 1024} KB")
+
+        def done(_result, error):
+            set_status("")
+            if error is None:
+                messagebox.showinfo("Downloaded", f"✅ Book downloaded to:\n{dst}")
+            elif isinstance(error, LibraryError):
+                messagebox.showerror(error.title, str(error))
+            else:
+                messagebox.showerror("Error", f"Download failed:\n{error}")
+        call_when_done(self.root, job.future, done, poll_ms=100, on_poll=show_progress)
 
     # ---------- My Issued / Purchased ----------
     def view_my_books(self):
-        self.cleanup_expired_issues_for_user(self.current_user)
         win = tb.Toplevel(self.root)
         win.title("My Issued / Purchased")
         win.geometry(f"{POPUP_W}x{POPUP_H}")
@@ -947,27 +4464,22 @@ class LibraryApp:
         tb.Label(right, text="Purchased", font=LABEL_FONT).pack(anchor="n")
         lb_purchased = tk.Listbox(right, width=50, height=20); lb_purchased.pack(fill="both", expand=True, padx=4, pady=(6,4))
 
-        # load data from DB
-        conn = sqlite3.connect(DB_PATH); c = conn.cursor()
-        c.execute("SELECT id, title, author, source, location, issue_date, expiry_date FROM issued_books WHERE username=?", (self.current_user,))
-        issued_rows = c.fetchall()
-        c.execute("SELECT id, title, author, source, location, purchase_date, price FROM purchased_books WHERE username=?", (self.current_user,))
-        purchased_rows = c.fetchall()
-        conn.close()
+        try:
+            mine = self.service.my_books(self.current_user)
+        except LibraryError as e:
+            messagebox.showerror(e.title, str(e)); win.destroy(); return
 
         issued_map = {}; purchased_map = {}
-        for r in issued_rows:
-            _id, title, author, source, location, issue_date, expiry_date = r
-            try: expiry_dt = datetime.fromisoformat(expiry_date)
+        for info in mine['issued']:
+            try: expiry_dt = datetime.fromisoformat(info['expiry_date'])
             except: expiry_dt = None
-            label = f"{title} — {author} (until {expiry_dt.date() if expiry_dt else expiry_date})"
+            label = f"{info['title']} — {info['author']} (until {expiry_dt.date() if expiry_dt else info['expiry_date']})"
             lb_issued.insert("end", label)
-            issued_map[label] = {'id':_id,'title':title,'author':author,'source':source,'location':location}
-        for r in purchased_rows:
-            _id, title, author, source, location, purchase_date, price = r
-            label = f"{title} — {author} (bought)"
+            issued_map[label] = info
+        for info in mine['purchased']:
+            label = f"{info['title']} — {info['author']} (bought)"
             lb_purchased.insert("end", label)
-            purchased_map[label] = {'id':_id,'title':title,'author':author,'source':source,'location':location}
+            purchased_map[label] = info
 
         def open_issued():
             sel = lb_issued.curselection()
@@ -978,20 +4490,17 @@ class LibraryApp:
             if not info:
                 messagebox.showerror("Error", "Info missing."); return
             if info['source'] == 'pdf':
-                loc = info.get('location') or ""
-                if loc and os.path.exists(loc):
-                    if not open_pdf_in_chrome(loc):
-                        open_pdf_in_acrobat(loc)
-                    return
-                # fallback: search script directory by title only
-                found = find_pdf_in_script_dir_by_title(info.get('title'))
+                try:
+                    found = self.service.book_pdf(info)
+                except LibraryError as e:
+                    messagebox.showerror(e.title, str(e)); return
                 if found:
                     if not open_pdf_in_chrome(found):
                         open_pdf_in_acrobat(found)
                     return
                 messagebox.showerror("Missing", f"PDF not found for '{info.get('title')}'.\nSearched stored path and script folder.")
             else:
-                if info.get('location') and (info['location'].startswith("http://") or info['location'].startswith("https://")):
+                if is_url(info.get('location')):
                     try_open_url_in_chrome(info['location'])
                 else:
                     messagebox.showerror("Missing", "URL missing/invalid.")
@@ -1002,7 +4511,8 @@ class LibraryApp:
             if not sel: messagebox.showwarning("Select", "Select an issued book to return."); return
             label = lb_issued.get(sel[0]); info = issued_map.get(label)
             if not info: messagebox.showerror("Error", "Info missing."); return
-            conn = sqlite3.connect(DB_PATH); c = conn.cursor(); c.execute("DELETE FROM issued_books WHERE id=?", (info['id'],)); conn.commit(); conn.close()
+            try: self.service.return_issue(self.current_user, info['id'])
+            except LibraryError as e: messagebox.showerror(e.title, str(e)); return
             messagebox.showinfo("Returned", f"'{info['title']}' returned successfully."); lb_issued.delete(sel[0])
 
 
@@ -1015,27 +4525,17 @@ class LibraryApp:
             if not info:
                 messagebox.showerror("Error", "Info missing."); return
             if info['source'] == 'pdf':
-                loc = info.get('location') or ""
-                if loc and os.path.exists(loc):
-                    if not open_pdf_in_chrome(loc):
-                        open_pdf_in_acrobat(loc)
-                    return
-                # try Downloads by sanitized title
-                downloads = get_downloads_folder()
-                candidate = os.path.join(downloads, f"{sanitize_filename(info.get('title'))}.pdf")
-                if os.path.exists(candidate):
-                    if not open_pdf_in_chrome(candidate):
-                        open_pdf_in_acrobat(candidate)
-                    return
-                # final fallback: search script folder by title
-                found = find_pdf_in_script_dir_by_title(info.get('title'))
+                try:
+                    found = self.service.purchased_pdf(self.current_user, info)
+                except LibraryError as e:
+                    messagebox.showerror(e.title, str(e)); return
                 if found:
                     if not open_pdf_in_chrome(found):
                         open_pdf_in_acrobat(found)
                     return
                 messagebox.showerror("Missing", f"PDF not found for '{info.get('title')}'.")
             else:
-                if info.get('location') and (info['location'].startswith("http://") or info['location'].startswith("https://")):
+                if is_url(info.get('location')):
                     try_open_url_in_chrome(info['location'])
                 else:
                     messagebox.showerror("Missing", "URL missing/invalid.")
@@ -1049,55 +4549,12 @@ class LibraryApp:
                 messagebox.showerror("Error", "Info missing."); return
             if info.get('source') != 'pdf':
                 messagebox.showinfo("Not Available", "This item is not a downloadable PDF."); return
-
-            title = str(info.get('title') or "book").strip()
-            src = (info.get('location') or "").strip()
-            downloads = get_downloads_folder()
-            try:
-                os.makedirs(downloads, exist_ok=True)
-            except Exception:
-                pass
-            dst = os.path.join(downloads, f"{sanitize_filename(title)}.pdf")
-
-            tried = []
-            try:
-                # 1) Try stored path (absolute or relative to script dir)
-                if src:
-                    candidate = os.path.expanduser(src)
-                    if not os.path.isabs(candidate):
-                        base = os.path.dirname(__file__) or os.getcwd()
-                        candidate = os.path.join(base, candidate)
-                    tried.append(candidate)
-                    if os.path.exists(candidate) and os.path.isfile(candidate):
-                        shutil.copy2(candidate, dst)
-                        messagebox.showinfo("Downloaded", f"✅ Book downloaded to:\n{dst}")
-                        return
-
-                # 2) If src is a URL, attempt to download it
-                if src and (src.startswith("http://") or src.startswith("https://")):
-                    try:
-                        urllib.request.urlretrieve(src, dst)
-                        messagebox.showinfo("Downloaded", f"✅ Book downloaded to:\n{dst}")
-                        return
-                    except Exception as e:
-                        tried.append(src)
-
-                # 3) Fallback: search script directory by title (best-effort)
-                found = find_pdf_in_script_dir_by_title(title)
-                if found:
-                    shutil.copy2(found, dst)
-                    messagebox.showinfo("Downloaded", f"✅ Book downloaded to:\n{dst}")
-                    return
-
-                # Nothing worked
-                details = "\n".join(tried) if tried else "(no candidate paths)"
-                messagebox.showerror("Missing", f"Could not locate original PDF for '{title}'.\nTried:\n{details}")
-            except Exception as e:
-                messagebox.showerror("Error", f"Download failed:\n{e}")
+            self.deliver_to_downloads(info, status)
 
         # bottom button frame (packed AFTER content_frame so it appears under the lists)
         # ...existing code...
         # bottom button frame (packed AFTER content_frame so it appears under the lists)
+        status = tb.Label(frm, text="", font=("Segoe UI", 10)); status.pack(fill="x", padx=10)
         bframe = tb.Frame(frm)
         bframe.pack(fill="x", pady=(6,4), padx=6)
         tb.Button(bframe, text="Read Issued", bootstyle="primary", width=BTN_WIDTH, command=open_issued).grid(row=0,column=0,padx=6)
@@ -1112,5 +4569,82 @@ class LibraryApp:
 
 # ---------- main ----------
 if __name__ == "__main__":
-    app = LibraryApp()
+    import argparse
+    parser = argparse.ArgumentParser(description="E-Book Library System")
+    parser.add_argument("--calibrate-kdf", action="store_true",
+                        help="measure password hashing cost on this machine, store it and exit")
+    parser.add_argument("--serve", nargs="?", const="", metavar="HOST:PORT",
+                        help=f"run the headless HTTP API instead of the window (default {SERVER_HOST}:{SERVER_PORT})")
+    parser.add_argument("--server", metavar="URL",
+                        help="use a library served with --serve instead of the local database")
+    parser.add_argument("--ingest", nargs="+", metavar="FILE",
+                        help="bulk-add books from .csv/.jsonl/.xlsx files (title, author, type, filepath/url) and exit")
+    parser.add_argument("--blobs", choices=["ingest", "gc"],
+                        help="ingest: move referenced PDFs into the content-addressed store; gc: delete unreferenced blobs older than an hour")
+    parser.add_argument("--extract-metadata", action="store_true",
+                        help="extract page counts, document info and thumbnails for every catalog PDF and exit")
+    parser.add_argument("--index-text", action="store_true",
+                        help="(re)build the full-text index for new or changed PDFs and exit")
+    parser.add_argument("--metrics", action="store_true",
+                        help=f"record timing spans and write them to {METRICS_FILE} (same as EBOOK_METRICS=1)")
+    args = parser.parse_args()
+    if args.metrics:
+        metrics.enabled = True
+    atexit.register(lambda: metrics.enabled and metrics.export())
+    if CATALOG_BACKEND != "sqlite":
+        atexit.register(catalog_journal._compact_quietly)  # fold what is left: --ingest, --serve and the window all end here
+    if args.index_text:
+        ensure_excel_exists()
+        init_db()
+        seed_catalog_from_excel()
+        stats = LibraryService().update_text_index(lambda st, path: print(f"  indexed {os.path.basename(path)}", file=sys.stderr))
+        print(f"{stats['indexed']} indexed ({stats['pages']} pages), {stats['unchanged']} unchanged, "
+              f"{stats['removed']} removed, {stats['failed']} failed in {stats['seconds']:.2f}s.")
+        sys.exit(0)
+    if args.extract_metadata:
+        ensure_excel_exists()
+        init_db()
+        seed_catalog_from_excel()
+        service = LibraryService()
+        started = time.perf_counter()
+        paths = [p for p in map(service.book_pdf, service.catalog()) if p]
+        queued = metadata_pipeline.submit(paths)
+        metadata_pipeline.wait()
+        print(f"{len(paths)} PDFs, {queued} extracted, {len(paths) - queued} cached ({time.perf_counter() - started:.2f}s).")
+        sys.exit(0)
+    if args.blobs:
+        ensure_excel_exists()
+        init_db()
+        seed_catalog_from_excel()
+        if args.blobs == "ingest":
+            print("Blob ingest:", ingest_blobs())
+        else:
+            count, freed = gc_blobs()
+            print(f"Removed {count} unreferenced blobs ({freed / 1e6:.1f} MB).")
+        sys.exit(0)
+    if args.ingest:
+        ensure_excel_exists()
+        init_db()
+        seed_catalog_from_excel()
+        def report(stats):
+            print(f"\r{stats['read']} read, {stats['added']} added, {stats['duplicates']} duplicate, "
+                  f"{stats['invalid']} invalid — {stats['rows_per_sec']:,.0f} rows/s", end="", file=sys.stderr, flush=True)
+        try:
+            stats = ingest_catalog(args.ingest, progress=report)
+        except (OSError, ValueError, LibraryError) as e:
+            print(f"Ingestion failed: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(file=sys.stderr)
+        for err in stats["errors"]:
+            print("  skipped", err, file=sys.stderr)
+        print(f"Added {stats['added']} books in {stats['seconds']:.2f}s ({stats['rows_per_sec']:,.0f} rows/s).")
+        sys.exit(0)
+    if args.calibrate_kdf:
+        init_db()
+        print("KDF parameters:", calibrate_kdf())
+        sys.exit(0)
+    if args.serve is not None:
+        run_server(args.serve or None)
+        sys.exit(0)
+    app = LibraryApp(RemoteLibraryService(args.server) if args.server else None)
     app.run()
@@ -0,0 +1,360 @@
+"""Benchmarks for the E-Book Library hot paths.
+
+Builds a synthetic workspace (Books.xlsx catalog, folder of small PDFs, library_users.db with
+issue/purchase history) in a temp directory, points the app's module globals at it and times:
+load_excel (cold/warm), save_excel, sqlite catalog load, search index build/search/narrowing,
+fuzzy matching, find_pdf_in_script_dir_by_title, issue/buy inserts and the view_my_books queries.
+
+Each case records the median and best wall time and the tracemalloc peak. Results go to JSON;
+with --baseline they are compared against an earlier run and slower cases are flagged.
+
+Before timing anything, the Excel catalog journal is checked: after journaled deletes, modifies
+and a compaction, load_excel() and load_excel_records() must still describe the same catalog.
+
+    python benchmarks/bench_library.py --sizes 1000,10000 --out bench.json
+    python benchmarks/bench_library.py --sizes 1000,10000 --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_library.py --sizes 1000,10000 --baseline benchmarks/baseline.json
+
+Generated data is seeded, so runs on the same machine are comparable. --sizes accepts up to
+1000000 rows; generating a 1M-row workbook takes a few minutes.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(os.path.dirname(HERE), "E-Book Library.py")
+
+WORDS = ("the of and a to in is you that it he was for on are as with his they at be this have from or one "
+         "had by word but not what all were we when your can said there use an each which she do how their if "
+         "will up other about out many then them these so some her would make like him into time has look two more "
+         "write go see number no way could people my than first water been call who oil its now find long down day "
+         "did get come made may part harry potter chamber secrets jungle book mistakes life caesar rome prince "
+         "phoenix stone goblet fire hallows ramcharitmanas kingdom river shadow winter garden empire silent").split()
+
+
+def load_app():
+    spec = importlib.util.spec_from_file_location("ebook_library", APP_PATH)
+    app = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app)
+    return app
+
+
+# ---------- synthetic data ----------
+def make_title(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 7))).title()
+
+
+def make_author(rng):
+    return f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()}"
+
+
+def make_catalog(app, path, rows, seed=0):
+    """Write a Books.xlsx with `rows` books: 70% on the "Book PDF" sheet, the rest on "E-Book"."""
+    import openpyxl
+    rng = random.Random(seed)
+    wb = openpyxl.Workbook(write_only=True)
+    pdf_ws = wb.create_sheet(app.SHEET_BOOK_PDF)
+    ebook_ws = wb.create_sheet(app.SHEET_EBOOK)
+    pdf_ws.append(["Title", "Author", "Filepath"])
+    ebook_ws.append(["Title", "Author", "URL"])
+    titles = []
+    for i in range(rows):
+        title = f"{make_title(rng)} {i}"
+        titles.append(title)
+        if rng.random() < 0.7:
+            pdf_ws.append([title, make_author(rng), ""])
+        else:
+            ebook_ws.append([title, make_author(rng), f"https://example.org/books/{i}"])
+    wb.save(path)
+    return titles
+
+
+def make_pdf(path, title, pages=1):
+    """A minimal, valid PDF with `pages` pages of text and an /Info title."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for n in range(pages):
+        text = f"BT /F1 12 Tf 72 720 Td ({title} page {n + 1}) Tj ET".encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(text), text))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> "
+                       b"/Contents %d 0 R >>" % (len(objects)))
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % k for k in kids), pages)
+    objects.append(b"<< /Title (%s) >>" % title.encode("latin-1", "replace"))
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (i, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, len(objects), xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def make_pdf_folder(app, folder, titles, count):
+    os.makedirs(folder, exist_ok=True)
+    for title in titles[:count]:
+        make_pdf(os.path.join(folder, app.sanitize_filename(title) + ".pdf"), title)
+
+
+def make_history(app, users, issues_per_user, purchases_per_user, titles, seed=0):
+    """Fill the user tables through the app's own schema (users get a cheap pbkdf2 hash)."""
+    rng = random.Random(seed)
+    now = datetime.now()
+    cheap = {"scheme": "pbkdf2_sha256", "iterations": 1000}
+    with app.db.transaction() as c:
+        c.executemany("INSERT OR IGNORE INTO users (username, password) VALUES (?, ?)",
+                      [(f"user{u}", app.hash_password("pw", cheap)) for u in range(users)])
+        c.executemany("""INSERT INTO issued_books (username, title, author, source, location, issue_date, expiry_date)
+                         VALUES (?, ?, ?, 'pdf', '', ?, ?)""",
+                      [(f"user{u}", rng.choice(titles), "", (now - timedelta(days=d)).isoformat(),
+                        (now + timedelta(days=app.ISSUE_DAYS - d)).isoformat())
+                       for u in range(users) for d in (rng.randint(0, 20) for _ in range(issues_per_user))])
+        c.executemany("""INSERT INTO purchased_books (username, title, author, source, location, purchase_date, price)
+                         VALUES (?, ?, ?, 'pdf', '', ?, ?)""",
+                      [(f"user{u}", rng.choice(titles), "", (now - timedelta(days=rng.randint(0, 900))).isoformat(), app.BOOK_PRICE)
+                       for u in range(users) for _ in range(purchases_per_user)])
+
+
+def make_workspace(app, root, rows, pdfs, users, seed=0):
+    """Create the synthetic files under `root` and repoint the app's module globals at them."""
+    os.makedirs(root, exist_ok=True)
+    app.EXCEL_PATH = os.path.join(root, "Books.xlsx")
+    app.DB_PATH = os.path.join(root, "library_users.db")
+    app.index_db.path = os.path.join(root, "library_index.db")
+    app.BLOB_DIR = os.path.join(root, "blobs")
+    app.blob_store = app.BlobStore(app.BLOB_DIR)
+    folder = os.path.join(root, "library")
+    app.script_dir = lambda: folder
+    app.pdf_index = app.PdfFilenameIndex(os.path.join(root, ".pdf_index.json"))
+    titles = make_catalog(app, app.EXCEL_PATH, rows, seed)
+    make_pdf_folder(app, folder, titles, pdfs)
+    app.init_db()
+    app.import_catalog_from_excel()
+    make_history(app, users, 5, 20, titles, seed)
+    return titles
+
+
+# ---------- journal check ----------
+def catalog_views(app):
+    """The Excel catalog read both ways (pandas frames, Book records), each as sorted
+    (source, title, author, location) rows."""
+    pd = app.pd
+    rows = []
+    for source, df in zip(("pdf", "ebook"), app.load_excel()):
+        for rec in df.to_dict("records"):
+            rec = {k: (None if pd.isna(v) else v) for k, v in rec.items()}
+            rec["source"] = source
+            b = app.Book.from_record(rec)
+            rows.append((b.source, b.title, b.author, b.location))
+    books = [(b.source, b.title, b.author, b.location) for b in app.load_excel_records()]
+    return sorted(rows), sorted(books)
+
+
+def check_journal(app, root, seed=0):
+    """Raise AssertionError unless both catalog views agree after every journaled edit and
+    after compaction (titles with stray spaces and a row without a title included)."""
+    pd = app.pd
+    rng = random.Random(seed)
+    titles = [f"{make_title(rng)} {i}" for i in range(50)]
+    os.makedirs(root, exist_ok=True)
+    pdf_df = pd.DataFrame({"title": [" Beta ", "Gamma", "gamma ", None] + titles[:50],
+                           "author": ["A", "B", "C", "D"] + ["E"] * 50, "filepath": [""] * 54})
+    ebook_df = pd.DataFrame({"title": ["BETA", "Delta"], "author": ["F", "G"], "url": ["https://a.example", ""]})
+    saved = app.CATALOG_BACKEND, app.EXCEL_PATH
+    app.CATALOG_BACKEND, app.EXCEL_PATH = "excel", os.path.join(root, "journal.xlsx")
+    try:
+        app.write_excel(pdf_df, ebook_df)
+        steps = [
+            ("delete 'beta'", lambda: app.catalog_delete("beta")),
+            ("modify ' GAMMA'", lambda: app.catalog_modify(" GAMMA", "", "H")),
+            ("rename 'delta'", lambda: app.catalog_modify("delta", " Delta Two ", "")),
+            ("add", lambda: app.catalog_add("Epsilon", "I", "pdf")),
+            ("delete first title", lambda: app.catalog_delete(titles[0])),
+        ]
+        for name, step in steps:
+            step()
+            frames, books = catalog_views(app)
+            assert frames == books, f"catalog views differ after {name}"
+        before = books
+        app.catalog_journal.compact()
+        app.catalog_cache.invalidate()
+        app.workbook_records_cache.invalidate()
+        frames, books = catalog_views(app)
+        assert frames == books == before, "catalog views differ after compaction"
+        assert not any(t.lower() == "beta" for _, t, _, _ in books), "a deleted book came back after compaction"
+    finally:
+        app.CATALOG_BACKEND, app.EXCEL_PATH = saved
+        app.catalog_cache.invalidate()
+        app.workbook_records_cache.invalidate()
+
+
+# ---------- timing ----------
+def measure(fn, repeat, setup=None):
+    """Median/best seconds over `repeat` runs, and the tracemalloc peak of one extra run."""
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": statistics.median(times), "best": min(times), "peak_kb": round(peak / 1024, 1), "runs": repeat}
+
+
+def run_cases(app, rows, titles, repeat, seed=0):
+    rng = random.Random(seed + 1)
+    queries = [" ".join(t.split()[:2]) for t in rng.sample(titles, 20)]
+    misspelt = [q[:-2] + q[-1] + q[-2] if len(q) > 4 else q for q in queries]
+    service = app.LibraryService()
+    records = service.catalog()
+    index = app.SearchIndex(records)
+    frames = app.load_excel()
+    users = [r[0] for r in app.db.query("SELECT username FROM users")]
+    pdf_titles = titles[:50]
+    out = {}
+
+    def case(name, fn, setup=None, n=repeat):
+        out[f"{name}[{rows}]"] = measure(fn, n, setup)
+        print(f"  {name:<34} {out[f'{name}[{rows}]']['seconds'] * 1000:10.2f} ms  peak {out[f'{name}[{rows}]']['peak_kb']:>10.1f} KB",
+              flush=True)
+
+    case("load_excel cold", app.load_excel, setup=app.catalog_cache.invalidate)
+    case("load_excel warm", app.load_excel)
+    out_path = os.path.join(os.path.dirname(app.EXCEL_PATH), "saved.xlsx")
+    case("save_excel", lambda: app.write_excel(*frames, path=out_path), n=max(1, repeat // 2))
+    case("load_catalog sqlite", app.load_catalog)
+    case("search index build", lambda: app.SearchIndex(records))
+    case("search 20 queries", lambda: [index.search(q) for q in queries])
+
+    def narrowing():
+        controller = app.SearchController(None, index, None)
+        for q in queries[:5]:
+            for i in range(1, len(q) + 1):
+                controller.search(q[:i])
+    case("search as-you-type (5 queries)", narrowing)
+    case("fuzzy 20 misspelt queries", lambda: [index.fuzzy(q) for q in misspelt])
+    cold_index = os.path.join(os.path.dirname(app.EXCEL_PATH), "cold.json")
+
+    def forget_pdf_index():
+        if os.path.exists(cold_index):
+            os.remove(cold_index)
+        app.pdf_index = app.PdfFilenameIndex(cold_index)
+    case("find_pdf_by_title x50 (cold index)", lambda: [app.find_pdf_in_script_dir_by_title(t) for t in pdf_titles],
+         setup=forget_pdf_index)
+    case("find_pdf_by_title x50 (warm index)", lambda: [app.find_pdf_in_script_dir_by_title(t) for t in pdf_titles])
+
+    def issue_buy():
+        for i in range(50):
+            user = users[i % len(users)]
+            book = records[rng.randrange(len(records))]
+            try:
+                service.issue(user, book)
+            except app.LibraryError:
+                pass
+            service.buy(user, book)
+    case("issue+buy x50", issue_buy)
+    case("view_my_books x50", lambda: [service.my_books(users[i % len(users)]) for i in range(50)])
+    return out
+
+
+# ---------- baseline ----------
+def compare(results, baseline, threshold):
+    """Print new vs baseline medians; return the names that got slower by more than `threshold`."""
+    regressions = []
+    print(f"\n{'case':<48} {'baseline':>12} {'now':>12} {'change':>8}")
+    for name, res in results.items():
+        base = baseline.get(name)
+        if not base:
+            print(f"{name:<48} {'-':>12} {res['seconds'] * 1000:10.2f}ms {'new':>8}")
+            continue
+        ratio = res["seconds"] / base["seconds"] if base["seconds"] else 1.0
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+        print(f"{name:<48} {base['seconds'] * 1000:10.2f}ms {res['seconds'] * 1000:10.2f}ms {ratio - 1:+7.0%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="E-Book Library benchmarks")
+    parser.add_argument("--sizes", default="1000,10000", help="comma-separated catalog sizes (rows), up to 1000000")
+    parser.add_argument("--pdfs", type=int, default=500, help="PDF files generated in the library folder")
+    parser.add_argument("--users", type=int, default=200, help="users with issue/purchase history")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case (the median is reported)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against this results JSON and exit 1 on regressions")
+    parser.add_argument("--save-baseline", metavar="PATH", help="write results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.20, help="slowdown ratio counted as a regression (0.20 = 20%%)")
+    parser.add_argument("--keep", action="store_true", help="keep the generated workspace")
+    args = parser.parse_args(argv)
+
+    app = load_app()
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    workdir = tempfile.mkdtemp(prefix="ebook-bench-")
+    results = {}
+    try:
+        check_journal(app, os.path.join(workdir, "journal"), args.seed)
+        print("Catalog journal: frame and record views agree", flush=True)
+        for rows in sizes:
+            print(f"Generating {rows:,} books, {min(args.pdfs, rows)} PDFs, {args.users} users...", flush=True)
+            t = time.perf_counter()
+            titles = make_workspace(app, os.path.join(workdir, str(rows)), rows, min(args.pdfs, rows), args.users, args.seed)
+            print(f"  generated in {time.perf_counter() - t:.1f}s", flush=True)
+            results.update(run_cases(app, rows, titles, args.repeat, args.seed))
+            app.db.close()
+            app.index_db.close()
+    finally:
+        if args.keep:
+            print("Workspace kept in", workdir)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {"date": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+                 "platform": platform.platform(), "sizes": sizes, "repeat": args.repeat, "seed": args.seed},
+        "results": results,
+    }
+    for path in (args.out, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            print("Wrote", path)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}: " + ", ".join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""Cold-start benchmark for the E-Book Library window.
+
+Each run is a fresh interpreter, so nothing is cached between runs except the OS page cache:
+
+  * `python -X importtime` breakdown of importing the app module: total time and the slowest
+    top-level imports (and whether pandas was pulled in);
+  * time to first frame: process start -> module imported -> LibraryApp built -> main menu drawn
+    -> deferred startup work finished -> first catalog access (which is what loads pandas).
+
+The window runs against an empty workspace in a temp directory. Time-to-first-frame needs a
+display; without one only the import breakdown is reported.
+
+    python benchmarks/bench_startup.py --repeat 5 --out startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(os.path.dirname(HERE), "E-Book Library.py")
+
+LOAD_SNIPPET = ("import importlib.util, sys; "
+                "spec = importlib.util.spec_from_file_location('ebook_library', sys.argv[1]); "
+                "app = importlib.util.module_from_spec(spec); spec.loader.exec_module(app)")
+
+
+# ---------- import breakdown ----------
+def parse_importtime(stderr):
+    """[(depth, self_us, cumulative_us, module)] from `-X importtime` output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative, name = line[len("import time:"):].split("|")
+        name = name.rstrip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2  # " " then two spaces per nesting level
+        rows.append((depth, int(self_us), int(cumulative), name.strip()))
+    return rows
+
+
+def import_breakdown(top):
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", LOAD_SNIPPET, APP_PATH],
+                          capture_output=True, text=True, cwd=tempfile.gettempdir())
+    if proc.returncode:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    rows = parse_importtime(proc.stderr)
+    toplevel = sorted((r for r in rows if r[0] == 0), key=lambda r: r[2], reverse=True)
+    return {
+        "total_s": sum(r[2] for r in toplevel) / 1e6,
+        "pandas_imported": any(r[3] == "pandas" for r in rows),
+        "top": [{"module": r[3], "cumulative_s": r[2] / 1e6} for r in toplevel[:top]],
+    }
+
+
+# ---------- time to first frame ----------
+def child(workdir):
+    """Run inside the measured interpreter; prints one JSON line of seconds since process start."""
+    started = float(os.environ["EBOOK_BENCH_T0"])
+    stamps = {}
+    import importlib.util
+    spec = importlib.util.spec_from_file_location("ebook_library", APP_PATH)
+    app = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app)
+    stamps["imported"] = time.time() - started
+    os.chdir(workdir)
+    app.EXCEL_PATH = os.path.join(workdir, "Books.xlsx")
+    deferred = app.LibraryApp._startup
+    def startup(self):
+        deferred(self)
+        stamps["ready"] = time.time() - started
+    app.LibraryApp._startup = startup
+    try:
+        ui = app.LibraryApp()
+    except app.tk.TclError as e:
+        print(json.dumps({"error": f"no display ({e})"}))
+        return
+    stamps["constructed"] = time.time() - started
+    ui.root.update()
+    stamps["first_frame"] = time.time() - started
+    while "ready" not in stamps:
+        ui.root.update()
+    had_pandas = "pandas" in sys.modules
+    ui.service.catalog()
+    stamps["first_catalog"] = time.time() - started
+    stamps["pandas_before_catalog"] = had_pandas
+    ui.root.destroy()
+    print(json.dumps(stamps))
+
+
+def first_frame(repeat):
+    runs = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as workdir:
+            env = dict(os.environ, EBOOK_BENCH_T0=repr(time.time()))
+            proc = subprocess.run([sys.executable, __file__, "--child", workdir], capture_output=True, text=True, env=env)
+            lines = proc.stdout.strip().splitlines()
+            if proc.returncode or not lines:
+                raise RuntimeError((proc.stderr.strip().splitlines() or ["child failed"])[-1])
+            result = json.loads(lines[-1])
+            if "error" in result:
+                return result
+            runs.append(result)
+    keys = ("imported", "constructed", "first_frame", "ready", "first_catalog")
+    summary = {k: statistics.median(r[k] for r in runs) for k in keys}
+    summary["pandas_before_catalog"] = any(r["pandas_before_catalog"] for r in runs)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="E-Book Library cold-start benchmark")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per measurement (the median is reported)")
+    parser.add_argument("--top", type=int, default=12, help="slowest top-level imports to list")
+    parser.add_argument("--out", help="write results to this JSON file")
+    parser.add_argument("--child", metavar="WORKDIR", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        child(args.child)
+        return 0
+
+    runs = [import_breakdown(args.top) for _ in range(args.repeat)]
+    imports = min(runs, key=lambda r: r["total_s"])
+    imports["median_total_s"] = statistics.median(r["total_s"] for r in runs)
+    print(f"import: median {imports['median_total_s'] * 1e3:.0f} ms, best {imports['total_s'] * 1e3:.0f} ms"
+          f" (pandas {'imported' if imports['pandas_imported'] else 'not imported'})")
+    for row in imports["top"]:
+        print(f"  {row['module']:<32}{row['cumulative_s'] * 1e3:>8.1f} ms")
+
+    frame = first_frame(args.repeat)
+    if "error" in frame:
+        print(f"time to first frame: skipped, {frame['error']}")
+    else:
+        print("time to first frame (seconds since process start, median):")
+        for key in ("imported", "constructed", "first_frame", "ready", "first_catalog"):
+            print(f"  {key:<16}{frame[key] * 1e3:>8.0f} ms")
+        if frame["pandas_before_catalog"]:
+            print("  warning: pandas was imported before the first catalog access")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "imports": imports, "first_frame": frame}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
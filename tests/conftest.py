@@ -0,0 +1,38 @@
+import importlib.util
+import os
+
+import pytest
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "E-Book Library.py")
+
+
+@pytest.fixture(scope="session")
+def app():
+    """The application module, loaded from its file (its name is not importable)."""
+    spec = importlib.util.spec_from_file_location("ebook_library", APP_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def workspace(app, tmp_path, monkeypatch):
+    """Point the app's files (catalog, databases, blob store, PDF folder) at an empty tmp_path
+    and create the schema. Yields the folder searched for PDFs by title."""
+    folder = tmp_path / "library"
+    folder.mkdir()
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(app, "EXCEL_PATH", str(tmp_path / "Books.xlsx"))
+    monkeypatch.setattr(app, "DB_PATH", str(tmp_path / "library_users.db"))
+    monkeypatch.setattr(app.index_db, "path", str(tmp_path / "library_index.db"))
+    monkeypatch.setattr(app, "BLOB_DIR", str(tmp_path / "blobs"))
+    monkeypatch.setattr(app, "blob_store", app.BlobStore(str(tmp_path / "blobs")))
+    monkeypatch.setattr(app, "script_dir", lambda: str(folder))
+    monkeypatch.setattr(app, "pdf_index", app.PdfFilenameIndex(str(tmp_path / ".pdf_index.json")))
+    monkeypatch.setattr(app, "_kdf_params", {"scheme": "pbkdf2_sha256", "iterations": 1})
+    app.catalog_cache.invalidate()
+    app.workbook_records_cache.invalidate()
+    app.init_db()
+    yield folder
+    app.catalog_cache.invalidate()
+    app.workbook_records_cache.invalidate()
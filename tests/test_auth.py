@@ -0,0 +1,36 @@
+import hashlib
+
+import pytest
+
+CHEAP = {"scheme": "pbkdf2_sha256", "iterations": 1}
+
+
+@pytest.fixture
+def cheap_kdf(app, monkeypatch):
+    monkeypatch.setattr(app, "_kdf_params", dict(CHEAP))
+
+
+def test_current_hash_verifies(app, cheap_kdf):
+    stored = app.hash_password("s3cret", CHEAP)
+    assert app.verify_password("s3cret", stored) == (True, False)
+    assert app.verify_password("wrong", stored) == (False, False)
+
+
+@pytest.mark.parametrize("stored", [
+    "pbkdf2_sha256$1$zz$00",             # salt is not hex
+    "pbkdf2_sha256$x$00$00",             # iterations not a number
+    "pbkdf2_sha256$0$00$00",             # rejected by the KDF
+    "scrypt$3$8$1$00$00",                # n is not a power of two
+    "pbkdf2_sha256$1$00$éé",   # non-ASCII digest
+    "argon2id$v=19$m=65536$abc$def",     # unknown scheme
+])
+def test_malformed_or_unknown_hash_is_rejected(app, cheap_kdf, stored):
+    assert app.verify_password("anything", stored) == (False, False)
+
+
+def test_legacy_sha256_and_plaintext(app):
+    legacy = hashlib.sha256(b"pw").hexdigest()
+    assert app.verify_password("pw", legacy) == (True, True)
+    assert app.verify_password(legacy, legacy) == (False, False)
+    plain = "x" * 64  # 64 characters, but not a hex digest
+    assert app.verify_password(plain, plain) == (True, True)
@@ -0,0 +1,46 @@
+import pytest
+
+
+@pytest.fixture
+def catalog(app, workspace):
+    for title, author in [("Harry Potter 1", "Rowling"), ("Harry Potter 2", "Rowling"),
+                          ("Jungle", "Kipling"), ("Julius Caesar", "Shakespeare")]:
+        app.catalog_add(title, author, "pdf")
+    return workspace
+
+
+def titles(app):
+    return sorted(b.title for b in app.catalog_records())
+
+
+def test_dry_run_writes_nothing(app, catalog):
+    hit = app.catalog_bulk("delete", author="rowling", dry_run=True)
+    assert sorted(hit["title"]) == ["Harry Potter 1", "Harry Potter 2"]
+    assert "key" in hit.columns and "digest" not in hit.columns
+    assert len(titles(app)) == 4
+
+    hit = app.catalog_bulk("modify", pattern=r"Potter (\d)", new_title=r"Potter Vol. \1", dry_run=True)
+    assert sorted(hit["new_title"]) == ["Harry Potter Vol. 1", "Harry Potter Vol. 2"]
+    assert "Harry Potter Vol. 1" not in titles(app)
+
+
+def test_applying_the_previewed_keys(app, catalog):
+    hit = app.catalog_bulk("delete", pattern="^Harry", dry_run=True)
+    app.catalog_bulk("delete", pattern="^Harry", keys=list(hit["key"]))
+    assert titles(app) == ["Julius Caesar", "Jungle"]
+
+
+def test_keys_conflict_when_the_match_changed(app, catalog):
+    hit = app.catalog_bulk("delete", pattern="^Harry", dry_run=True)
+    app.catalog_add("Harry Potter 3", "Rowling", "pdf")  # added after the preview
+    with pytest.raises(app.LibraryError) as err:
+        app.catalog_bulk("delete", pattern="^Harry", keys=list(hit["key"]))
+    assert err.value.code == "conflict"
+    assert len(titles(app)) == 5  # nothing was deleted
+
+
+def test_missing_file_needs_an_exact_name(app, catalog):
+    (catalog / "The Jungle Book.pdf").write_bytes(b"%PDF-1.4\n")  # contains "Jungle" but is another book
+    (catalog / "Julius Caesar.pdf").write_bytes(b"%PDF-1.4\n")
+    hit = app.catalog_bulk("delete", missing_file=True, dry_run=True)
+    assert sorted(hit["title"]) == ["Harry Potter 1", "Harry Potter 2", "Jungle"]
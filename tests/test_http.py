@@ -0,0 +1,100 @@
+import asyncio
+import json
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import pytest
+
+
+@pytest.fixture
+def server(app, workspace):
+    """A LibraryHTTPServer on a free port, run on its own event loop thread."""
+    app.catalog_add("Jungle", "Kipling", "pdf")
+    app.catalog_add("Julius Caesar", "Shakespeare", "pdf")
+    (workspace / "The Jungle Book.pdf").write_bytes(b"%PDF-1.4\n")  # partial name match only
+    (workspace / "Julius Caesar.pdf").write_bytes(b"%PDF-1.4\nJulius\n")
+    loop = asyncio.new_event_loop()
+    srv = app.LibraryHTTPServer(app.LibraryService(), "127.0.0.1", 0)
+    loop.run_until_complete(srv.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{srv.port}", srv
+    asyncio.run_coroutine_threadsafe(srv.close(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+
+def call(base, method, path, params=None, body=None, token=None):
+    """(status, decoded JSON or raw bytes)."""
+    url = base + path + ("?" + urllib.parse.urlencode(params) if params else "")
+    data = body if isinstance(body, bytes) else (json.dumps(body).encode() if body is not None else None)
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=data, method=method, headers=headers), timeout=10) as resp:
+            status, payload = resp.status, resp.read()
+    except urllib.error.HTTPError as e:
+        status, payload = e.code, e.read()
+    try:
+        return status, json.loads(payload)
+    except ValueError:
+        return status, payload
+
+
+def login(base):
+    assert call(base, "POST", "/api/register", body={"username": "reader", "password": "pw"})[0] == 200
+    status, data = call(base, "POST", "/api/login", body={"username": "reader", "password": "pw"})
+    assert status == 200
+    return data["token"]
+
+
+@pytest.mark.parametrize("body", [{"id": [1]}, {"id": "one"}, {"id": 1.5}, {"id": True}, {"id": -3}, {"id": 10 ** 30}, {}])
+def test_return_rejects_a_bad_id(server, body):
+    base, _ = server
+    status, data = call(base, "POST", "/api/return", body=body, token=login(base))
+    assert (status, data["code"]) == (400, "bad_request")
+
+
+def test_bad_request_bodies(server):
+    base, _ = server
+    token = login(base)
+    assert call(base, "POST", "/api/issue", body=b"not json", token=token)[0] == 400
+    assert call(base, "POST", "/api/issue", body=[1, 2], token=token)[0] == 400
+    assert call(base, "GET", "/api/download", {"id": "x"}, token=token)[0] == 400
+
+
+def test_file_needs_a_loan(server):
+    base, _ = server
+    token = login(base)
+    assert call(base, "GET", "/api/file", {"title": "Julius Caesar"})[0] == 401
+    status, data = call(base, "GET", "/api/file", {"title": "Julius Caesar"}, token=token)
+    assert (status, data["code"]) == (403, "forbidden")
+    assert call(base, "POST", "/api/issue", body={"title": "Julius Caesar"}, token=token)[0] == 200
+    status, payload = call(base, "GET", "/api/file", {"title": "Julius Caesar"}, token=token)
+    assert (status, payload) == (200, b"%PDF-1.4\nJulius\n")
+
+
+def test_not_found(server):
+    base, _ = server
+    token = login(base)
+    status, data = call(base, "GET", "/api/file", {"title": "No Such Book"}, token=token)
+    assert (status, data["code"]) == (404, "not_found")
+    status, data = call(base, "GET", "/api/download", {"id": 999}, token=token)
+    assert (status, data["code"]) == (404, "not_found")
+    status, data = call(base, "POST", "/api/return", body={"id": 999}, token=token)
+    assert (status, data["code"]) == (404, "not_found")
+
+
+def test_partial_filename_is_never_served(server):
+    base, _ = server
+    token = login(base)
+    # "The Jungle Book.pdf" contains the title "Jungle" but is not that book
+    assert call(base, "POST", "/api/issue", body={"title": "Jungle"}, token=token)[0] == 200
+    status, data = call(base, "GET", "/api/file", {"title": "Jungle"}, token=token)
+    assert (status, data["code"]) == (404, "not_found")
+    status, bought = call(base, "POST", "/api/buy", body={"title": "Jungle"}, token=token)
+    assert status == 200
+    status, data = call(base, "GET", "/api/download", {"id": bought["id"]}, token=token)
+    assert (status, data["code"]) == (404, "not_found")
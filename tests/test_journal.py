@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def excel(app, workspace, monkeypatch):
+    """The "excel" backend over a small Books.xlsx; compaction only runs when a test asks."""
+    monkeypatch.setattr(app, "CATALOG_BACKEND", "excel")
+    monkeypatch.setattr(app, "CATALOG_JOURNAL_COMPACT_BYTES", 1 << 40)
+    pd = app.pd
+    app.write_excel(pd.DataFrame({"title": ["Alpha", "Beta", " Gamma "], "author": ["A", "B", "C"],
+                                  "filepath": ["", "", ""]}),
+                    pd.DataFrame({"title": ["Delta"], "author": ["D"], "url": ["https://example.org/d"]}))
+    return app.catalog_journal
+
+
+def books(app):
+    app.catalog_cache.invalidate()
+    app.workbook_records_cache.invalidate()
+    return sorted((b.source, b.title, b.author) for b in app.load_excel_records())
+
+
+def frames(app):
+    """The same catalog read as DataFrames, cleaned up the way Book records are."""
+    app.catalog_cache.invalidate()
+    rows = []
+    for source, df in zip(("pdf", "ebook"), app.load_excel()):
+        for title, author in zip(df["title"], df["author"]):
+            b = app.Book.from_record({"title": title, "author": author, "source": source})
+            rows.append((b.source, b.title, b.author))
+    return sorted(rows)
+
+
+def edit(app):
+    app.catalog_add("Epsilon", "E", "pdf")
+    assert app.catalog_delete("beta") == 1
+    assert app.catalog_modify("gamma", "Gamma Two", "") == 1
+    app.catalog_add("Zeta", "Z", "ebook", "https://example.org/z")
+
+
+EXPECTED = [("ebook", "Delta", "D"), ("ebook", "Zeta", "Z"), ("pdf", "Alpha", "A"),
+            ("pdf", "Epsilon", "E"), ("pdf", "Gamma Two", "C")]
+
+
+def test_replay_then_compact(app, excel):
+    edit(app)
+    assert books(app) == frames(app) == EXPECTED
+    assert excel.compact() == 4
+    assert [e["op"] for e in excel.entries()] == ["compacted"]
+    assert books(app) == frames(app) == EXPECTED
+    # numbering continues past the folded edits
+    assert app.catalog_journal.append({"op": "delete", "title": "Zeta"}) == 5
+
+
+def test_torn_line_is_skipped(app, excel):
+    app.catalog_add("Epsilon", "E", "pdf")
+    before = books(app)
+    assert ("pdf", "Epsilon", "E") in before
+    with open(excel.path, "ab") as f:
+        f.write(b'{"op": "delete", "title": "Alpha", "se')  # a crash mid-write
+    assert books(app) == frames(app) == before
+    # the next append starts on a fresh line, so it is readable and applied
+    assert app.catalog_delete("alpha") == 1
+    with open(excel.path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert json.loads(lines[-1])["op"] == "delete"
+    assert ("pdf", "Alpha", "A") not in books(app)
+    assert excel.compact() == 2
+    assert ("pdf", "Alpha", "A") not in books(app)
+
+
+def test_crash_between_workbook_write_and_truncate(app, excel):
+    edit(app)
+
+    def crash(upto):
+        raise OSError("power cut")
+
+    excel._truncate = crash
+    try:
+        with pytest.raises(OSError):
+            excel.compact()
+    finally:
+        del excel._truncate
+
+    # the workbook already holds the edits and the log still lists them: nothing is applied twice
+    assert len(excel.entries()) == 4
+    assert books(app) == frames(app) == EXPECTED
+    # finishing the compaction has nothing left to fold
+    assert excel.compact() == 0
+    assert [e["op"] for e in excel.entries()] == ["compacted"]
+    assert books(app) == frames(app) == EXPECTED
@@ -0,0 +1,42 @@
+import os
+import shutil
+import sqlite3
+
+BASELINE_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "library_users.db")
+
+
+def columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def test_baseline_db_migrates_to_latest(app, tmp_path, monkeypatch):
+    # the database shipped with the first release: users/issued_books/purchased_books, no schema_version
+    path = str(tmp_path / "library_users.db")
+    shutil.copy(BASELINE_DB, path)
+    with sqlite3.connect(path) as conn:
+        assert "schema_version" not in {r[0] for r in conn.execute("SELECT name FROM sqlite_master")}
+        conn.execute("INSERT INTO purchased_books (username, title, author, source, location, purchase_date, price) "
+                     "VALUES ('reader', 'The Jungle Book', 'Kipling', 'pdf', '', '2024-01-01', 100.0)")
+        before = {t: conn.execute(f"SELECT * FROM {t} ORDER BY 1").fetchall()
+                  for t in ("users", "issued_books", "purchased_books")}
+    monkeypatch.setattr(app, "DB_PATH", path)
+
+    assert app.migrate_db() == app.MIGRATIONS[-1][0] == 4
+
+    conn = app.db.connect()
+    assert [r[0] for r in conn.execute("SELECT version FROM schema_version ORDER BY version")] == [1, 2, 3, 4]
+    for table, rows in before.items():
+        # existing rows survive untouched; loans and purchases gain an empty digest column
+        added = (None,) if table in app.BLOB_TABLES else ()
+        assert conn.execute(f"SELECT * FROM {table} ORDER BY 1").fetchall() == [r + added for r in rows]
+    for table in app.BLOB_TABLES:
+        assert "digest" in columns(conn, table)
+    assert columns(conn, "books") >= {"id", "title", "author", "source", "location", "digest"}
+    assert columns(conn, "settings") == {"key", "value"}
+    indexes = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+    assert {"idx_issued_user_title", "idx_issued_expiry", "idx_purchased_user_date",
+            "idx_books_title_lower", "idx_books_digest"} <= indexes
+
+    # a second start is a no-op
+    assert app.migrate_db() == 4
+    assert conn.execute("SELECT COUNT(*) FROM schema_version").fetchone()[0] == 4
@@ -0,0 +1,23 @@
+def write_pdf(path):
+    """Two pages; an incremental update then rewrites page 4, so "/Type /Page" occurs three times."""
+    body = (b"%PDF-1.4\n"
+            b"1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n"
+            b"2 0 obj << /Type /Pages /Kids [3 0 R 4 0 R] /Count 2 >> endobj\n"
+            b"3 0 obj << /Type /Page /Parent 2 0 R /Contents 5 0 R >> endobj\n"
+            b"4 0 obj << /Type /Page /Parent 2 0 R >> endobj\n"
+            b"5 0 obj << /Length 22 >> stream\nBT (Hello page) Tj ET\nendstream endobj\n"
+            b"%%EOF\n"
+            b"4 0 obj << /Type /Page /Parent 2 0 R /Rotate 90 >> endobj\n"
+            b"%%EOF\n")
+    path.write_bytes(body)
+    return str(path)
+
+
+def test_metadata_and_text_index_agree_on_page_count(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "HAS_PYMUPDF", False)
+    monkeypatch.setattr(app, "HAS_PYPDF", False)
+    path = write_pdf(tmp_path / "two.pdf")
+    pages = app.extract_pdf_text(path)
+    assert [n for n, _ in pages] == [1, 2]
+    assert pages[0][1] == "Hello page"
+    assert app.extract_pdf_metadata(path)["pages"] == len(pages)
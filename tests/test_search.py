@@ -0,0 +1,50 @@
+import random
+
+import pytest
+
+RECORDS = [
+    {"title": "Cab Alpha", "author": "Zed"},
+    {"title": "Abbey Road", "author": "Quinn"},
+    {"title": "The Jungle Book", "author": "Rudyard Kipling"},
+    {"title": "Harry Potter and the Chamber of Secrets", "author": "J. K. Rowling"},
+    {"title": "Harry Potter and the Half-Blood Prince", "author": "J. K. Rowling"},
+    {"title": "Julius Caesar", "author": "Abraham Shaw"},
+    {"title": "Stable Lab", "author": "Ana Bell"},
+]
+
+
+def fresh(app, index, q):
+    return app.SearchController(None, index, None).search(q)
+
+
+@pytest.mark.parametrize("query", ["abbey", "harry potter", "julius", "lab", "ana b", "stab", "ro"])
+def test_narrowed_results_equal_fresh_search(app, query):
+    index = app.SearchIndex(RECORDS)
+    typing = app.SearchController(None, index, None)
+    for end in range(1, len(query) + 1):
+        q = query[:end]
+        assert typing.search(q) == fresh(app, index, q), q
+
+
+def test_narrowed_results_equal_fresh_search_random(app):
+    rng = random.Random(0)
+    words = "ab abc abbey cab lab stable bell ana road the harry potter prince".split()
+    records = [{"title": " ".join(rng.choice(words) for _ in range(rng.randint(1, 4))),
+                "author": rng.choice(words)} for _ in range(300)]
+    index = app.SearchIndex(records)
+    for query in ["ab", "abb", "lab", "a", "sta", "pri", "the h", "b"]:
+        typing = app.SearchController(None, index, None)
+        for end in range(1, len(query) + 1):
+            assert typing.search(query[:end]) == fresh(app, index, query[:end]), query[:end]
+
+
+def test_reorder_is_matches_then_rest(app):
+    index = app.SearchIndex([{"title": f"book {i}", "author": ""} for i in range(50)])
+    matched = [41, 3, 17, 0, 49]
+    view = index.reorder(matched)
+    expected = matched + [i for i in range(50) if i not in set(matched)]
+    assert len(view) == len(expected)
+    assert [view[p] for p in range(len(view))] == expected
+    assert view[-1] == expected[-1]
+    with pytest.raises(IndexError):
+        view[50]